@@ -1,79 +1,170 @@
-<<<<<<< HEAD
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file, jsonify, has_request_context
 from flask_mail import Mail
 from config import Config
-from database import mongodb
 from services.auth_service import AuthService
 from services.email_service import EmailService
 from services.profile_service import ProfileService
-from services.payment_service import PaymentService
+from services.payment_service import PaymentService, PaymentSweeper, get_gateway
 from services.invoice_service_pro import ProfessionalInvoiceGenerator
 from services.enhanced_notification import EnhancedNotificationService
 from services.location_service import LocationService
 from services.review_service import ReviewService
 from services.analytics_service import AnalyticsService
 from services.gps_tracker import GPSTracker
+from services.migration_service import MigrationService
+from services.image_service import ImageService
+from services.image_manifest import ImageManifest
+from services.asset_service import AssetManifest
+from services.template_service import TemplateProfiler
+from services.fragment_cache import FragmentCacheExtension, fragment_cache
+from services.repricing_service import PriceVersionWatcher
+from services.pricing_engine import PricingEngine, ACTIVE_STATUSES, parse_tiers
+from services.quote_service import QuoteService
+from services.availability_index import AvailabilityIndex
+from services.cache_service import TTLCache
+from services.http_optimizer import ResponseOptimizer
+from services.rate_limiter import create_rate_limiter
+from services.session_store import ServerSessionInterface, create_session_store, user_snapshot, SNAPSHOT_VERSION
+from repositories import create_repositories
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import datetime
 import uuid
 import os
-from werkzeug.utils import secure_filename
 from bson import ObjectId
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Behind a load balancer, take the client address from the proxy headers (only as many hops as configured)
+if app.config['PROXY_FIX_X_FOR'] or app.config['PROXY_FIX_X_PROTO'] or app.config['PROXY_FIX_X_HOST']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'],
+                            x_proto=app.config['PROXY_FIX_X_PROTO'], x_host=app.config['PROXY_FIX_X_HOST'])
+
 # Initialize services
 mail = Mail(app)
 email_service = EmailService(app)
 invoice_generator = ProfessionalInvoiceGenerator()
+repos = create_repositories(app.config['STORAGE_BACKEND'])
+repos.cars.stats_label = lambda: request.endpoint if has_request_context() else None
+app.jinja_env.globals['car_srcset'] = lambda car, fmt='jpeg': ImageService.srcset(car.get('image_variants'), fmt)
+
+# Fingerprinted static URLs (run build_assets.py to generate the manifest)
+asset_manifest = AssetManifest(app.static_folder)
+asset_manifest.init_app(app)
+
+# Shared bytecode cache and per-template timings (run precompile_templates.py at build time)
+template_profiler = TemplateProfiler(app.config['TEMPLATE_CACHE_DIR'])
+template_profiler.init_app(app)
+
+# {% cache %} blocks in templates, expired by repository writes
+app.jinja_env.add_extension(FragmentCacheExtension)
+app.jinja_env.fragment_cache = fragment_cache
+if app.config['STORAGE_BACKEND'] == 'mongo':
+    # Versions kept in Mongo, so a write on one worker expires fragments on all of them
+    from database import mongodb
+    fragment_cache.share_versions(mongodb.counters, app.config['FRAGMENT_VERSION_CHECK_INTERVAL'])
+
+# Weak ETags / 304s and gzip or brotli compression for dynamic responses
+response_optimizer = ResponseOptimizer(app.config['COMPRESS_MIN_SIZE'], app.config['COMPRESS_GZIP_LEVEL'],
+                                       app.config['COMPRESS_BROTLI_QUALITY'])
+response_optimizer.init_app(app)
+
+# Sessions live server-side; the cookie only carries a random id
+app.session_interface = ServerSessionInterface(
+    create_session_store(app.config['SESSION_BACKEND'], app.config['SESSION_CACHE_SIZE'],
+                         app.config['SESSION_LOCAL_MAX_AGE'], app.config['SESSION_LIFETIME']),
+    app.config['SESSION_LIFETIME']
+)
+
+def current_user_snapshot():
+    """The logged-in user's display fields, from the session when the cached copy is current"""
+    snapshot = session.get('user')
+    if snapshot and snapshot.get('version') == SNAPSHOT_VERSION:
+        return dict(snapshot)
+    user = repos.users.get(session['user_id'])
+    if not user:
+        return None
+    session['user'] = user_snapshot(user)
+    return dict(session['user'])
+
+# Sliding-window throttling for login and OTP endpoints
+rate_limiter = create_rate_limiter(app.config['RATE_LIMIT_BACKEND'], app.config['RATE_LIMIT_MAX_KEYS'])
+rate_window = app.config['RATE_LIMIT_WINDOW']
+rate_limiter.add_limit('login:ip', app.config['LOGIN_ATTEMPTS_PER_IP'], rate_window)
+rate_limiter.add_limit('login:user', app.config['LOGIN_ATTEMPTS_PER_USER'], rate_window)
+rate_limiter.add_limit('otp:ip', app.config['OTP_REQUESTS_PER_IP'], rate_window)
+rate_limiter.add_limit('otp:email', app.config['OTP_REQUESTS_PER_EMAIL'], rate_window)
+rate_limiter.add_limit('otp-verify:email', app.config['OTP_VERIFICATIONS_PER_EMAIL'], rate_window)
+rate_limiter.add_limit('quote:ip', app.config['QUOTE_REQUESTS_PER_IP'], rate_window)
+
+def within_rate_limits(*checks):
+    """Count one attempt against each (limit name, identifier) pair; False once any is exceeded"""
+    return all(rate_limiter.allow(name, identifier) for name, identifier in checks)
+
+# Daily prices per car with demand surge, precomputed for the pricing horizon
+pricing_engine = PricingEngine(
+    repos,
+    horizon_days=app.config['PRICING_HORIZON_DAYS'],
+    weekday_multiplier=app.config['PRICING_WEEKDAY_MULTIPLIER'],
+    weekend_multiplier=app.config['PRICING_WEEKEND_MULTIPLIER'],
+    surge_tiers=parse_tiers(app.config['PRICING_SURGE_TIERS']),
+    long_rental_discounts=[(int(days), percent) for days, percent in parse_tiers(app.config['PRICING_LONG_RENTAL_DISCOUNTS'])],
+    max_rental_days=app.config['PRICING_MAX_RENTAL_DAYS']
+)
+if app.config['STORAGE_BACKEND'] == 'mongo':
+    # Occupancy changes made on other workers trigger a rebuild here within the interval
+    pricing_engine.share_state(mongodb.counters, app.config['PRICING_SYNC_INTERVAL'])
+
+# Memoized full quotes for the booking page's live price summary
+quote_service = QuoteService(pricing_engine, TTLCache(app.config['QUOTE_CACHE_SIZE'], app.config['QUOTE_CACHE_TTL']),
+                             app.config['GST_RATE'])
+
+# Per-car booking intervals for "what's free from the 10th to the 14th" searches
+availability_index = AvailabilityIndex(repos)
+# Bookings and cancellations on other workers reach the index through the pricing engine's shared counter
+availability_index.follow(pricing_engine)
+
+def booking_hold_changed(booking, holding):
+    """A booking started (holding=True) or stopped holding its car: update surge pricing and availability"""
+    pricing_engine.booking_changed(booking, 1 if holding else -1)
+    if holding:
+        availability_index.add(booking)
+    else:
+        availability_index.remove(booking)
+
+def expire_car_prices():
+    repos.cars.invalidate()
+    fragment_cache.bump('cars')
+    pricing_engine.reload()
+
+# Prices are changed in bulk by reprice.py; drop cached listings when a new version lands
+price_watcher = PriceVersionWatcher(app.config['PRICE_VERSION_CHECK_INTERVAL'], on_change=expire_car_prices)
+app.before_request(price_watcher.check)
+
+# Finish booking updates from payments interrupted by a crash, at start-up and then periodically
+payment_sweeper = PaymentSweeper(app.config['PAYMENT_SWEEP_INTERVAL'])
+app.before_request(payment_sweeper.check)
 
 # Upload configuration
 UPLOAD_FOLDER = app.config['UPLOAD_FOLDER']
 ALLOWED_EXTENSIONS = app.config['ALLOWED_EXTENSIONS']
 
-=======
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-import json
-import os
-from datetime import datetime
-import uuid
-import requests
-from werkzeug.utils import secure_filename
-
-# Configure upload settings
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'car_images')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-
-# Create upload folder if it doesn't exist
->>>>>>> cacc96d203820384eeb4c1f8f91818e62ec3d418
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-<<<<<<< HEAD
-# USD to INR conversion rate
-USD_TO_INR_RATE = 83.0
+# In-memory listing of the upload folder so image lookups don't stat the disk
+image_manifest = ImageManifest(UPLOAD_FOLDER)
 
 def get_car_image(make, model):
     filename = f"{make.lower()}_{model.lower().replace(' ', '_')}_2022.jpg"
-=======
-# USD to INR conversion rate (you may want to use a real-time API in production)
-USD_TO_INR_RATE = 83.0  # Fixed conversion rate
-
-def get_car_image(make, model):
-    # Generate a standardized filename based on make and model
-    filename = f"{make.lower()}_{model.lower().replace(' ', '_')}_2022.jpg"
-    # Check if image exists, if not return a default image
->>>>>>> cacc96d203820384eeb4c1f8f91818e62ec3d418
-    image_path = os.path.join(UPLOAD_FOLDER, filename)
-    if os.path.exists(image_path):
+    if filename in image_manifest:
         return f'/static/car_images/{filename}'
     return '/static/car_images/default_car.jpg'
 
-<<<<<<< HEAD
 def safe_object_id(id_string):
     """Safely convert string to ObjectId, handling both ObjectId strings and regular strings"""
     try:
@@ -91,23 +182,15 @@ def check_and_release_expired_bookings():
         current_date = datetime.now().strftime('%Y-%m-%d')
         
         # Find all confirmed bookings that have passed their end date
-        expired_bookings = mongodb.bookings.find({
-            'status': 'confirmed',
-            'end_date': {'$lt': current_date}
-        })
+        expired_bookings = repos.bookings.list_expired(current_date)
         
         for booking in expired_bookings:
             # Update booking status to completed
-            mongodb.bookings.update_one(
-                {'id': booking['id']},
-                {'$set': {'status': 'completed'}}
-            )
+            repos.bookings.update(booking['id'], {'status': 'completed'})
+            availability_index.remove(booking)
             
             # Make the car available again
-            mongodb.cars.update_one(
-                {'id': booking['car_id']},
-                {'$set': {'available': True}}
-            )
+            repos.cars.set_available(booking['car_id'], True)
             print(f"Released vehicle {booking['car_id']} from expired booking {booking['id']}")
     except Exception as e:
         print(f"Error checking expired bookings: {e}")
@@ -124,24 +207,24 @@ def index():
     make_filter = request.args.get('make', '')
     vehicle_type = request.args.get('type', '')  # Filter by vehicle type
 
-    # Get all cars from MongoDB
+    # Get matching cars
     query = {}
-    if search_query:
-        query = {
-            '$or': [
-                {'make': {'$regex': search_query, '$options': 'i'}},
-                {'model': {'$regex': search_query, '$options': 'i'}},
-                {'year': {'$regex': search_query, '$options': 'i'}}
-            ]
-        }
-    
     if make_filter:
         query['make'] = make_filter
     
     if vehicle_type:
         query['vehicle_type'] = vehicle_type
     
-    cars = list(mongodb.cars.find(query))
+    cars = repos.cars.find(query, search=search_query)
+    
+    # Date search: show every car free for the whole range, whatever its current flag says
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    if start_date and end_date:
+        try:
+            cars = [dict(car, available=True) for car in availability_index.free_cars(cars, start_date, end_date)]
+        except ValueError:
+            flash('End date must be after start date')
     
     # Convert prices to INR and add default image if missing
     for car in cars:
@@ -161,12 +244,12 @@ def index():
     elif sort_by == 'year_asc':
         cars = sorted(cars, key=lambda x: x.get('year', 0))
     
-    return render_template('index.html', cars=cars)
+    return render_template('index.html', cars=cars, today=datetime.now().strftime('%Y-%m-%d'))
 
 @app.route('/car/<car_id>')
 def car_details(car_id):
-    # Try to find by MongoDB _id first, then by custom id field
-    car = mongodb.cars.find_one({'_id': safe_object_id(car_id)}) or mongodb.cars.find_one({'id': car_id})
+    # Find by custom id field or MongoDB _id
+    car = repos.cars.get(car_id)
     if car:
         car['price_inr'] = round(car.get('price_per_day', 0), 2)
         car['_id'] = str(car.get('_id', ''))
@@ -180,7 +263,7 @@ def car_details(car_id):
         
         # Find similar cars
         similar_cars = []
-        for other_car in mongodb.cars.find({'id': {'$ne': car_id}, 'available': True}).limit(3):
+        for other_car in repos.cars.find({'id': {'$ne': car_id}, 'available': True}, limit=3):
             if (other_car['make'] == car['make'] or
                 (other_car.get('price_per_day', 0) >= car.get('price_per_day', 0) * 0.8 and
                  other_car.get('price_per_day', 0) <= car.get('price_per_day', 0) * 1.2)):
@@ -204,6 +287,11 @@ def register():
         phone = request.form.get('phone', '')
         password = request.form.get('password')
         
+        # Registration hashes a password and mails an OTP, so it shares the OTP limits
+        if not within_rate_limits(('otp:ip', request.remote_addr), ('otp:email', email)):
+            flash('Too many registration attempts. Please wait a few minutes and try again.')
+            return render_template('register.html'), 429
+        
         result = AuthService.register_user(username, email, password, phone)
         
         if result['success']:
@@ -226,6 +314,10 @@ def verify_otp():
     email = request.form.get('email')
     otp = request.form.get('otp')
     
+    if not within_rate_limits(('otp:ip', request.remote_addr), ('otp-verify:email', email)):
+        flash('Too many verification attempts. Please wait a few minutes and try again.')
+        return redirect(url_for('verify_email', email=email))
+    
     result = email_service.verify_otp(email, otp)
     
     if result['success']:
@@ -238,7 +330,12 @@ def verify_otp():
 @app.route('/resend-otp', methods=['POST'])
 def resend_otp():
     email = request.form.get('email')
-    user = mongodb.users.find_one({'email': email})
+    
+    if not within_rate_limits(('otp:ip', request.remote_addr), ('otp:email', email)):
+        flash('Too many OTP requests. Please wait a few minutes and try again.')
+        return redirect(url_for('verify_email', email=email))
+    
+    user = repos.users.get_by_email(email)
     
     if user:
         result = email_service.send_otp(email, user['username'])
@@ -250,175 +347,29 @@ def resend_otp():
         flash('User not found')
     
     return redirect(url_for('verify_email', email=email))
-=======
-app = Flask(__name__)
-app.secret_key = 'car_rental_secret_key'
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
-# Data storage (in-memory instead of database)
-class DataStore:
-    def __init__(self):
-        self.cars = []
-        self.users = []
-        self.bookings = []
-        self.load_data()
-
-    def load_data(self):
-        # Load initial data or from files if they exist
-        if os.path.exists('cars.json'):
-            with open('cars.json', 'r') as f:
-                self.cars = json.load(f)
-        else:
-            # Sample car data
-            self.cars = [
-                {
-                    'id': '1',
-                    'make': 'Toyota',
-                    'model': 'Corolla',
-                    'year': 2020,
-                    'price_per_day': 50,
-                    'available': True,
-                    'image': get_car_image('Toyota', 'Corolla')
-                },
-                {
-                    'id': '2',
-                    'make': 'Honda',
-                    'model': 'Civic',
-                    'year': 2021,
-                    'price_per_day': 55,
-                    'available': True,
-                    'image': get_car_image('Honda', 'Civic')
-                },
-                {
-                    'id': '3',
-                    'make': 'Ford',
-                    'model': 'Mustang',
-                    'year': 2019,
-                    'price_per_day': 80,
-                    'available': True,
-                    'image': get_car_image('Ford', 'Mustang')
-                },
-                {
-                    'id': '4',
-                    'make': 'BMW',
-                    'model': '3 Series',
-                    'year': 2022,
-                    'price_per_day': 100,
-                    'available': True,
-                    'image': get_car_image('BMW', '3 Series')
-                },
-                {
-                    'id': '5',
-                    'make': 'Tesla',
-                    'model': 'Model 3',
-                    'year': 2022,
-                    'price_per_day': 120,
-                    'available': True,
-                    'image': get_car_image('Tesla', 'Model 3')
-                }
-            ]
-            self.save_cars()
-
-        if os.path.exists('users.json'):
-            with open('users.json', 'r') as f:
-                self.users = json.load(f)
-        else:
-            # Sample user data
-            self.users = [
-                {
-                    'id': '1',
-                    'username': 'admin',
-                    'password': 'admin123',
-                    'is_admin': True
-                },
-                {
-                    'id': '2',
-                    'username': 'user',
-                    'password': 'user123',
-                    'is_admin': False
-                }
-            ]
-            self.save_users()
-
-        if os.path.exists('bookings.json'):
-            with open('bookings.json', 'r') as f:
-                self.bookings = json.load(f)
-        else:
-            self.bookings = []
-            self.save_bookings()
-
-    def save_cars(self):
-        with open('cars.json', 'w') as f:
-            json.dump(self.cars, f)
-
-    def save_users(self):
-        with open('users.json', 'w') as f:
-            json.dump(self.users, f)
-
-    def save_bookings(self):
-        with open('bookings.json', 'w') as f:
-            json.dump(self.bookings, f)
-
-# Initialize data store
-data_store = DataStore()
-
-# Routes
-@app.route('/')
-def home():
-    search_query = request.args.get('search', '').lower()
-    sort_by = request.args.get('sort', 'price_asc')
-    make_filter = request.args.get('make', '')
-
-    filtered_cars = data_store.cars
-
-    # Apply search filter
-    if search_query:
-        filtered_cars = [
-            car for car in data_store.cars
-            if search_query in car['make'].lower() or
-               search_query in car['model'].lower() or
-               search_query in str(car['year'])
-        ]
-
-    # Apply make filter
-    if make_filter:
-        filtered_cars = [
-            car for car in filtered_cars
-            if car['make'] == make_filter
-        ]
-
-    # Convert prices to INR
-    for car in filtered_cars:
-        car['price_inr'] = round(car['price_per_day'] * USD_TO_INR_RATE, 2)
-
-    # Apply sorting
-    if sort_by == 'price_asc':
-        filtered_cars = sorted(filtered_cars, key=lambda x: x['price_per_day'])
-    elif sort_by == 'price_desc':
-        filtered_cars = sorted(filtered_cars, key=lambda x: x['price_per_day'], reverse=True)
-    elif sort_by == 'year_desc':
-        filtered_cars = sorted(filtered_cars, key=lambda x: x['year'], reverse=True)
-    elif sort_by == 'year_asc':
-        filtered_cars = sorted(filtered_cars, key=lambda x: x['year'])
-
-    return render_template('index.html', cars=filtered_cars)
->>>>>>> cacc96d203820384eeb4c1f8f91818e62ec3d418
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-<<<<<<< HEAD
         username = request.form.get('username')
         password = request.form.get('password')
         
+        # Checked before any bcrypt work is done
+        if not within_rate_limits(('login:ip', request.remote_addr), ('login:user', username)):
+            flash('Too many login attempts. Please wait a few minutes and try again.')
+            return render_template('login.html'), 429
+        
         result = AuthService.login_user(username, password)
         
         if result['success']:
+            rate_limiter.reset('login:user', username)
             user = result['user']
+            session.regenerate()
             session['user_id'] = str(user['_id'])
             session['username'] = user['username']
             session['is_admin'] = user.get('is_admin', False)
             session['email'] = user.get('email', '')
+            session['user'] = user_snapshot(user)
             
             flash('Login successful!')
             # Redirect admin to admin dashboard, regular users to home
@@ -428,28 +379,12 @@ def login():
         else:
             flash(result['message'])
     
-=======
-        username = request.form['username']
-        password = request.form['password']
-
-        for user in data_store.users:
-            if user['username'] == username and user['password'] == password:
-                session['user_id'] = user['id']
-                session['username'] = user['username']
-                session['is_admin'] = user['is_admin']
-                flash('Login successful!')
-                return redirect(url_for('home'))
-
-        flash('Invalid username or password')
-
->>>>>>> cacc96d203820384eeb4c1f8f91818e62ec3d418
     return render_template('login.html')
 
 @app.route('/logout')
 def logout():
     session.clear()
     flash('You have been logged out')
-<<<<<<< HEAD
     return redirect(url_for('index'))
 
 # ==================== USER PROFILE ====================
@@ -460,11 +395,9 @@ def profile():
         flash('Please login to view your profile')
         return redirect(url_for('login'))
     
-    result = ProfileService.get_user_profile(safe_object_id(session['user_id']))
+    user = current_user_snapshot()
     
-    if result['success']:
-        user = result['user']
-        user['_id'] = str(user['_id'])
+    if user:
         return render_template('profile.html', user=user)
     
     flash('Error loading profile')
@@ -494,6 +427,11 @@ def edit_profile():
             flash(result['message'])
             # Update session email
             session['email'] = data['email']
+            # Refresh the cached snapshot in every session of this user
+            updated = repos.users.get(session['user_id'])
+            if updated:
+                session['user'] = user_snapshot(updated)
+                app.session_interface.refresh_user(session['user_id'], session['user'])
             return redirect(url_for('profile'))
         else:
             flash(result['message'])
@@ -522,6 +460,8 @@ def change_password():
     )
     
     if result['success']:
+        # Sign out everywhere else
+        app.session_interface.revoke_user(session['user_id'], keep=session.sid)
         flash(result['message'])
     else:
         flash(result['message'])
@@ -529,86 +469,25 @@ def change_password():
     return redirect(url_for('profile'))
 
 # ==================== BOOKING & PAYMENT ====================
-=======
-    return redirect(url_for('home'))
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if request.method == 'POST':
-        username = request.form['username']
-        password = request.form['password']
-
-        # Check if username already exists
-        for user in data_store.users:
-            if user['username'] == username:
-                flash('Username already exists')
-                return render_template('register.html')
-
-        # Create new user
-        new_user = {
-            'id': str(len(data_store.users) + 1),
-            'username': username,
-            'password': password,
-            'is_admin': False
-        }
-
-        data_store.users.append(new_user)
-        data_store.save_users()
-
-        flash('Registration successful! Please login.')
-        return redirect(url_for('login'))
-
-    return render_template('register.html')
-
-@app.route('/car/<car_id>')
-def car_details(car_id):
-    car = next((car for car in data_store.cars if car['id'] == car_id), None)
-    if car:
-        # Convert price to INR
-        car['price_inr'] = round(car['price_per_day'] * USD_TO_INR_RATE, 2)
-
-        # Find similar cars (same make or similar price range)
-        similar_cars = []
-        for other_car in data_store.cars:
-            if other_car['id'] != car_id and other_car['available']:
-                # Same make or similar price range (±20%)
-                if (other_car['make'] == car['make'] or
-                    (other_car['price_per_day'] >= car['price_per_day'] * 0.8 and
-                     other_car['price_per_day'] <= car['price_per_day'] * 1.2)):
-                    # Convert price to INR for similar cars
-                    other_car['price_inr'] = round(other_car['price_per_day'] * USD_TO_INR_RATE, 2)
-                    similar_cars.append(other_car)
-                    # Limit to 3 similar cars
-                    if len(similar_cars) >= 3:
-                        break
-
-        return render_template('car_details.html', car=car, cars=data_store.cars, similar_cars=similar_cars)
-    flash('Car not found')
-    return redirect(url_for('home'))
->>>>>>> cacc96d203820384eeb4c1f8f91818e62ec3d418
 
 @app.route('/book/<car_id>', methods=['GET', 'POST'])
 def book_car(car_id):
     if 'user_id' not in session:
         flash('Please login to book a car')
         return redirect(url_for('login'))
-<<<<<<< HEAD
     
     # Prevent admin from booking
     if session.get('is_admin'):
         flash('Admin users cannot book vehicles. Please use a regular user account.')
         return redirect(url_for('car_details', car_id=car_id))
     
-    # Try to find by MongoDB _id first, then by custom id field
-    car = mongodb.cars.find_one({'_id': safe_object_id(car_id)}) or mongodb.cars.find_one({'id': car_id})
+    # Find by custom id field or MongoDB _id
+    car = repos.cars.get(car_id)
     if not car:
         flash('Car not found')
         return redirect(url_for('index'))
     
-    if not car.get('available', False):
-        flash('Car is not available for booking')
-        return redirect(url_for('car_details', car_id=car_id))
-    
+    # Availability is per date range (checked below), not the car's current flag, matching the date search
     car['price_inr'] = round(car.get('price_per_day', 0), 2)
     car['_id'] = str(car.get('_id', ''))
     
@@ -633,43 +512,29 @@ def book_car(car_id):
                                  locations=locations)
         
         total_days = duration.days + 1
-        base_price = total_days * car.get('price_per_day', 0)
         
-        # Add location charge if different pickup/drop locations
-        location_charge = LocationService.calculate_distance_charge(pickup_location, drop_location)
-        total_price = base_price + location_charge
+        # The index can trail other workers by the sync interval: confirm a clash in the shared store before refusing
+        if (not availability_index.is_free(car_id, start_date, end_date)
+                and any(repos.bookings.list_overlapping(car_id, start_date, end_date, ACTIVE_STATUSES))):
+            flash('This vehicle is already booked for some of those dates. Please choose different dates.')
+            return render_template('book_car.html', car=car, today=datetime.now().strftime('%Y-%m-%d'), 
+                                 locations=locations)
+        
+        if not LocationService.has_pickup_capacity(start_date, pickup_location, pickup_time):
+            flash('That pickup time is fully booked at this location. Please choose another slot.')
+            return render_template('book_car.html', car=car, today=datetime.now().strftime('%Y-%m-%d'), 
+                                 locations=locations)
+        
+        # Priced like the page's live summary; it can differ by recent bookings on other workers
+        # (see PRICING_SYNC_INTERVAL), and the amount charged is the one stored here
+        try:
+            quote = quote_service.quote(car, start_date, end_date, pickup_location, drop_location)
+        except ValueError as e:
+            flash(str(e))
+            return render_template('book_car.html', car=car, today=datetime.now().strftime('%Y-%m-%d'), 
+                                 locations=locations)
+        total_price = quote['total']
         
-=======
-
-    car = next((car for car in data_store.cars if car['id'] == car_id), None)
-    if not car:
-        flash('Car not found')
-        return redirect(url_for('home'))
-
-    if not car['available']:
-        flash('Car is not available for booking')
-        return redirect(url_for('car_details', car_id=car_id))
-
-    # Convert price to INR
-    car['price_inr'] = round(car['price_per_day'] * USD_TO_INR_RATE, 2)
-
-    if request.method == 'POST':
-        start_date = request.form['start_date']
-        end_date = request.form['end_date']
-
-        # Calculate total days and price
-        start = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
-        duration = end - start
-
-        if duration.days < 0:
-            flash('End date must be after start date')
-            return render_template('book_car.html', car=car, today=datetime.now().strftime('%Y-%m-%d'))
-
-        total_days = duration.days + 1  # Including both start and end days
-        total_price = total_days * car['price_per_day'] * USD_TO_INR_RATE
-
->>>>>>> cacc96d203820384eeb4c1f8f91818e62ec3d418
         # Create booking
         booking = {
             'id': str(uuid.uuid4()),
@@ -679,7 +544,6 @@ def book_car(car_id):
             'end_date': end_date,
             'total_days': total_days,
             'total_price': total_price,
-<<<<<<< HEAD
             'status': 'pending',
             'payment_status': 'pending',
             'payment_method': '',
@@ -687,13 +551,34 @@ def book_car(car_id):
             'drop_location': drop_location,
             'pickup_time': pickup_time,
             'drop_time': drop_time,
+            'price_breakdown': {field: value for field, value in quote.items() if field != 'cached'},
             'created_at': datetime.utcnow()
         }
         
-        mongodb.bookings.insert_one(booking)
+        # Claim the pickup slot atomically before writing the booking; the check above is advisory
+        if not LocationService.reserve_pickup(booking):
+            flash('That pickup time is fully booked at this location. Please choose another slot.')
+            return render_template('book_car.html', car=car, today=datetime.now().strftime('%Y-%m-%d'), 
+                                 locations=locations)
+        try:
+            repos.bookings.add(booking)
+        except Exception:
+            LocationService.release_pickup(booking)
+            raise
         
-        # Update car availability
-        mongodb.cars.update_one({'id': car_id}, {'$set': {'available': False}})
+        # The index above is per worker: recheck against the shared store now the booking is written.
+        # Any other hold on these dates wins (two racing requests may both back off, never both book).
+        if any(repos.bookings.list_overlapping(car_id, start_date, end_date, ACTIVE_STATUSES, exclude_id=booking['id'])):
+            repos.bookings.update(booking['id'], {'status': 'cancelled'})
+            LocationService.release_pickup(booking)
+            flash('This vehicle was just booked for some of those dates. Please choose different dates.')
+            return render_template('book_car.html', car=car, today=datetime.now().strftime('%Y-%m-%d'), 
+                                 locations=locations)
+        booking_hold_changed(booking, True)
+        
+        # Only a rental starting today takes the car off the lot; future bookings just block their dates
+        if start_date <= datetime.now().strftime('%Y-%m-%d'):
+            repos.cars.set_available(car_id, False)
         
         flash('Booking created! Please proceed with payment.')
         return redirect(url_for('payment', booking_id=booking['id']))
@@ -701,13 +586,65 @@ def book_car(car_id):
     return render_template('book_car.html', car=car, today=datetime.now().strftime('%Y-%m-%d'),
                          locations=locations)
 
+def send_payment_invoice(booking, payment, user):
+    """Email the combined booking/payment invoice for a completed payment"""
+    # Get required data - try both _id and id field for car lookup
+    car = repos.cars.get(booking['car_id'])
+    
+    # Get location names from IDs
+    from services.location_service import LocationService
+    pickup_loc_id = booking.get('pickup_location', '')
+    drop_loc_id = booking.get('drop_location', '')
+    pickup_loc = LocationService.get_location_by_id(pickup_loc_id)
+    drop_loc = LocationService.get_location_by_id(drop_loc_id)
+    
+    pickup_location_name = f"{pickup_loc['name']} - {pickup_loc['address']}" if pickup_loc else pickup_loc_id or 'Not specified'
+    drop_location_name = f"{drop_loc['name']} - {drop_loc['address']}" if drop_loc else drop_loc_id or 'Not specified'
+    
+    # Prepare booking data with car details (with None checks)
+    booking_data = {
+        'id': booking['id'],
+        'car_brand': car.get('make', '') if car else 'Unknown',
+        'car_model': car.get('model', '') if car else 'Unknown',
+        'start_date': booking['start_date'],
+        'end_date': booking['end_date'],
+        'total_days': booking.get('total_days', 0),
+        'total_price': booking['total_price'],
+        'pickup_location': pickup_location_name,
+        'drop_location': drop_location_name,
+        'pickup_time': booking.get('pickup_time', 'N/A'),
+        'drop_time': booking.get('drop_time', 'N/A')
+    }
+    
+    payment_data = {
+        'method': payment.get('payment_method', 'N/A'),
+        'transaction_id': payment.get('transaction_id', 'N/A'),
+        'status': 'completed'
+    }
+    
+    user_data = {
+        'username': user.get('username', 'Customer'),
+        'email': user.get('email', session.get('email', '')),
+        'phone': user.get('phone', 'N/A')
+    }
+    
+    # Generate and send combined invoice email
+    try:
+        success, invoice_info = EnhancedNotificationService.generate_and_send_invoice(
+            booking_data, payment_data, user_data
+        )
+        if not success:
+            print("Warning: Invoice generation or email failed")
+    except Exception as e:
+        print(f"Email/Invoice error: {e}")
+
 @app.route('/payment/<booking_id>')
 def payment(booking_id):
     if 'user_id' not in session:
         flash('Please login to proceed with payment')
         return redirect(url_for('login'))
     
-    booking = mongodb.bookings.find_one({'id': booking_id, 'user_id': session['user_id']})
+    booking = repos.bookings.get(booking_id, session['user_id'])
     
     if not booking:
         flash('Booking not found')
@@ -718,9 +655,7 @@ def payment(booking_id):
         return redirect(url_for('my_bookings'))
     
     # Try to find car by both id and _id
-    car = mongodb.cars.find_one({'id': booking['car_id']})
-    if not car:
-        car = mongodb.cars.find_one({'_id': safe_object_id(booking['car_id'])})
+    car = repos.cars.get(booking['car_id'])
     
     if car:
         # Ensure image field exists
@@ -732,96 +667,65 @@ def payment(booking_id):
     
     payment_methods = PaymentService.PAYMENT_METHODS
     
-    return render_template('payment.html', booking=booking, payment_methods=payment_methods)
+    return render_template('payment.html', booking=booking, payment_methods=payment_methods,
+                         idempotency_key=str(uuid.uuid4()))
 
 @app.route('/process-payment/<booking_id>', methods=['POST'])
 def process_payment(booking_id):
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not authenticated'})
     
-    booking = mongodb.bookings.find_one({'id': booking_id, 'user_id': session['user_id']})
+    booking = repos.bookings.get(booking_id, session['user_id'])
     
     if not booking:
         return jsonify({'success': False, 'message': 'Booking not found'})
     
     payment_method = request.form.get('payment_method')
+    # One key per rendered payment page, so double clicks and retries replay the first attempt
+    idempotency_key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
     
-    # Initiate payment
-    payment_result = PaymentService.initiate_payment(
-        booking_id,
-        booking['total_price'],
-        payment_method,
-        session['user_id']
-    )
+    if get_gateway().asynchronous:
+        # Charge goes out in the background; the webhook confirms the booking
+        process_result = PaymentService.start_gateway_payment(
+            booking_id,
+            booking['total_price'],
+            payment_method,
+            session['user_id'],
+            idempotency_key,
+            Config.PAYMENT_WEBHOOK_URL or url_for('payment_webhook', _external=True)
+        )
+    else:
+        # Simulated gateway: record the payment and confirm the booking together
+        process_result = PaymentService.pay_booking(
+            booking_id,
+            booking['total_price'],
+            payment_method,
+            session['user_id'],
+            idempotency_key
+        )
     
-    if not payment_result['success']:
-        return jsonify(payment_result)
+    if process_result['success'] and process_result.get('pending'):
+        return jsonify({
+            'success': True,
+            'pending': True,
+            'message': process_result['message'],
+            'status_url': url_for('payment_status', booking_id=booking_id)
+        })
     
-    # Simulate payment processing (in real app, this would be callback from gateway)
-    payment_id = payment_result['payment']['id']
-    process_result = PaymentService.process_payment(payment_id, {})
+    if process_result['success'] and process_result['replayed']:
+        return jsonify({
+            'success': True,
+            'redirect': url_for('booking_success', booking_id=booking_id)
+        })
     
     if process_result['success']:
-        # Update booking status
-        mongodb.bookings.update_one(
-            {'id': booking_id},
-            {'$set': {'status': 'confirmed', 'payment_status': 'paid'}}
-        )
-        
-        # Get required data - try both _id and id field for car lookup
-        car = mongodb.cars.find_one({'id': booking['car_id']})
-        if not car:
-            car = mongodb.cars.find_one({'_id': safe_object_id(booking['car_id'])})
+        # Booking was written outside the repository layer
+        fragment_cache.bump('bookings', 'payments')
+        # The payment revived a booking that had stopped holding its car
+        if process_result.get('previous_status') not in ACTIVE_STATUSES:
+            booking_hold_changed(dict(booking, status='confirmed'), True)
         
-        user = mongodb.users.find_one({'_id': safe_object_id(session['user_id'])})
-        payment = mongodb.payments.find_one({'id': payment_id})
-        
-        # Get location names from IDs
-        from services.location_service import LocationService
-        pickup_loc_id = booking.get('pickup_location', '')
-        drop_loc_id = booking.get('drop_location', '')
-        pickup_loc = LocationService.get_location_by_id(pickup_loc_id)
-        drop_loc = LocationService.get_location_by_id(drop_loc_id)
-        
-        pickup_location_name = f"{pickup_loc['name']} - {pickup_loc['address']}" if pickup_loc else pickup_loc_id or 'Not specified'
-        drop_location_name = f"{drop_loc['name']} - {drop_loc['address']}" if drop_loc else drop_loc_id or 'Not specified'
-        
-        # Prepare booking data with car details (with None checks)
-        booking_data = {
-            'id': booking['id'],
-            'car_brand': car.get('make', '') if car else 'Unknown',
-            'car_model': car.get('model', '') if car else 'Unknown',
-            'start_date': booking['start_date'],
-            'end_date': booking['end_date'],
-            'total_days': booking.get('total_days', 0),
-            'total_price': booking['total_price'],
-            'pickup_location': pickup_location_name,
-            'drop_location': drop_location_name,
-            'pickup_time': booking.get('pickup_time', 'N/A'),
-            'drop_time': booking.get('drop_time', 'N/A')
-        }
-        
-        payment_data = {
-            'method': payment.get('method', 'N/A'),
-            'transaction_id': payment.get('transaction_id', 'N/A'),
-            'status': 'completed'
-        }
-        
-        user_data = {
-            'username': user.get('username', 'Customer'),
-            'email': user.get('email', session.get('email', '')),
-            'phone': user.get('phone', 'N/A')
-        }
-        
-        # Generate and send combined invoice email
-        try:
-            success, invoice_info = EnhancedNotificationService.generate_and_send_invoice(
-                booking_data, payment_data, user_data
-            )
-            if not success:
-                print("Warning: Invoice generation or email failed")
-        except Exception as e:
-            print(f"Email/Invoice error: {e}")
+        send_payment_invoice(booking, process_result['payment'], current_user_snapshot() or {})
         
         flash('Payment successful! Booking confirmed. Check your email for invoice.')
         return jsonify({
@@ -831,22 +735,70 @@ def process_payment(booking_id):
     
     return jsonify(process_result)
 
+@app.route('/payment-status/<booking_id>')
+def payment_status(booking_id):
+    """Polled by the payment page while an asynchronous gateway charge is outstanding"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not authenticated'})
+    
+    booking = repos.bookings.get(booking_id, session['user_id'])
+    if not booking:
+        return jsonify({'success': False, 'message': 'Booking not found'})
+    
+    if booking.get('payment_status') == 'paid':
+        return jsonify({'success': True, 'status': 'completed',
+                        'redirect': url_for('booking_success', booking_id=booking_id)})
+    
+    latest = PaymentService.get_payment_by_booking(booking_id)
+    if latest['success'] and latest['payment'].get('status') in ('failed', 'expired'):
+        return jsonify({'success': False, 'status': 'failed',
+                        'message': 'Payment was declined. Please reload the page and try again.'})
+    return jsonify({'success': True, 'status': 'pending'})
+
+@app.route('/webhooks/payment', methods=['POST'])
+def payment_webhook():
+    """Signed payment result from the gateway: {'payment_id', 'status': 'succeeded' | 'failed', ...}"""
+    body = request.get_data()
+    if not get_gateway().verify_webhook(body, request.headers.get('X-Gateway-Signature', '')):
+        return jsonify({'success': False, 'message': 'Invalid signature'}), 401
+    
+    event = request.get_json(silent=True) or {}
+    if not event.get('payment_id') or event.get('status') not in ('succeeded', 'failed'):
+        return jsonify({'success': False, 'message': 'Malformed event'}), 400
+    
+    result = PaymentService.finalize_payment(event['payment_id'], event['status'] == 'succeeded', event)
+    if not result['success']:
+        return jsonify(result), 404
+    
+    if result['finalized']:
+        fragment_cache.bump('bookings', 'payments')
+        payment = result['payment']
+        if payment['status'] == 'completed':
+            booking = repos.bookings.get(payment['booking_id'])
+            user = repos.users.get(payment['user_id']) or {}
+            if booking:
+                # The payment revived a booking that had stopped holding its car
+                if result.get('previous_status') not in ACTIVE_STATUSES:
+                    booking_hold_changed(booking, True)
+                send_payment_invoice(booking, payment, user)
+    
+    # Acknowledge repeats too, so the gateway stops retrying
+    return jsonify({'success': True})
+
 @app.route('/booking-success/<booking_id>')
 def booking_success(booking_id):
     if 'user_id' not in session:
         flash('Please login')
         return redirect(url_for('login'))
     
-    booking = mongodb.bookings.find_one({'id': booking_id, 'user_id': session['user_id']})
+    booking = repos.bookings.get(booking_id, session['user_id'])
     
     if not booking:
         flash('Booking not found')
         return redirect(url_for('my_bookings'))
     
     # Try both id and _id field for car lookup
-    car = mongodb.cars.find_one({'id': booking['car_id']})
-    if not car:
-        car = mongodb.cars.find_one({'_id': safe_object_id(booking['car_id'])})
+    car = repos.cars.get(booking['car_id'])
     
     # Provide default values if car not found
     if not car:
@@ -860,51 +812,32 @@ def booking_success(booking_id):
     booking['car'] = car
     booking['_id'] = str(booking.get('_id', ''))
     
-    payment = mongodb.payments.find_one({'booking_id': booking_id})
+    # Failed or expired attempts may come before or after the one that paid
+    payment = repos.payments.get_by_booking(booking_id, ['completed']) or repos.payments.get_by_booking(booking_id)
     
     # Get locations for display
     from services.location_service import LocationService
     locations = LocationService.get_all_locations()
     
     return render_template('booking_success.html', booking=booking, payment=payment, locations=locations)
-=======
-            'status': 'confirmed',
-            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-
-        data_store.bookings.append(booking)
-        data_store.save_bookings()
-
-        # Update car availability
-        car['available'] = False
-        data_store.save_cars()
-
-        flash('Booking confirmed!')
-        return redirect(url_for('my_bookings'))
-
-    return render_template('book_car.html', car=car, today=datetime.now().strftime('%Y-%m-%d'))
->>>>>>> cacc96d203820384eeb4c1f8f91818e62ec3d418
 
 @app.route('/my-bookings')
 def my_bookings():
     if 'user_id' not in session:
         flash('Please login to view your bookings')
         return redirect(url_for('login'))
-<<<<<<< HEAD
     
     # Check and release expired bookings
     check_and_release_expired_bookings()
     
-    bookings = list(mongodb.bookings.find({'user_id': session['user_id']}))
+    bookings = repos.bookings.list_for_user(session['user_id'])
+    # Every booking here is the logged-in user's own
+    user = current_user_snapshot()
     
     for booking in bookings:
         # Try both id and _id field for car lookup
-        car = mongodb.cars.find_one({'id': booking['car_id']})
-        if not car:
-            car = mongodb.cars.find_one({'_id': safe_object_id(booking['car_id'])})
+        car = repos.cars.get(booking['car_id'])
         booking['car'] = car
-        # Get actual user data for this booking
-        user = mongodb.users.find_one({'_id': safe_object_id(booking['user_id'])})
         booking['user'] = {
             'username': user.get('username', 'Unknown') if user else 'Unknown',
             'email': user.get('email', '') if user else ''
@@ -919,7 +852,7 @@ def download_invoice(booking_id):
         flash('Please login')
         return redirect(url_for('login'))
     
-    booking = mongodb.bookings.find_one({'id': booking_id, 'user_id': session['user_id']})
+    booking = repos.bookings.get(booking_id, session['user_id'])
     
     if not booking:
         flash('Booking not found')
@@ -933,52 +866,36 @@ def download_invoice(booking_id):
     
     flash('Invoice not found')
     return redirect(url_for('my_bookings'))
-=======
-
-    user_bookings = []
-    for booking in data_store.bookings:
-        if booking['user_id'] == session['user_id']:
-            # Get car details
-            car = next((car for car in data_store.cars if car['id'] == booking['car_id']), None)
-            if car:
-                booking_with_car = booking.copy()
-                booking_with_car['car'] = car
-                user_bookings.append(booking_with_car)
-
-    return render_template('my_bookings.html', bookings=user_bookings)
->>>>>>> cacc96d203820384eeb4c1f8f91818e62ec3d418
 
 @app.route('/cancel-booking/<booking_id>')
 def cancel_booking(booking_id):
     if 'user_id' not in session:
-<<<<<<< HEAD
         flash('Please login')
         return redirect(url_for('login'))
     
     # Check and release expired bookings first
     check_and_release_expired_bookings()
     
-    booking = mongodb.bookings.find_one({'id': booking_id, 'user_id': session['user_id']})
+    booking = repos.bookings.get(booking_id, session['user_id'])
     
     if not booking:
         flash('Booking not found')
         return redirect(url_for('my_bookings'))
     
     # Update booking status
-    mongodb.bookings.update_one(
-        {'id': booking_id},
-        {'$set': {'status': 'cancelled'}}
-    )
+    repos.bookings.update(booking_id, {'status': 'cancelled'})
+    if booking.get('status') != 'cancelled':
+        LocationService.release_pickup(booking)
+    if booking.get('status') in ACTIVE_STATUSES:
+        booking_hold_changed(booking, False)
     
     # Make car available
-    mongodb.cars.update_one(
-        {'id': booking['car_id']},
-        {'$set': {'available': True}}
-    )
+    repos.cars.set_available(booking['car_id'], True)
     
     # Process refund if payment was made
     if booking.get('payment_status') == 'paid':
-        payment = mongodb.payments.find_one({'booking_id': booking_id})
+        # Refund the attempt that actually paid, not whichever attempt the lookup meets first
+        payment = repos.payments.get_by_booking(booking_id, ['completed'])
         if payment:
             PaymentService.refund_payment(payment['id'], 'Booking cancelled by user')
     
@@ -1007,16 +924,14 @@ def admin_dashboard():
     # Check and release expired bookings
     check_and_release_expired_bookings()
     
-    cars = list(mongodb.cars.find())
-    users = list(mongodb.users.find())
-    bookings = list(mongodb.bookings.find())
+    cars = repos.cars.list_all()
+    users = repos.users.list_all()
+    bookings = repos.bookings.list_all()
     
     # Attach car details to each booking for display
     for booking in bookings:
         # Try both id and _id field for car lookup
-        car = mongodb.cars.find_one({'id': booking['car_id']})
-        if not car:
-            car = mongodb.cars.find_one({'_id': safe_object_id(booking['car_id'])})
+        car = repos.cars.get(booking['car_id'])
         booking['car'] = car
     
     # Sort bookings by created_at, handling both datetime and string
@@ -1042,7 +957,7 @@ def admin_dashboard():
 @app.route('/admin/cars')
 @admin_required
 def admin_cars():
-    cars = list(mongodb.cars.find())
+    cars = repos.cars.list_all()
     return render_template('admin/cars.html', cars=cars)
 
 @app.route('/admin/add-car', methods=['GET', 'POST'])
@@ -1052,24 +967,18 @@ def admin_add_car():
     if request.method == 'POST':
         car_image = request.files.get('car_image')
         image_url = f"https://via.placeholder.com/150?text={request.form['make']}+{request.form['model']}"
+        upload = None
         
         if car_image and allowed_file(car_image.filename):
-            filename = secure_filename(f"{uuid.uuid4()}_{car_image.filename}")
-            car_image.save(os.path.join(UPLOAD_FOLDER, filename))
-            image_url = url_for('static', filename=f'car_images/{filename}')
-        
-        # Generate sequential ID
-        last_car = mongodb.cars.find_one(sort=[('id', -1)])
-        if last_car and last_car.get('id', '').isdigit():
-            next_id = str(int(last_car['id']) + 1)
-        else:
-            # Find highest numeric ID
-            cars = list(mongodb.cars.find())
-            numeric_ids = [int(c['id']) for c in cars if c.get('id', '').isdigit()]
-            next_id = str(max(numeric_ids) + 1) if numeric_ids else '1'
+            try:
+                upload = ImageService.save_upload(car_image, UPLOAD_FOLDER)
+            except ValueError as e:
+                flash(str(e))
+                return render_template('admin/add_car.html')
+            image_manifest.add(upload['filename'])
+            image_url = url_for('static', filename=f"car_images/{upload['filename']}")
         
         new_car = {
-            'id': next_id,
             'make': request.form.get('make'),
             'model': request.form.get('model'),
             'year': int(request.form.get('year')),
@@ -1081,7 +990,26 @@ def admin_add_car():
             'review_count': 0
         }
         
-        mongodb.cars.insert_one(new_car)
+        # Sequential ID: max + 1, taking the next one if another admin got there first
+        for _ in range(5):
+            next_id = new_car['id'] = repos.cars.next_id()
+            try:
+                repos.cars.add(new_car)
+                break
+            except ValueError:
+                continue
+        else:
+            flash('Could not allocate a vehicle ID. Please try again.')
+            return render_template('admin/add_car.html')
+        pricing_engine.car_changed(next_id)
+        availability_index.car_changed()
+        
+        # Resized variants are generated off the request thread
+        if upload:
+            ImageService.generate_variants_async(
+                upload['path'], upload['hash'],
+                on_complete=lambda variants: repos.cars.update(next_id, {'image_variants': variants})
+            )
         flash('Vehicle added successfully')
         return redirect(url_for('admin_cars'))
     
@@ -1091,7 +1019,7 @@ def admin_add_car():
 @admin_required
 def admin_edit_car(car_id):
     
-    car = mongodb.cars.find_one({'id': car_id})
+    car = repos.cars.get(car_id)
     if not car:
         flash('Car not found')
         return redirect(url_for('admin_cars'))
@@ -1109,7 +1037,8 @@ def admin_edit_car(car_id):
         if request.form.get('image'):
             update_data['image'] = request.form.get('image')
         
-        mongodb.cars.update_one({'id': car_id}, {'$set': update_data})
+        repos.cars.update(car_id, update_data)
+        pricing_engine.car_changed(car_id)
         flash('Car updated successfully')
         return redirect(url_for('admin_cars'))
     
@@ -1120,7 +1049,9 @@ def admin_edit_car(car_id):
 @admin_required
 def admin_delete_car(car_id):
     
-    mongodb.cars.delete_one({'id': car_id})
+    repos.cars.delete(car_id)
+    pricing_engine.car_changed(car_id)
+    availability_index.car_changed()
     flash('Car deleted successfully')
     return redirect(url_for('admin_cars'))
 
@@ -1128,7 +1059,7 @@ def admin_delete_car(car_id):
 @admin_required
 def admin_bookings():
     
-    bookings = list(mongodb.bookings.find())
+    bookings = repos.bookings.list_all()
     
     # Sort by created_at descending (latest first)
     def get_sort_key(b):
@@ -1141,13 +1072,12 @@ def admin_bookings():
         return created or datetime.min
         
     bookings.sort(key=get_sort_key, reverse=True)
+    users = repos.users.get_many(booking['user_id'] for booking in bookings)
     
     for booking in bookings:
         # Try both id and _id field for car lookup
-        car = mongodb.cars.find_one({'id': booking['car_id']})
-        if not car:
-            car = mongodb.cars.find_one({'_id': safe_object_id(booking['car_id'])})
-        user = mongodb.users.find_one({'_id': safe_object_id(booking['user_id'])})
+        car = repos.cars.get(booking['car_id'])
+        user = users.get(str(booking['user_id']))
         booking['car'] = car if car else {'make': 'Unknown', 'model': 'Vehicle', 'year': 'N/A', 'image': '/static/car_images/default_car.jpg', 'id': booking['car_id']}
         booking['user'] = user if user else {'username': 'Unknown User'}
         booking['_id'] = str(booking.get('_id', ''))
@@ -1158,19 +1088,27 @@ def admin_bookings():
 @admin_required
 def admin_update_booking(booking_id):
     
-    booking = mongodb.bookings.find_one({'id': booking_id})
+    booking = repos.bookings.get(booking_id)
     if not booking:
         flash('Booking not found')
         return redirect(url_for('admin_bookings'))
     
     status = request.form.get('status')
-    mongodb.bookings.update_one({'id': booking_id}, {'$set': {'status': status}})
+    repos.bookings.update(booking_id, {'status': status})
+    
+    # Keep pickup slot counters in step with cancellations and reinstatements
+    if status == 'cancelled' and booking.get('status') != 'cancelled':
+        LocationService.release_pickup(booking)
+    elif status != 'cancelled' and booking.get('status') == 'cancelled':
+        LocationService.reserve_pickup(booking, enforce=False)  # Admin's call, even over capacity
+    
+    # Only pending and confirmed bookings hold a car
+    was_active = booking.get('status') in ACTIVE_STATUSES
+    if was_active != (status in ACTIVE_STATUSES):
+        booking_hold_changed(booking, status in ACTIVE_STATUSES)
     
     if status == 'cancelled':
-        mongodb.cars.update_one(
-            {'id': booking['car_id']},
-            {'$set': {'available': True}}
-        )
+        repos.cars.set_available(booking['car_id'], True)
     
     flash('Booking status updated successfully')
     return redirect(url_for('admin_bookings'))
@@ -1179,7 +1117,7 @@ def admin_update_booking(booking_id):
 @admin_required
 def admin_users():
     
-    users = list(mongodb.users.find())
+    users = repos.users.list_all()
     for user in users:
         user['_id'] = str(user.get('_id', ''))
         user.pop('password', None)  # Remove password from display
@@ -1192,14 +1130,24 @@ def admin_users():
 @admin_required
 def migrate_data():
     
-    try:
-        mongodb.migrate_from_json()
-        flash('Data migrated successfully from JSON to MongoDB!')
-    except Exception as e:
-        flash(f'Error migrating data: {str(e)}')
+    # Run in the background - large exports must not tie up a web worker
+    if MigrationService.start_background():
+        flash('Data migration started. Check /admin/migrate-status for progress.')
+    else:
+        flash('A data migration is already running.')
     
     return redirect(url_for('admin_dashboard'))
 
+@app.route('/admin/migrate-status')
+@admin_required
+def migrate_status():
+    """API endpoint for background migration progress"""
+    status = MigrationService.get_status()
+    for key in ('started_at', 'finished_at'):
+        if status[key]:
+            status[key] = status[key].isoformat()
+    return jsonify(status)
+
 # ==================== FAVICON ====================
 
 @app.route('/favicon.ico')
@@ -1214,7 +1162,7 @@ def add_review(booking_id):
         flash('Please login to add a review')
         return redirect(url_for('login'))
     
-    booking = mongodb.bookings.find_one({'id': booking_id, 'user_id': session['user_id']})
+    booking = repos.bookings.get(booking_id, session['user_id'])
     if not booking:
         flash('Booking not found')
         return redirect(url_for('my_bookings'))
@@ -1223,7 +1171,7 @@ def add_review(booking_id):
         flash('Can only review completed bookings')
         return redirect(url_for('my_bookings'))
     
-    car = mongodb.cars.find_one({'id': booking['car_id']})
+    car = repos.cars.get(booking['car_id'])
     
     if request.method == 'POST':
         rating = int(request.form.get('rating', 0))
@@ -1241,6 +1189,8 @@ def add_review(booking_id):
         
         flash(message)
         if success:
+            # Rating and review count changed
+            repos.cars.invalidate(booking['car_id'])
             return redirect(url_for('car_details', car_id=booking['car_id']))
         
     return render_template('add_review.html', booking=booking, car=car)
@@ -1280,10 +1230,85 @@ def admin_analytics():
 
 @app.route('/api/time-slots')
 def api_time_slots():
-    """API endpoint to get available time slots for a date"""
+    """API endpoint to get available time slots for a date, and remaining pickups when a location is given"""
     date_str = request.args.get('date', '')
-    time_slots = LocationService.get_available_time_slots(date_str)
-    return jsonify({'time_slots': time_slots})
+    location_id = request.args.get('location', '')
+    time_slots = LocationService.get_available_time_slots(date_str, location_id)
+    if not location_id or not date_str:
+        return jsonify({'time_slots': time_slots})
+    try:
+        availability = LocationService.get_slot_availability(date_str, location_id)
+    except ValueError:
+        availability = {}
+    return jsonify({'time_slots': time_slots, 'availability': availability})
+
+@app.route('/api/available-cars')
+def api_available_cars():
+    """API endpoint for cars free for a whole date range: start_date, end_date, optional type and make"""
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    try:
+        datetime.strptime(start_date, '%Y-%m-%d')
+        datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'success': False, 'message': 'start_date and end_date must be YYYY-MM-DD'}), 400
+    
+    query = {}
+    if request.args.get('type'):
+        query['vehicle_type'] = request.args['type']
+    if request.args.get('make'):
+        query['make'] = request.args['make']
+    
+    try:
+        cars = availability_index.free_cars(repos.cars.find(query), start_date, end_date)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    fields = ('id', 'make', 'model', 'year', 'vehicle_type', 'price_per_day', 'image', 'rating')
+    return jsonify({
+        'success': True,
+        'start_date': start_date,
+        'end_date': end_date,
+        'count': len(cars),
+        'cars': [dict({field: car.get(field) for field in fields}, _id=str(car.get('_id', ''))) for car in cars]
+    })
+
+@app.route('/api/quote')
+def api_quote():
+    """API endpoint for a booking price breakdown: car_id, start_date, end_date, pickup_location, drop_location"""
+    if not within_rate_limits(('quote:ip', request.remote_addr)):
+        return jsonify({'success': False, 'message': 'Too many requests. Please slow down.'}), 429
+    
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    try:
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+    # Bounds checked before any lookup, so junk ranges never reach the pricing engine
+    if start < datetime.now().date():
+        return jsonify({'success': False, 'message': 'Start date is in the past'}), 400
+    if end < start:
+        return jsonify({'success': False, 'message': 'End date must be after start date'}), 400
+    if (end - start).days + 1 > app.config['PRICING_MAX_RENTAL_DAYS']:
+        return jsonify({'success': False,
+                        'message': f"Rentals are limited to {app.config['PRICING_MAX_RENTAL_DAYS']} days"}), 400
+    
+    car = repos.cars.get(request.args.get('car_id', ''))
+    if not car:
+        return jsonify({'success': False, 'message': 'Car not found'}), 404
+    try:
+        quote = quote_service.quote(
+            car,
+            start_date,
+            end_date,
+            request.args.get('pickup_location', ''),
+            request.args.get('drop_location', '')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'quote': quote})
 
 @app.route('/api/locations')
 def api_locations():
@@ -1291,15 +1316,41 @@ def api_locations():
     locations = LocationService.get_all_locations()
     return jsonify({'locations': locations})
 
+@app.route('/api/cache-stats')
+@admin_required
+def api_cache_stats():
+    """API endpoint for car cache hit rates per route"""
+    return jsonify(dict(repos.cars.cache_stats(), fragments=fragment_cache.stats()))
+
+@app.route('/api/template-stats')
+@admin_required
+def api_template_stats():
+    """API endpoint for per-template load and render times"""
+    return jsonify(template_profiler.report())
+
+@app.route('/api/reconciliation/latest')
+@admin_required
+def api_reconciliation_latest():
+    """API endpoint for the most recent payment reconciliation summary (run reconcile_payments.py)"""
+    from database import mongodb
+    report = mongodb.reconciliation_reports.find_one(sort=[('started_at', -1)], projection={'_id': 0})
+    return jsonify(report or {})
+
+@app.route('/api/compression-stats')
+@admin_required
+def api_compression_stats():
+    """API endpoint for bytes saved by compression and 304 responses per route"""
+    return jsonify(response_optimizer.stats())
+
 @app.route('/api/vehicle-stats')
 @admin_required
 def api_vehicle_stats():
     """API endpoint for vehicle statistics"""
     vehicle_type = request.args.get('type', '')
     stats = {
-        'total': mongodb.cars.count_documents({'vehicle_type': vehicle_type} if vehicle_type else {}),
-        'available': mongodb.cars.count_documents({'vehicle_type': vehicle_type, 'available': True} if vehicle_type else {'available': True}),
-        'booked': mongodb.cars.count_documents({'vehicle_type': vehicle_type, 'available': False} if vehicle_type else {'available': False})
+        'total': repos.cars.count({'vehicle_type': vehicle_type} if vehicle_type else {}),
+        'available': repos.cars.count({'vehicle_type': vehicle_type, 'available': True} if vehicle_type else {'available': True}),
+        'booked': repos.cars.count({'vehicle_type': vehicle_type, 'available': False} if vehicle_type else {'available': False})
     }
     return jsonify(stats)
 
@@ -1308,16 +1359,14 @@ def api_vehicle_stats():
 @app.route('/track/<booking_id>')
 def track_vehicle(booking_id):
     """GPS tracking page for a booking"""
-    booking = mongodb.bookings.find_one({'id': booking_id})
+    booking = repos.bookings.get(booking_id)
     
     if not booking:
         flash('Booking not found')
         return redirect(url_for('index'))
     
     # Get car details with dual lookup
-    car = mongodb.cars.find_one({'id': booking['car_id']})
-    if not car:
-        car = mongodb.cars.find_one({'_id': safe_object_id(booking['car_id'])})
+    car = repos.cars.get(booking['car_id'])
     
     # Prepare booking data for template
     tracking_data = {
@@ -1369,6 +1418,15 @@ def api_gps_eta():
 def not_found(e):
     return render_template('404.html'), 404
 
+@app.errorhandler(413)
+def request_too_large(e):
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    if request.path.startswith('/api/'):
+        return jsonify({'error': f'Upload too large (limit {limit_mb} MB)'}), 413
+    flash(f'That file is too large. Uploads are limited to {limit_mb} MB.')
+    # Back to the form (as a GET), never into a redirect loop on the same POST
+    return redirect(request.referrer or url_for('index'))
+
 @app.errorhandler(500)
 def internal_error(e):
     return render_template('500.html'), 500
@@ -1377,172 +1435,3 @@ def internal_error(e):
 
 if __name__ == '__main__':
     app.run(debug=True)
-=======
-        flash('Please login to cancel a booking')
-        return redirect(url_for('login'))
-
-    booking = next((booking for booking in data_store.bookings if booking['id'] == booking_id), None)
-    if not booking or booking['user_id'] != session['user_id']:
-        flash('Booking not found or not authorized')
-        return redirect(url_for('my_bookings'))
-
-    # Update booking status
-    booking['status'] = 'cancelled'
-
-    # Make car available again
-    car = next((car for car in data_store.cars if car['id'] == booking['car_id']), None)
-    if car:
-        car['available'] = True
-        data_store.save_cars()
-
-    data_store.save_bookings()
-
-    flash('Booking cancelled successfully')
-    return redirect(url_for('my_bookings'))
-
-# Admin routes
-@app.route('/admin')
-def admin_dashboard():
-    if 'user_id' not in session or not session.get('is_admin', False):
-        flash('Admin access required')
-        return redirect(url_for('home'))
-
-    return render_template('admin/dashboard.html',
-                           cars=data_store.cars,
-                           users=data_store.users,
-                           bookings=data_store.bookings)
-
-@app.route('/admin/cars')
-def admin_cars():
-    if 'user_id' not in session or not session.get('is_admin', False):
-        flash('Admin access required')
-        return redirect(url_for('home'))
-
-    return render_template('admin/cars.html', cars=data_store.cars)
-
-@app.route('/admin/add-car', methods=['GET', 'POST'])
-def admin_add_car():
-    if 'user_id' not in session or not session.get('is_admin', False):
-        flash('Admin access required')
-        return redirect(url_for('home'))
-
-    if request.method == 'POST':
-        # Handle image upload
-        car_image = request.files['car_image']
-        image_url = f"https://via.placeholder.com/150?text={request.form['make']}+{request.form['model']}"
-
-        if car_image and allowed_file(car_image.filename):
-            filename = secure_filename(f"{uuid.uuid4()}_{car_image.filename}")
-            car_image.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            image_url = url_for('static', filename=f'car_images/{filename}')
-
-        new_car = {
-            'id': str(len(data_store.cars) + 1),
-            'make': request.form['make'],
-            'model': request.form['model'],
-            'year': int(request.form['year']),
-            'price_per_day': float(request.form['price_per_day']),
-            'available': True,
-            'image': image_url
-        }
-
-        data_store.cars.append(new_car)
-        data_store.save_cars()
-
-        flash('Car added successfully')
-        return redirect(url_for('admin_cars'))
-
-    return render_template('admin/add_car.html')
-
-@app.route('/admin/edit-car/<car_id>', methods=['GET', 'POST'])
-def admin_edit_car(car_id):
-    if 'user_id' not in session or not session.get('is_admin', False):
-        flash('Admin access required')
-        return redirect(url_for('home'))
-
-    car = next((car for car in data_store.cars if car['id'] == car_id), None)
-    if not car:
-        flash('Car not found')
-        return redirect(url_for('admin_cars'))
-
-    if request.method == 'POST':
-        car['make'] = request.form['make']
-        car['model'] = request.form['model']
-        car['year'] = int(request.form['year'])
-        car['price_per_day'] = float(request.form['price_per_day'])
-        car['available'] = 'available' in request.form
-        car['image'] = request.form['image'] or car['image']
-
-        data_store.save_cars()
-
-        flash('Car updated successfully')
-        return redirect(url_for('admin_cars'))
-
-    return render_template('admin/edit_car.html', car=car)
-
-@app.route('/admin/delete-car/<car_id>')
-def admin_delete_car(car_id):
-    if 'user_id' not in session or not session.get('is_admin', False):
-        flash('Admin access required')
-        return redirect(url_for('home'))
-
-    car_index = next((i for i, car in enumerate(data_store.cars) if car['id'] == car_id), None)
-    if car_index is not None:
-        data_store.cars.pop(car_index)
-        data_store.save_cars()
-        flash('Car deleted successfully')
-    else:
-        flash('Car not found')
-
-    return redirect(url_for('admin_cars'))
-
-@app.route('/admin/bookings')
-def admin_bookings():
-    if 'user_id' not in session or not session.get('is_admin', False):
-        flash('Admin access required')
-        return redirect(url_for('home'))
-
-    bookings_with_details = []
-    for booking in data_store.bookings:
-        # Get car details
-        car = next((car for car in data_store.cars if car['id'] == booking['car_id']), None)
-        # Get user details
-        user = next((user for user in data_store.users if user['id'] == booking['user_id']), None)
-
-        if car and user:
-            booking_with_details = booking.copy()
-            booking_with_details['car'] = car
-            booking_with_details['user'] = user
-            bookings_with_details.append(booking_with_details)
-
-    return render_template('admin/bookings.html', bookings=bookings_with_details)
-
-@app.route('/admin/update-booking/<booking_id>', methods=['POST'])
-def admin_update_booking(booking_id):
-    if 'user_id' not in session or not session.get('is_admin', False):
-        flash('Admin access required')
-        return redirect(url_for('home'))
-
-    booking = next((booking for booking in data_store.bookings if booking['id'] == booking_id), None)
-    if not booking:
-        flash('Booking not found')
-        return redirect(url_for('admin_bookings'))
-
-    status = request.form['status']
-    booking['status'] = status
-
-    # If cancelled, make car available again
-    if status == 'cancelled':
-        car = next((car for car in data_store.cars if car['id'] == booking['car_id']), None)
-        if car:
-            car['available'] = True
-            data_store.save_cars()
-
-    data_store.save_bookings()
-
-    flash('Booking status updated successfully')
-    return redirect(url_for('admin_bookings'))
-
-if __name__ == '__main__':
-    app.run(debug=True)
->>>>>>> cacc96d203820384eeb4c1f8f91818e62ec3d418
@@ -0,0 +1,50 @@
+import argparse
+from datetime import datetime
+
+# Bytes on the wire per route: uncompressed, gzip, brotli and a 304 revalidation
+parser = argparse.ArgumentParser(description='Measure bytes saved by compression and conditional GET')
+parser.add_argument('--routes', default='', help='Comma-separated paths (defaults to the main pages and APIs)')
+parser.add_argument('--mongomock', action='store_true', help='Run against a seeded in-memory mongomock database')
+args = parser.parse_args()
+
+if args.mongomock:
+    import mongomock
+    import pymongo
+    pymongo.MongoClient = mongomock.MongoClient
+    from database import mongodb
+    from services.synthetic_data import FleetGenerator, MongoSink
+    FleetGenerator(20, 50, 200, seed=42).generate(MongoSink(mongodb))
+
+from app import app, repos
+
+if args.routes:
+    routes = args.routes.split(',')
+else:
+    routes = ['/', '/api/locations', f"/api/time-slots?date={datetime.now().strftime('%Y-%m-%d')}",
+              '/api/gps/journey/demo', '/login', '/register']
+    cars = repos.cars.find(limit=1)
+    if cars:
+        routes.append(f"/car/{cars[0].get('id') or cars[0]['_id']}")
+
+client = app.test_client()
+
+
+def fetch(path, **headers):
+    response = client.get(path, headers=headers)
+    return response, len(response.get_data())
+
+
+print(f"{'route':<40} {'status':>6} {'identity':>10} {'gzip':>10} {'br':>10} {'304':>6} {'saved':>7}")
+for path in routes:
+    plain, plain_bytes = fetch(path)
+    gzipped, gzip_bytes = fetch(path, **{'Accept-Encoding': 'gzip'})
+    brotlied, br_bytes = fetch(path, **{'Accept-Encoding': 'br, gzip'})
+    br_label = br_bytes if brotlied.headers.get('Content-Encoding') == 'br' else '-'
+
+    etag = plain.headers.get('ETag')
+    revalidated, revalidated_bytes = fetch(path, **{'If-None-Match': etag}) if etag else (None, plain_bytes)
+    not_modified = 'yes' if revalidated is not None and revalidated.status_code == 304 else 'no'
+
+    best = min(gzip_bytes, br_bytes)
+    saved = f"{100 * (1 - best / plain_bytes):.0f}%" if plain_bytes else '-'
+    print(f"{path:<40} {plain.status_code:>6} {plain_bytes:>10} {gzip_bytes:>10} {br_label:>10} {not_modified:>6} {saved:>7}")
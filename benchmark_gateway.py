@@ -0,0 +1,91 @@
+import argparse
+import threading
+import json
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from services.payment_service import HTTPGateway
+from stub_gateway import make_server
+
+# End-to-end gateway throughput against the local stub: charges submitted
+# through the pooled async client, outcomes received on a local webhook.
+parser = argparse.ArgumentParser(description='Benchmark the async gateway client and webhook round trip')
+parser.add_argument('--charges', type=int, default=500)
+parser.add_argument('--pool-size', type=int, default=20)
+parser.add_argument('--delay', type=float, default=0.1, help='Stub delay before each webhook')
+parser.add_argument('--timeout', type=float, default=10)
+parser.add_argument('--port', type=int, default=8090)
+args = parser.parse_args()
+
+secret = 'benchmark-secret'
+stub = make_server(args.port, secret, args.delay)
+threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+gateway = HTTPGateway(f'http://127.0.0.1:{args.port}', 'benchmark', secret, args.timeout, args.pool_size)
+submitted = {}
+accepted = {}
+received = {}
+failed = []
+all_received = threading.Event()
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if gateway.verify_webhook(body, self.headers.get('X-Gateway-Signature', '')):
+            received[json.loads(body)['payment_id']] = time.perf_counter()
+            if len(received) >= args.charges:
+                all_received.set()
+            self.send_response(200)
+        else:
+            self.send_response(401)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+receiver = ThreadingHTTPServer(('127.0.0.1', 0), WebhookHandler)
+receiver.daemon_threads = True
+threading.Thread(target=receiver.serve_forever, daemon=True).start()
+callback_url = f'http://127.0.0.1:{receiver.server_address[1]}/webhooks/payment'
+
+
+def on_reply(payment_id, future):
+    try:
+        future.result()
+        accepted[payment_id] = time.perf_counter()
+    except Exception as e:
+        failed.append((payment_id, e))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0
+
+
+start = time.perf_counter()
+for i in range(args.charges):
+    payment = {'id': f'bench-{i}', 'amount': 1000 + i, 'payment_method': 'credit_card'}
+    submitted[payment['id']] = time.perf_counter()
+    gateway.charge(payment, callback_url).add_done_callback(
+        lambda future, payment_id=payment['id']: on_reply(payment_id, future))
+submit_time = time.perf_counter() - start
+
+all_received.wait(timeout=args.timeout + args.delay + 30)
+total_time = time.perf_counter() - start
+
+charge_ms = [(accepted[p] - submitted[p]) * 1000 for p in accepted]
+round_trip_ms = [(received[p] - submitted[p]) * 1000 for p in received]
+
+print(f"Charges: {args.charges}  pool size: {args.pool_size}  stub delay: {args.delay}s")
+print(f"Submitted in {submit_time * 1000:.1f} ms (caller never waits on the gateway)")
+print(f"Accepted: {len(accepted)}  errors: {len(failed)}  webhooks: {len(received)}")
+print(f"Charge latency   p50 {percentile(charge_ms, 50):8.1f} ms  p95 {percentile(charge_ms, 95):8.1f} ms")
+print(f"Webhook latency  p50 {percentile(round_trip_ms, 50):8.1f} ms  p95 {percentile(round_trip_ms, 95):8.1f} ms")
+print(f"Throughput: {len(received) / total_time:.1f} confirmed payments/s")
+for payment_id, error in failed[:5]:
+    print(f"  {payment_id}: {error}")
+
+gateway.close()
+stub.shutdown()
+receiver.shutdown()
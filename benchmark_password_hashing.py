@@ -0,0 +1,59 @@
+import argparse
+import threading
+import time
+import bcrypt
+from services.auth_service import AuthService, HashingBusyError
+
+# Login throughput (bcrypt verifications per second) at different cost factors
+parser = argparse.ArgumentParser(description='Benchmark password verification throughput per bcrypt cost')
+parser.add_argument('--costs', default='10,11,12,13', help='Comma-separated bcrypt cost factors')
+parser.add_argument('--logins', type=int, default=64, help='Verifications per cost factor')
+parser.add_argument('--clients', type=int, default=16, help='Concurrent simulated request threads')
+args = parser.parse_args()
+
+PASSWORD = 'correct horse battery staple'
+
+
+def run(hashed):
+    latencies = []
+    rejected = [0]
+    lock = threading.Lock()
+    per_client = max(1, args.logins // args.clients)
+
+    def client():
+        for _ in range(per_client):
+            started = time.perf_counter()
+            try:
+                AuthService.verify_password(PASSWORD, hashed)
+            except HashingBusyError:
+                with lock:
+                    rejected[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, sorted(latencies), rejected[0]
+
+
+print(f"{args.clients} concurrent clients, hashing pool of {AuthService._executor._max_workers}")
+print(f"{'cost':>4} {'single ms':>10} {'logins/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'rejected':>9}")
+for cost in [int(c) for c in args.costs.split(',')]:
+    hashed = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(cost)).decode('utf-8')
+
+    started = time.perf_counter()
+    bcrypt.checkpw(PASSWORD.encode('utf-8'), hashed.encode('utf-8'))
+    single_ms = (time.perf_counter() - started) * 1000
+
+    elapsed, latencies, rejected = run(hashed)
+    if not latencies:
+        print(f"{cost:>4} {single_ms:>10.1f} {'-':>10} {'-':>8} {'-':>8} {rejected:>9}")
+        continue
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{cost:>4} {single_ms:>10.1f} {len(latencies) / elapsed:>10.1f} {p50:>8.1f} {p95:>8.1f} {rejected:>9}")
@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import date, datetime, timedelta
+from config import Config
+
+# Latency, Mongo queries and peak memory per route through the Flask test client,
+# against a freshly seeded scratch database at each data size. Compares each run
+# with a saved baseline and exits non-zero when a metric regresses past the
+# BENCHMARK_* thresholds in config.py.
+ROUTES = ['index', 'car_details', 'admin_dashboard', 'admin_analytics', 'process_payment']
+
+parser = argparse.ArgumentParser(description='Benchmark routes at several data sizes and check for regressions')
+parser.add_argument('--sizes', default='20000,200000', help='Comma-separated row counts to seed (see generate_fleet.py)')
+parser.add_argument('--routes', default=','.join(ROUTES), help=f"Comma-separated subset of: {', '.join(ROUTES)}")
+parser.add_argument('--iterations', type=int, default=30, help='Timed requests per route, after one warm-up')
+parser.add_argument('--db-name', default=f'{Config.MONGO_DB_NAME}_bench', help='Scratch database, dropped before each size')
+parser.add_argument('--mongomock', action='store_true', help='Use mongomock instead of MongoDB (no query counts)')
+parser.add_argument('--baseline', default=Config.BENCHMARK_BASELINE)
+parser.add_argument('--save', action='store_true', help='Write this run as the new baseline')
+parser.add_argument('--seed', type=int, default=42)
+parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+if args.worker is None and args.db_name == Config.MONGO_DB_NAME:
+    sys.exit(f"Refusing to benchmark against {Config.MONGO_DB_NAME}: it is dropped and reseeded")
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_worker(rows):
+    """Seed the scratch database with `rows` rows, measure each route, print the results"""
+    counter = None
+    if args.mongomock:
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+    else:
+        from pymongo import MongoClient, monitoring
+
+        class QueryCounter(monitoring.CommandListener):
+            """Counts every command the app sends"""
+            count = 0
+
+            def started(self, event):
+                self.count += 1
+
+            def succeeded(self, event):
+                pass
+
+            def failed(self, event):
+                pass
+
+        MongoClient(Config.MONGO_URI).drop_database(Config.MONGO_DB_NAME)
+        counter = QueryCounter()
+        monitoring.register(counter)
+
+    # Imported after the drop so the app's indexes exist on the fresh database
+    from database import mongodb
+    from services.synthetic_data import FleetGenerator, MongoSink, rows_for
+    sizes = rows_for(rows)
+    generator = FleetGenerator(sizes['cars'], sizes['users'], sizes['bookings'], seed=args.seed,
+                               review_share=sizes['review_share'], tracked_share=sizes['tracked_share'],
+                               gps_points_per_track=sizes['gps_points_per_track'])
+    generator.generate(MongoSink(mongodb))
+    # An admin sharing the generated users' password hash
+    admin = mongodb.users.find_one({'username': 'loaduser1'}, {'_id': 0})
+    admin.update(id='admin', username='benchadmin', email='benchadmin@loadtest.example', is_admin=True)
+    mongodb.users.insert_one(admin)
+
+    from app import app
+    app.testing = True  # Flask-Mail suppresses invoice emails
+    picker = random.Random(args.seed)
+
+    def client_for(username):
+        client = app.test_client()
+        response = client.post('/login', data={'username': username, 'password': generator.password})
+        if response.status_code not in (302, 303):
+            raise RuntimeError(f'Login as {username} failed ({response.status_code})')
+        return client
+
+    user_client, admin_client = client_for('loaduser1'), client_for('benchadmin')
+    # Booking takes a car off the market, so every payment needs a car of its own
+    bookable = [car['id'] for car in mongodb.cars.find({'available': True}, {'id': 1})]
+    picker.shuffle(bookable)
+
+    def book_for_payment():
+        # Untimed: a fresh pending booking past the seeded window for each payment
+        if not bookable:
+            raise RuntimeError('Ran out of available cars to book: use a larger size or fewer iterations')
+        car_id = bookable.pop()
+        start = date.today() + timedelta(days=generator.future_days + 10 + len(bookable) % 365)
+        response = user_client.post(f'/book/{car_id}', data={
+            'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=1)).isoformat(),
+            'pickup_location': 'loc1',
+            'drop_location': 'loc2',
+            'pickup_time': '10:00 AM',
+            'drop_time': '10:00 AM'
+        })
+        location = response.headers.get('Location', '')
+        if '/payment/' not in location:
+            raise RuntimeError(f'Booking car {car_id} failed ({response.status_code})')
+        booking_id = location.rstrip('/').rsplit('/', 1)[-1]
+        return 'POST', f'/process-payment/{booking_id}', {'payment_method': 'UPI', 'idempotency_key': uuid.uuid4().hex}
+
+    def page_ok(response):
+        return response.status_code == 200
+
+    def payment_ok(response):
+        return response.status_code == 200 and (response.get_json(silent=True) or {}).get('success')
+
+    routes = {
+        'index': (user_client, lambda: ('GET', '/', None), page_ok),
+        'car_details': (user_client, lambda: ('GET', f'/car/{picker.randint(1, generator.cars)}', None), page_ok),
+        'admin_dashboard': (admin_client, lambda: ('GET', '/admin', None), page_ok),
+        'admin_analytics': (admin_client, lambda: ('GET', '/admin/analytics', None), page_ok),
+        'process_payment': (user_client, book_for_payment, payment_ok),
+    }
+
+    results = {}
+    for name in args.routes.split(','):
+        client, prepare, check = routes[name]
+        latencies, queries, cold = [], [], None
+        try:
+            for i in range(args.iterations + 1):
+                method, path, data = prepare()
+                before = counter.count if counter else 0
+                started = time.perf_counter()
+                response = client.open(path, method=method, data=data)
+                elapsed = time.perf_counter() - started
+                if not check(response):
+                    raise RuntimeError(f'{method} {path} returned {response.status_code}')
+                if i == 0:
+                    cold = elapsed  # Warm-up: loads indexes, compiles templates, fills caches
+                    continue
+                latencies.append(elapsed)
+                if counter:
+                    queries.append(counter.count - before)
+
+            # Separate pass: tracemalloc slows every allocation, so it never overlaps timing
+            peak = 0
+            tracemalloc.start()
+            for _ in range(max(3, args.iterations // 5)):
+                method, path, data = prepare()
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+                client.open(path, method=method, data=data)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+            tracemalloc.stop()
+        except Exception as e:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            results[name] = {'error': str(e)}
+            continue
+
+        latencies.sort()
+        queries.sort()
+        results[name] = {
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'cold_ms': round(cold * 1000, 2),
+            'queries': queries[len(queries) // 2] if queries else None,
+            'peak_kb': round(peak / 1024, 1)
+        }
+    print('RESULT ' + json.dumps(results), flush=True)
+
+
+def regression(metric, old, new):
+    """Why `new` regressed from `old`, or None"""
+    if old is None or new is None:
+        return None
+    if metric in ('p50_ms', 'p95_ms'):
+        if new > old * (1 + Config.BENCHMARK_LATENCY_THRESHOLD) and new - old > Config.BENCHMARK_LATENCY_FLOOR_MS:
+            return f'{metric} {old} -> {new}'
+    elif metric == 'queries':
+        if new > old + Config.BENCHMARK_QUERY_THRESHOLD:
+            return f'queries {old} -> {new}'
+    elif metric == 'peak_kb':
+        if new > old * (1 + Config.BENCHMARK_MEMORY_THRESHOLD):
+            return f'peak_kb {old} -> {new}'
+    return None
+
+
+if args.worker is not None:
+    run_worker(args.worker)
+    sys.exit(0)
+
+env = dict(os.environ, MONGO_DB_NAME=args.db_name, STORAGE_BACKEND='mongo', PAYMENT_GATEWAY_URL='',
+           SESSION_BACKEND='memory', RATE_LIMIT_BACKEND='memory',
+           MAIL_DEFAULT_SENDER=os.getenv('MAIL_DEFAULT_SENDER') or 'bench@loadtest.example')
+passthrough = ['--routes', args.routes, '--iterations', str(args.iterations), '--db-name', args.db_name,
+               '--seed', str(args.seed)] + (['--mongomock'] if args.mongomock else [])
+
+baseline = {}
+if os.path.exists(args.baseline):
+    with open(args.baseline) as f:
+        baseline = json.load(f).get('results', {})
+
+results = {}
+for rows in [int(size) for size in args.sizes.split(',')]:
+    print(f"Seeding {rows} rows into {args.db_name} and running {args.iterations} requests per route...")
+    worker = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', str(rows)] + passthrough,
+                            env=env, capture_output=True, text=True)
+    lines = [line for line in worker.stdout.splitlines() if line.startswith('RESULT ')]
+    if worker.returncode != 0 or not lines:
+        print(worker.stdout[-2000:] + worker.stderr[-2000:])
+        sys.exit(f"Benchmark worker for {rows} rows failed")
+    # Background threads (invoice emails) may print right after the result on the same line
+    results[str(rows)] = json.JSONDecoder().raw_decode(lines[-1][len('RESULT '):])[0]
+
+problems = []
+print(f"\n{'rows':>8} {'route':<18}{'p50 ms':>9}{'p95 ms':>9}{'cold ms':>9}{'queries':>9}{'peak KB':>10}  vs baseline")
+print('-' * 96)
+for rows, routes in results.items():
+    for name, metrics in routes.items():
+        if 'error' in metrics:
+            problems.append(f"{rows} rows {name}: {metrics['error']}")
+            print(f"{rows:>8} {name:<18}  ERROR {metrics['error']}")
+            continue
+        old = baseline.get(rows, {}).get(name, {})
+        found = [reason for reason in (regression(metric, old.get(metric), metrics[metric])
+                                       for metric in ('p50_ms', 'p95_ms', 'queries', 'peak_kb')) if reason]
+        problems.extend(f"{rows} rows {name}: {reason}" for reason in found)
+        status = ('REGRESSED ' + '; '.join(found)) if found else ('ok' if old else 'new')
+        queries = '-' if metrics['queries'] is None else metrics['queries']
+        print(f"{rows:>8} {name:<18}{metrics['p50_ms']:>9}{metrics['p95_ms']:>9}{metrics['cold_ms']:>9}"
+              f"{queries:>9}{metrics['peak_kb']:>10}  {status}")
+
+if args.save:
+    with open(args.baseline, 'w') as f:
+        json.dump({'created_at': datetime.now().isoformat(timespec='seconds'), 'iterations': args.iterations,
+                   'results': dict(baseline, **{rows: {name: metrics for name, metrics in routes.items()
+                                                       if 'error' not in metrics}
+                                                for rows, routes in results.items()})}, f, indent=2)
+    print(f"\nBaseline written to {args.baseline}")
+
+if problems:
+    print(f"\n{len(problems)} problem(s):")
+    for problem in problems:
+        print(f"  {problem}")
+    if not args.save:
+        sys.exit(1)
@@ -0,0 +1,71 @@
+import argparse
+import tempfile
+import random
+import time
+import uuid
+from repositories import Repositories, create_backend
+
+# Compare repository latencies across storage backends
+parser = argparse.ArgumentParser(description='Benchmark repository operations per storage backend')
+parser.add_argument('--cars', type=int, default=1000)
+parser.add_argument('--bookings', type=int, default=20000)
+parser.add_argument('--lookups', type=int, default=2000)
+parser.add_argument('--backends', default='memory,json', help="Comma-separated list: memory, json, mongo (mongo writes to MONGO_DB_NAME)")
+args = parser.parse_args()
+
+
+def seed(repos):
+    for i in range(args.cars):
+        repos.cars.add({
+            'id': str(i + 1),
+            'make': random.choice(['Toyota', 'Honda', 'BMW', 'Tesla', 'Ford']),
+            'model': f'Model {i}',
+            'year': random.randint(2015, 2024),
+            'price_per_day': random.randint(1500, 9000),
+            'vehicle_type': random.choice(['car', 'bike']),
+            'available': True
+        })
+    for i in range(args.bookings):
+        repos.bookings.add({
+            'id': str(uuid.uuid4()),
+            'car_id': str(random.randint(1, args.cars)),
+            'user_id': f'user{random.randint(1, 500)}',
+            'status': random.choice(['confirmed', 'completed', 'cancelled']),
+            'start_date': '2025-01-01',
+            'end_date': '2025-01-05'
+        })
+
+
+def timed(label, func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<28} {elapsed / repeat * 1e6:10.1f} us/op")
+
+
+for name in args.backends.split(','):
+    with tempfile.TemporaryDirectory() as data_dir:
+        if name == 'json':
+            from repositories.memory_backend import JsonBackend
+            backend = JsonBackend(data_dir)
+        else:
+            backend = create_backend(name)
+        repos = Repositories(backend)
+
+        print(f"\n[{name}] seeding {args.cars} cars, {args.bookings} bookings...")
+        started = time.perf_counter()
+        seed(repos)
+        print(f"  seeded in {time.perf_counter() - started:.2f}s")
+
+        car_ids = [str(random.randint(1, args.cars)) for _ in range(args.lookups)]
+        user_ids = [f'user{random.randint(1, 500)}' for _ in range(args.lookups)]
+        timed('cars.get', lambda: repos.cars.get(random.choice(car_ids)), args.lookups)
+        timed('bookings.list_for_user', lambda: repos.bookings.list_for_user(random.choice(user_ids)), args.lookups)
+        timed('cars.find(make, available)', lambda: repos.cars.find({'make': 'BMW', 'available': True}), 100)
+        timed('cars.find(search)', lambda: repos.cars.find({}, search='model 1'), 100)
+        timed('bookings.list_expired', lambda: repos.bookings.list_expired('2025-06-01'), 20)
+        timed('cars.set_available', lambda: repos.cars.set_available(random.choice(car_ids), True), args.lookups)
+
+        if hasattr(backend, 'close'):
+            backend.close()
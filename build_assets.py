@@ -0,0 +1,64 @@
+import argparse
+import urllib.request
+import re
+import os
+from services.asset_service import build_manifest
+
+# Fingerprint static assets (and optionally self-host the CDN bundles)
+STATIC_FOLDER = 'static'
+
+VENDOR_FILES = {
+    'vendor/bootstrap/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/fontawesome/css/all.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+}
+FONTAWESOME_WEBFONTS = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/webfonts/'
+GOOGLE_FONTS_CSS = 'https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap'
+# Google Fonts only serves woff2 to browsers it recognises
+BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+
+def download(url):
+    request = urllib.request.Request(url, headers={'User-Agent': BROWSER_USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+def write(name, content):
+    path = os.path.join(STATIC_FOLDER, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    print(f"  {name} ({len(content) // 1024} KB)")
+
+
+def vendor():
+    print("Downloading CDN bundles...")
+    for name, url in VENDOR_FILES.items():
+        write(name, download(url))
+
+    # Font files referenced by the Font Awesome stylesheet
+    with open(os.path.join(STATIC_FOLDER, 'vendor/fontawesome/css/all.min.css'), 'r') as f:
+        fontawesome_css = f.read()
+    for font in sorted(set(re.findall(r'\.\./webfonts/([\w.-]+)', fontawesome_css))):
+        write(f'vendor/fontawesome/webfonts/{font}', download(FONTAWESOME_WEBFONTS + font))
+
+    # Google Fonts: fetch the font files and point the stylesheet at local copies
+    fonts_css = download(GOOGLE_FONTS_CSS).decode('utf-8')
+    for index, url in enumerate(sorted(set(re.findall(r'url\((https://fonts\.gstatic\.com/[^)]+)\)', fonts_css)))):
+        filename = f'inter-{index}{os.path.splitext(url)[1]}'
+        write(f'vendor/fonts/files/{filename}', download(url))
+        fonts_css = fonts_css.replace(url, f'files/{filename}')
+    write('vendor/fonts/inter.css', fonts_css.encode('utf-8'))
+
+
+parser = argparse.ArgumentParser(description='Build fingerprinted static assets')
+parser.add_argument('--vendor', action='store_true', help='Download Bootstrap, Font Awesome and Google Fonts for self-hosting')
+parser.add_argument('--no-minify', action='store_true', help='Copy stylesheets without minifying them')
+args = parser.parse_args()
+
+if args.vendor:
+    vendor()
+
+assets = build_manifest(STATIC_FOLDER, minify=not args.no_minify)
+print(f"\nFingerprinted {len(assets)} assets -> {STATIC_FOLDER}/assets-manifest.json")
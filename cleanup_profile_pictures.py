@@ -0,0 +1,5 @@
+from services.profile_service import ProfileService
+
+# Remove profile pictures that no user references any more
+removed = ProfileService.collect_orphaned_pictures()
+print(f"Removed {removed} orphaned profile picture files.")
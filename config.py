@@ -22,7 +22,119 @@ class Config:
     # Payment Gateway
     PAYMENT_GATEWAY_KEY = os.getenv('PAYMENT_GATEWAY_KEY', '')
     PAYMENT_GATEWAY_SECRET = os.getenv('PAYMENT_GATEWAY_SECRET', '')
+    # Leave PAYMENT_GATEWAY_URL empty for the built-in simulated gateway
+    PAYMENT_GATEWAY_URL = os.getenv('PAYMENT_GATEWAY_URL', '')
+    PAYMENT_GATEWAY_TIMEOUT = float(os.getenv('PAYMENT_GATEWAY_TIMEOUT', 10))
+    PAYMENT_GATEWAY_POOL_SIZE = int(os.getenv('PAYMENT_GATEWAY_POOL_SIZE', 20))
+    # Public URL the gateway posts results to (defaults to this app's /webhooks/payment)
+    PAYMENT_WEBHOOK_URL = os.getenv('PAYMENT_WEBHOOK_URL', '')
+    # Submissions per charge when the gateway times out, then seconds before an unacknowledged one expires
+    PAYMENT_GATEWAY_RETRIES = int(os.getenv('PAYMENT_GATEWAY_RETRIES', 3))
+    PAYMENT_PENDING_TIMEOUT = int(os.getenv('PAYMENT_PENDING_TIMEOUT', 900))
+    # Seconds an acknowledged charge may wait for its webhook before it expires too
+    PAYMENT_PROCESSING_TIMEOUT = int(os.getenv('PAYMENT_PROCESSING_TIMEOUT', 3600))
+    # Threads that record gateway replies, keeping database writes off the gateway's event loop
+    PAYMENT_REPLY_WORKERS = int(os.getenv('PAYMENT_REPLY_WORKERS', 4))
+    # Seconds between sweeps that finish interrupted payment outbox updates and expire stale charges
+    PAYMENT_SWEEP_INTERVAL = int(os.getenv('PAYMENT_SWEEP_INTERVAL', 60))
+    
+    # Password hashing
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+    PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv('PASSWORD_HASH_QUEUE_LIMIT', 64))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+    
+    # Server-side sessions: 'memory' (per worker) or 'mongo' (shared, with a local LRU in front)
+    SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'mongo')
+    SESSION_LIFETIME = int(os.getenv('SESSION_LIFETIME', 7 * 24 * 3600))
+    SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', 10000))
+    # Seconds a worker trusts its local copy of a session before revalidating it against Mongo
+    SESSION_LOCAL_MAX_AGE = int(os.getenv('SESSION_LOCAL_MAX_AGE', 30))
+    
+    # Login/OTP/quote throttling: 'memory' (per worker) or 'mongo' (shared by all workers)
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 10000))
+    RATE_LIMIT_WINDOW = int(os.getenv('RATE_LIMIT_WINDOW', 900))
+    LOGIN_ATTEMPTS_PER_IP = int(os.getenv('LOGIN_ATTEMPTS_PER_IP', 50))
+    LOGIN_ATTEMPTS_PER_USER = int(os.getenv('LOGIN_ATTEMPTS_PER_USER', 10))
+    OTP_REQUESTS_PER_IP = int(os.getenv('OTP_REQUESTS_PER_IP', 20))
+    OTP_REQUESTS_PER_EMAIL = int(os.getenv('OTP_REQUESTS_PER_EMAIL', 5))
+    OTP_VERIFICATIONS_PER_EMAIL = int(os.getenv('OTP_VERIFICATIONS_PER_EMAIL', 10))
+    QUOTE_REQUESTS_PER_IP = int(os.getenv('QUOTE_REQUESTS_PER_IP', 600))
+    
+    # Reverse proxies in front of the app: how many hops of X-Forwarded-For/-Proto/-Host to trust,
+    # so request.remote_addr (which the per-IP limits key on) is the client. 0 trusts none.
+    PROXY_FIX_X_FOR = int(os.getenv('PROXY_FIX_X_FOR', 0))
+    PROXY_FIX_X_PROTO = int(os.getenv('PROXY_FIX_X_PROTO', 0))
+    PROXY_FIX_X_HOST = int(os.getenv('PROXY_FIX_X_HOST', 0))
+    
+    # Pickups each location can hand over in one time slot
+    PICKUP_SLOT_CAPACITY = int(os.getenv('PICKUP_SLOT_CAPACITY', 5))
     
     # Upload
     UPLOAD_FOLDER = 'static/car_images'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    IMAGE_DERIVATIVES_FOLDER = os.getenv('IMAGE_DERIVATIVES_FOLDER', 'static/car_images/derived')
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+    PROFILE_PICTURE_FOLDER = os.getenv('PROFILE_PICTURE_FOLDER', 'static/profile_pictures')
+    AVATAR_MAX_BYTES = int(os.getenv('AVATAR_MAX_BYTES', 5 * 1024 * 1024))
+    # Whole request body limit; Flask rejects bigger uploads with 413 before the route reads them
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+    
+    # Storage backend for route data access: 'mongo', 'json' or 'memory'. This covers
+    # the cars/bookings/users/payments repositories only; auth, payments, reviews,
+    # OTPs, sessions and analytics still use MongoDB (see docs/SETUP_GUIDE.md)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')
+    JSON_DATA_DIR = os.getenv('JSON_DATA_DIR', '.')
+    
+    # Read-through car cache
+    CAR_CACHE_SIZE = int(os.getenv('CAR_CACHE_SIZE', 1024))
+    CAR_CACHE_TTL = int(os.getenv('CAR_CACHE_TTL', 60))
+    
+    # Pre-rendered template fragments, invalidated by per-entity version counters
+    FRAGMENT_CACHE_SIZE = int(os.getenv('FRAGMENT_CACHE_SIZE', 512))
+    FRAGMENT_CACHE_TTL = int(os.getenv('FRAGMENT_CACHE_TTL', 3600))
+    # Seconds between re-reads of the shared fragment versions (changes made on other workers)
+    FRAGMENT_VERSION_CHECK_INTERVAL = float(os.getenv('FRAGMENT_VERSION_CHECK_INTERVAL', 2))
+    
+    # Repricing: fallback exchange rates until set in the rate table, and how often
+    # the app checks for a new price version to expire its car caches
+    DEFAULT_EXCHANGE_RATES = os.getenv('DEFAULT_EXCHANGE_RATES', 'USD:INR=83.0')
+    PRICE_VERSION_CHECK_INTERVAL = int(os.getenv('PRICE_VERSION_CHECK_INTERVAL', 10))
+    
+    # Dynamic pricing: occupancy surge tiers are 'share booked:multiplier',
+    # long-rental discounts are 'minimum days:percent off'
+    PRICING_HORIZON_DAYS = int(os.getenv('PRICING_HORIZON_DAYS', 180))
+    PRICING_WEEKDAY_MULTIPLIER = float(os.getenv('PRICING_WEEKDAY_MULTIPLIER', 1.0))
+    PRICING_WEEKEND_MULTIPLIER = float(os.getenv('PRICING_WEEKEND_MULTIPLIER', 1.15))
+    PRICING_SURGE_TIERS = os.getenv('PRICING_SURGE_TIERS', '0.5:1.1,0.7:1.25,0.9:1.5')
+    PRICING_LONG_RENTAL_DISCOUNTS = os.getenv('PRICING_LONG_RENTAL_DISCOUNTS', '7:5,30:15')
+    # Longest rental that can be quoted or booked
+    PRICING_MAX_RENTAL_DAYS = int(os.getenv('PRICING_MAX_RENTAL_DAYS', PRICING_HORIZON_DAYS))
+    # Seconds between checks for bookings and car edits made by other workers
+    PRICING_SYNC_INTERVAL = float(os.getenv('PRICING_SYNC_INTERVAL', 2))
+    
+    # Memoized /api/quote results; totals include GST at this rate (as on invoices)
+    QUOTE_CACHE_SIZE = int(os.getenv('QUOTE_CACHE_SIZE', 4096))
+    QUOTE_CACHE_TTL = int(os.getenv('QUOTE_CACHE_TTL', 60))
+    GST_RATE = float(os.getenv('GST_RATE', 18))
+    
+    # Response compression (brotli is used when the Brotli package is installed)
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+    COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+    
+    # Compiled Jinja templates shared by all workers (see precompile_templates.py)
+    TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR', '.template_cache')
+    
+    # Data migration
+    MIGRATION_BATCH_SIZE = int(os.getenv('MIGRATION_BATCH_SIZE', 5000))
+    MIGRATION_CHECKPOINT = os.getenv('MIGRATION_CHECKPOINT', '.migration_checkpoint.json')
+    
+    # Route benchmarks (benchmark_routes.py): how far a run may exceed the saved
+    # baseline before it fails. Latency must also grow by more than the floor.
+    BENCHMARK_BASELINE = os.getenv('BENCHMARK_BASELINE', 'route_benchmarks.json')
+    BENCHMARK_LATENCY_THRESHOLD = float(os.getenv('BENCHMARK_LATENCY_THRESHOLD', 0.25))
+    BENCHMARK_LATENCY_FLOOR_MS = float(os.getenv('BENCHMARK_LATENCY_FLOOR_MS', 2))
+    BENCHMARK_QUERY_THRESHOLD = int(os.getenv('BENCHMARK_QUERY_THRESHOLD', 0))
+    BENCHMARK_MEMORY_THRESHOLD = float(os.getenv('BENCHMARK_MEMORY_THRESHOLD', 0.25))
@@ -0,0 +1,46 @@
+import argparse
+import time
+from services.synthetic_data import FleetGenerator, MongoSink, JsonSink, rows_for
+
+# Synthetic cars, users, bookings, payments, reviews and GPS points for scale testing
+parser = argparse.ArgumentParser(description='Generate a synthetic fleet into MongoDB or the JSON store')
+parser.add_argument('--rows', type=int, default=10000, help='Approximate total rows (10k to 10M)')
+parser.add_argument('--cars', type=int, help='Override the number of cars')
+parser.add_argument('--users', type=int, help='Override the number of users')
+parser.add_argument('--bookings', type=int, help='Override the number of bookings')
+parser.add_argument('--target', choices=['mongo', 'json'], default='json')
+parser.add_argument('--data-dir', default='loadtest_data', help='Output directory for --target json')
+parser.add_argument('--drop', action='store_true', help='Empty the Mongo collections first (use a scratch MONGO_DB_NAME)')
+parser.add_argument('--batch-size', type=int, default=5000)
+parser.add_argument('--seed', type=int, default=None, help='Seed for a reproducible fleet')
+args = parser.parse_args()
+
+sizes = rows_for(args.rows)
+generator = FleetGenerator(
+    args.cars or sizes['cars'],
+    args.users or sizes['users'],
+    args.bookings or sizes['bookings'],
+    seed=args.seed,
+    review_share=sizes['review_share'],
+    tracked_share=sizes['tracked_share'],
+    gps_points_per_track=sizes['gps_points_per_track']
+)
+
+if args.target == 'mongo':
+    from database import mongodb
+    sink = MongoSink(mongodb, args.batch_size, drop=args.drop)
+    print(f"Writing to MongoDB database {mongodb.db.name}")
+else:
+    sink = JsonSink(args.data_dir)
+    print(f"Writing to {args.data_dir}/ (run the app with STORAGE_BACKEND=json JSON_DATA_DIR={args.data_dir})")
+
+print(f"Generating {generator.cars} cars, {generator.users} users, {generator.bookings} bookings...")
+started = time.perf_counter()
+counts = generator.generate(sink)
+elapsed = time.perf_counter() - started
+
+total = sum(counts.values())
+for collection, count in sorted(counts.items()):
+    print(f"  {collection:<12} {count:>10}")
+print(f"{total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+print(f"Users log in as loaduser1..loaduser{generator.users} with password '{generator.password}'")
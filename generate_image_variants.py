@@ -0,0 +1,26 @@
+import hashlib
+import os
+from config import Config
+from repositories import create_repositories
+from services.image_service import ImageService
+
+# Build resized variants for cars added before the image pipeline existed
+repos = create_repositories()
+cars = repos.cars.list_all()
+print(f"Generating image variants for {len(cars)} vehicles...")
+
+for car in cars:
+    image = car.get('image') or ''
+    path = os.path.join(Config.UPLOAD_FOLDER, image.split('/')[-1])
+    if not image.startswith('/static/') or not os.path.isfile(path):
+        print(f"Car ID {car.get('id')}: no local image, skipped")
+        continue
+
+    with open(path, 'rb') as f:
+        content_hash = hashlib.sha256(f.read()).hexdigest()[:20]
+
+    variants = ImageService.generate_variants(path, content_hash)
+    repos.cars.update(car['id'], {'image_variants': variants})
+    print(f"Car ID {car.get('id')}: {os.path.basename(path)} -> {content_hash}_*")
+
+print("\nDone!")
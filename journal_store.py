@@ -0,0 +1,253 @@
+import threading
+import atexit
+import json
+import time
+import re
+import os
+from datetime import datetime
+
+
+def _encode(value):
+    """json default=: datetimes (created_at, paid_at, ...) as tagged ISO strings"""
+    if isinstance(value, datetime):
+        return {'$date': value.isoformat()}
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _decode(obj):
+    """json object_hook: turn tagged ISO strings back into datetimes"""
+    if len(obj) == 1 and '$date' in obj:
+        return datetime.fromisoformat(obj['$date'])
+    return obj
+
+
+def restore_dates(value):
+    """_decode applied through a record parsed without the hook (e.g. streamed with ijson)"""
+    if isinstance(value, dict):
+        decoded = _decode(value)
+        if decoded is not value:
+            return decoded
+        return {field: restore_dates(item) for field, item in value.items()}
+    if isinstance(value, list):
+        return [restore_dates(item) for item in value]
+    return value
+
+
+class JournaledFile:
+    """
+    JSON snapshot plus an append-only JSON Lines journal.
+
+    Changes are buffered and flushed in the background (write-behind); repeated
+    writes to the same record between flushes are coalesced into one journal
+    line. The journal is periodically compacted into a new snapshot, written to
+    a temporary file and atomically renamed over the old one.
+
+    Each compaction bumps a generation number stored in the snapshot and in the
+    journal's header line. A journal older than the snapshot (left behind by a
+    crash mid-compaction) is already folded in and is skipped on load. Legacy
+    snapshots are a bare JSON array and count as generation 0.
+    """
+
+    def __init__(self, path, key='id', flush_interval=0.5, compact_every=1000):
+        self.path = path
+        self.journal_path = f'{path}.journal'
+        self.key = key
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self.records_source = None
+
+        # _lock guards the files; _pending_lock only the pending map, so queuing
+        # a write never waits on disk I/O (or on a compaction reading the records)
+        self._lock = threading.RLock()
+        self._pending_lock = threading.Lock()
+        self._pending = {}
+        self._journal_lines = 0
+        self._generation = None
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+
+        atexit.register(self.close)
+
+    def _read_snapshot(self):
+        """(generation, records) of the snapshot file"""
+        if not os.path.exists(self.path):
+            return 0, []
+        with open(self.path, 'r') as f:
+            data = json.load(f, object_hook=_decode)
+        if isinstance(data, dict):
+            return data.get('generation', 0), data.get('records', [])
+        return 0, data
+
+    def _snapshot_generation(self):
+        """Generation of the snapshot file, read from its first bytes only"""
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'r') as f:
+            head = f.read(200)
+        match = re.match(r'\s*\{\s*"generation"\s*:\s*(\d+)', head)
+        return int(match.group(1)) if match else 0
+
+    def _current_generation(self):
+        if self._generation is None:
+            self._generation = self._snapshot_generation()
+        return self._generation
+
+    def _journal_entries(self, snapshot_generation):
+        """Journal entries written on top of the given snapshot generation (none if the journal is stale)"""
+        if not os.path.exists(self.journal_path):
+            return []
+        generation, entries = 0, []
+        with open(self.journal_path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line, object_hook=_decode)
+                except ValueError:
+                    # Torn write from a crash - everything after it is lost anyway
+                    break
+                if entry.get('op') == 'header':
+                    generation = entry.get('generation', 0)
+                else:
+                    entries.append(entry)
+        return entries if generation >= snapshot_generation else []
+
+    def journal_changes(self):
+        """Final state of every record the journal touched: {key: record, or None if deleted}"""
+        changes = {}
+        for entry in self._journal_entries(self._snapshot_generation()):
+            if entry['op'] == 'put':
+                changes[entry['doc'][self.key]] = entry['doc']
+            elif entry['op'] == 'delete':
+                changes[entry['key']] = None
+        return changes
+
+    def load(self):
+        """Read the snapshot and replay the journal on top of it"""
+        with self._lock:
+            generation, records = self._read_snapshot()
+            self._generation = generation
+
+            by_key = {record[self.key]: record for record in records}
+            entries = self._journal_entries(generation)
+            for entry in entries:
+                if entry['op'] == 'put':
+                    by_key[entry['doc'][self.key]] = entry['doc']
+                elif entry['op'] == 'delete':
+                    by_key.pop(entry['key'], None)
+            self._journal_lines = len(entries)
+
+            return list(by_key.values())
+
+    def put(self, record):
+        """Queue an insert/update of a record"""
+        self._queue(record[self.key], {'op': 'put', 'doc': dict(record)})
+
+    def delete(self, key):
+        """Queue removal of a record"""
+        self._queue(key, {'op': 'delete', 'key': key})
+
+    def _queue(self, key, entry):
+        with self._pending_lock:
+            # Drop an older pending entry so the newest state wins
+            self._pending.pop(key, None)
+            self._pending[key] = entry
+        if self.flush_interval <= 0:
+            self.flush()
+        else:
+            self._ensure_flusher()
+            self._wakeup.set()
+
+    def _ensure_flusher(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # Give concurrent writes a moment to coalesce
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing {self.journal_path}: {e}")
+                # Entries are still pending; try again on the next wakeup
+                self._wakeup.set()
+
+    def flush(self):
+        """Append pending changes to the journal and fsync it; entries stay queued until then"""
+        with self._lock:
+            with self._pending_lock:
+                pending = dict(self._pending)
+            if not pending:
+                return
+
+            lines, done = [], []
+            for key, entry in pending.items():
+                try:
+                    lines.append(json.dumps(entry, default=_encode) + '\n')
+                except (TypeError, ValueError) as e:
+                    # Can never be written; drop it rather than hold back the rest of the batch
+                    print(f"Error journaling {self.key}={key} in {self.journal_path}: {e}")
+                done.append((key, entry))
+
+            if lines:
+                new_journal = not os.path.exists(self.journal_path)
+                size = 0 if new_journal else os.path.getsize(self.journal_path)
+                try:
+                    with open(self.journal_path, 'a') as f:
+                        if new_journal:
+                            f.write(json.dumps({'op': 'header', 'generation': self._current_generation()}) + '\n')
+                        f.writelines(lines)
+                        f.flush()
+                        os.fsync(f.fileno())
+                except Exception:
+                    # Cut off any partial line so later appends stay readable
+                    if os.path.exists(self.journal_path):
+                        os.truncate(self.journal_path, size)
+                    raise
+                self._journal_lines += len(lines)
+
+            with self._pending_lock:
+                for key, entry in done:
+                    # Keep entries that were replaced while this batch was being written
+                    if self._pending.get(key) is entry:
+                        del self._pending[key]
+
+            if self.records_source is not None and self._journal_lines >= self.compact_every:
+                self.compact(self.records_source())
+
+    def compact(self, records):
+        """Write a full snapshot atomically and start a new journal generation"""
+        with self._lock:
+            # Entries still pending are replayed on top of this snapshot; puts and deletes are idempotent
+            generation = self._current_generation() + 1
+            snapshot = [dict(record) for record in records]
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'generation': generation, 'records': snapshot}, f, default=_encode)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            # From here a crash leaves an older journal behind, which load() skips
+            self._generation = generation
+
+            tmp_path = f'{self.journal_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(json.dumps({'op': 'header', 'generation': generation}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+            self._journal_lines = 0
+
+    def close(self):
+        """Flush outstanding writes (called automatically at interpreter exit)"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error flushing {self.journal_path}: {e}")
@@ -0,0 +1,169 @@
+import argparse
+import http.cookiejar
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
+
+# Drives a running app with concurrent virtual users logged in as the
+# generate_fleet.py accounts. Raise LOGIN_ATTEMPTS_PER_IP (and the other
+# rate limits) on the server first, or logins from one IP get throttled.
+parser = argparse.ArgumentParser(description='Load test the browse, booking, payment and admin routes')
+parser.add_argument('--url', default='http://127.0.0.1:5000')
+parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+parser.add_argument('--duration', type=float, default=60, help='Seconds to run (ignored with --iterations)')
+parser.add_argument('--iterations', type=int, help='Booking journeys per virtual user')
+parser.add_argument('--cars', type=int, default=50, help='Car ids 1..N to browse and book')
+parser.add_argument('--accounts', type=int, default=500, help='loaduser1..N accounts to log in as')
+parser.add_argument('--password', default='loadtest123')
+parser.add_argument('--admin-user', help='Also drive the /admin pages as this user')
+parser.add_argument('--admin-password')
+parser.add_argument('--no-payment', action='store_true', help='Stop each journey after booking')
+parser.add_argument('--seed', type=int, default=None)
+args = parser.parse_args()
+
+LOCATIONS = ['loc1', 'loc2', 'loc3', 'loc4', 'loc5', 'loc6']
+PICKUP_TIMES = ['09:00 AM', '10:00 AM', '11:00 AM', '02:00 PM', '04:00 PM']
+ADMIN_PAGES = ['/admin', '/admin/bookings', '/admin/cars', '/admin/users']
+IDEMPOTENCY_KEY = re.compile(r'name="idempotency_key" value="([^"]+)"')
+
+samples = {}        # route -> [latency seconds]
+errors = {}         # route -> error count
+rejected = {}       # route -> requests the app declined (e.g. dates already booked)
+stats_lock = threading.Lock()
+random_seed = random.Random(args.seed)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class VirtualUser:
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        self.random = random.Random(random_seed.random())
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect)
+
+    def request(self, route, path, form=None):
+        """Returns (status, body, location), recording latency under `route`"""
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        started = time.perf_counter()
+        try:
+            with self.opener.open(args.url + path, data, timeout=30) as response:
+                status, body, location = response.status, response.read().decode('utf-8', 'replace'), None
+        except urllib.error.HTTPError as e:
+            status, body, location = e.code, e.read().decode('utf-8', 'replace'), e.headers.get('Location')
+        except Exception:
+            status, body, location = 0, '', None
+        elapsed = time.perf_counter() - started
+        with stats_lock:
+            samples.setdefault(route, []).append(elapsed)
+            if status == 0 or status >= 400:
+                errors[route] = errors.get(route, 0) + 1
+        return status, body, location
+
+    def reject(self, route):
+        with stats_lock:
+            rejected[route] = rejected.get(route, 0) + 1
+
+    def login(self):
+        status, _, location = self.request('POST /login', '/login',
+                                           {'username': self.username, 'password': self.password})
+        return status in (302, 303) and location and '/login' not in location
+
+    def journey(self):
+        car_id = str(self.random.randint(1, args.cars))
+        self.request('GET /', '/')
+        self.request('GET /car/<id>', f'/car/{car_id}')
+        self.request('GET /book/<id>', f'/book/{car_id}')
+
+        # Past the generated fleet's future window, so most dates are still free
+        start = date.today() + timedelta(days=self.random.randint(100, 400))
+        end = start + timedelta(days=self.random.randint(0, 6))
+        status, _, location = self.request('POST /book/<id>', f'/book/{car_id}', {
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+            'pickup_location': self.random.choice(LOCATIONS),
+            'drop_location': self.random.choice(LOCATIONS),
+            'pickup_time': self.random.choice(PICKUP_TIMES),
+            'drop_time': self.random.choice(PICKUP_TIMES)
+        })
+        if not location or '/payment/' not in location:
+            # Re-rendered form or a redirect elsewhere: the app turned the booking down (errors are counted already)
+            if 0 < status < 400:
+                self.reject('POST /book/<id>')
+            return
+        if args.no_payment:
+            return
+
+        booking_id = location.rstrip('/').rsplit('/', 1)[-1]
+        _, body, _ = self.request('GET /payment/<id>', f'/payment/{booking_id}')
+        match = IDEMPOTENCY_KEY.search(body)
+        self.request('POST /process-payment/<id>', f'/process-payment/{booking_id}', {
+            'payment_method': 'UPI',
+            'idempotency_key': match.group(1) if match else ''
+        })
+
+    def admin_round(self):
+        for page in ADMIN_PAGES:
+            self.request(f'GET {page}', page)
+
+
+def run_user(user, deadline, work):
+    if not user.login():
+        user.reject('POST /login')
+        return
+    done = 0
+    while (args.iterations is None and time.perf_counter() < deadline) or \
+            (args.iterations is not None and done < args.iterations):
+        work(user)
+        done += 1
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# Fail fast when the app is not up (or cannot start), instead of reporting every request as an error
+try:
+    with urllib.request.urlopen(args.url + '/', timeout=30) as response:
+        response.read()
+except Exception as e:
+    raise SystemExit(f"{args.url} is not serving the app: {e}")
+
+accounts = random_seed.sample(range(1, args.accounts + 1), min(args.users, args.accounts))
+workers = [(VirtualUser(f'loaduser{n}', args.password), VirtualUser.journey) for n in accounts]
+if args.admin_user:
+    workers.append((VirtualUser(args.admin_user, args.admin_password or ''), VirtualUser.admin_round))
+
+print(f"{len(workers)} virtual users against {args.url}, "
+      f"{f'{args.iterations} iterations each' if args.iterations else f'{args.duration:.0f}s'}")
+started = time.perf_counter()
+deadline = started + args.duration
+threads = [threading.Thread(target=run_user, args=(user, deadline, work), daemon=True) for user, work in workers]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+elapsed = time.perf_counter() - started
+
+total = sum(len(values) for values in samples.values())
+print(f"\n{'Route':<30}{'Count':>8}{'Errors':>8}{'Rejected':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+print('-' * 86)
+for route in sorted(samples):
+    values = sorted(samples[route])
+    print(f"{route:<30}{len(values):>8}{errors.get(route, 0):>8}{rejected.get(route, 0):>10}"
+          f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+          f"{percentile(values, 99) * 1000:>10.1f}")
+print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s), "
+      f"{sum(errors.values())} errors")
+if rejected.get('POST /login'):
+    print(f"{rejected['POST /login']} logins failed: check the accounts exist and the login rate limits are raised")
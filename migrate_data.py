@@ -0,0 +1,29 @@
+import argparse
+from services.migration_service import JSONMigrator
+
+# Stream legacy JSON exports into MongoDB
+parser = argparse.ArgumentParser(description='Migrate legacy JSON data (users, cars, bookings) to MongoDB')
+parser.add_argument('--batch-size', type=int, default=None, help='Records per bulk write (default: MIGRATION_BATCH_SIZE)')
+parser.add_argument('--checkpoint', default=None, help='Checkpoint file used to resume an interrupted run')
+parser.add_argument('--restart', action='store_true', help='Ignore any checkpoint and start from the beginning')
+parser.add_argument('--users', help='Path to users export')
+parser.add_argument('--cars', help='Path to cars export')
+parser.add_argument('--bookings', help='Path to bookings export')
+args = parser.parse_args()
+
+migrator = JSONMigrator(batch_size=args.batch_size, checkpoint_path=args.checkpoint, progress=print)
+if args.restart:
+    migrator.reset()
+
+overrides = {'users': args.users, 'cars': args.cars, 'bookings': args.bookings}
+sources = [
+    (overrides[collection] or path, collection, key, defaults)
+    for path, collection, key, defaults in JSONMigrator.SOURCES
+]
+
+results = migrator.run(sources=sources)
+
+print("\nMigration complete!")
+for stats in results:
+    print(f"{stats['file']}: {stats['read']} read, {stats['inserted']} inserted, "
+          f"{stats['skipped']} already present, {stats['errors']} errors")
@@ -0,0 +1,20 @@
+import os
+from config import Config
+from services.template_service import build_environment, precompile_templates
+
+# Compile every template into the shared bytecode cache so workers start warm.
+# Builds its own environment, so it runs at build time without MongoDB.
+env = build_environment(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'),
+                        Config.TEMPLATE_CACHE_DIR)
+results = precompile_templates(env)
+
+failed = {name: result for name, result in results.items() if isinstance(result, str)}
+timings = sorted(((ms, name) for name, ms in results.items() if name not in failed), reverse=True)
+
+print(f"Precompiled {len(timings)} templates into {Config.TEMPLATE_CACHE_DIR}")
+for ms, name in timings:
+    print(f"  {name:<32} {ms:8.2f} ms")
+print(f"  {'total':<32} {sum(ms for ms, _ in timings):8.2f} ms")
+
+for name, error in failed.items():
+    print(f"  FAILED {name}: {error}")
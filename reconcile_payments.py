@@ -0,0 +1,29 @@
+import argparse
+import json
+from services.reconciliation_service import ReconciliationEngine, load_ledger, write_fake_ledger
+
+# Cross-check payments, bookings and the gateway ledger
+parser = argparse.ArgumentParser(description='Reconcile payments against bookings and the gateway ledger')
+parser.add_argument('--ledger', help='Gateway ledger file (JSON lines: transaction_id, amount, status)')
+parser.add_argument('--make-ledger', metavar='PATH', help='Write a fake ledger from the current payments and exit')
+parser.add_argument('--batch-size', type=int, default=1000, help='Documents per cursor batch and per issue insert')
+parser.add_argument('--out', help='Also write the summary to this JSON file')
+args = parser.parse_args()
+
+if args.make_ledger:
+    count = write_fake_ledger(args.make_ledger)
+    print(f"Wrote {count} ledger entries to {args.make_ledger}")
+    raise SystemExit
+
+ledger = load_ledger(args.ledger) if args.ledger else None
+engine = ReconciliationEngine(ledger=ledger, batch_size=args.batch_size)
+report = engine.run()
+
+print(f"Run {report['run_id']}: {report['bookings_checked']} bookings checked, {report['total_issues']} issues")
+for kind, count in sorted(report['issues'].items()):
+    print(f"  {kind:<26} {count}")
+print(f"Details: db.reconciliation_issues.find({{run_id: '{report['run_id']}'}})")
+
+if args.out:
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
@@ -0,0 +1,44 @@
+# Repositories Package
+from repositories.base import CarRepository, BookingRepository, UserRepository, PaymentRepository
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from services.cache_service import TTLCache
+from services.fragment_cache import fragment_cache
+
+
+class Repositories:
+    """The four repositories over one storage backend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.cars = CarRepository(backend.cars, cache=TTLCache(Config.CAR_CACHE_SIZE, Config.CAR_CACHE_TTL))
+        self.bookings = BookingRepository(backend.bookings)
+        self.users = UserRepository(backend.users)
+        self.payments = PaymentRepository(backend.payments)
+
+        # Writes expire the template fragments rendered from that entity type
+        self.cars.on_change = lambda: fragment_cache.bump('cars')
+        self.bookings.on_change = lambda: fragment_cache.bump('bookings')
+        self.users.on_change = lambda: fragment_cache.bump('users')
+        self.payments.on_change = lambda: fragment_cache.bump('payments')
+
+
+def create_backend(name=None):
+    """Build a storage backend by name (defaults to Config.STORAGE_BACKEND)"""
+    name = name or Config.STORAGE_BACKEND
+    if name == 'mongo':
+        from repositories.mongo_backend import MongoBackend
+        return MongoBackend()
+    if name == 'json':
+        from repositories.memory_backend import JsonBackend
+        return JsonBackend(Config.JSON_DATA_DIR)
+    if name == 'memory':
+        from repositories.memory_backend import MemoryBackend
+        return MemoryBackend()
+    raise ValueError(f'Unknown storage backend: {name}')
+
+
+def create_repositories(name=None):
+    return Repositories(create_backend(name))
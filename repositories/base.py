@@ -0,0 +1,243 @@
+import threading
+
+
+class CarRepository:
+    """Data access for cars, independent of the storage backend"""
+
+    def __init__(self, table, cache=None):
+        self.table = table
+        # Optional read-through cache (services.cache_service.TTLCache) keyed by both id forms
+        self.cache = cache
+        self.version = 0
+        # Bumped by every invalidate(); a read that raced one doesn't cache what it read
+        self._invalidations = 0
+        self._cache_lock = threading.Lock()
+        self.route_stats = {}
+        self.stats_label = lambda: None
+        # Called after every write (the app uses it to expire cached fragments)
+        self.on_change = lambda: None
+        self._stats_lock = threading.Lock()
+
+    def _count(self, hit):
+        label = self.stats_label() or 'other'
+        with self._stats_lock:
+            counters = self.route_stats.setdefault(label, {'hits': 0, 'misses': 0})
+            counters['hits' if hit else 'misses'] += 1
+
+    def get(self, car_id):
+        """Find a car by its custom id or by its document _id"""
+        if not car_id:
+            return None
+
+        if self.cache is not None:
+            # Captured before the read, so an invalidate() landing during it wins
+            seen = (self.version, self._invalidations)
+            entry = self.cache.get(str(car_id))
+            if entry is not None and entry[0] == self.version:
+                self._count(True)
+                # Callers decorate the result, so never hand out the cached dict
+                return dict(entry[1])
+            self._count(False)
+
+        # One round trip resolves either identifier form
+        car = self.table.find_one({'$or': [{'id': car_id}, {'_id': self.table.coerce_id(car_id)}]})
+
+        if car is not None and self.cache is not None:
+            with self._cache_lock:
+                if (self.version, self._invalidations) == seen:
+                    entry = (seen[0], dict(car))
+                    for key in self._cache_keys(car):
+                        self.cache.set(key, entry)
+        return car
+
+    def _cache_keys(self, car):
+        keys = {str(car['_id'])} if car.get('_id') is not None else set()
+        if car.get('id') is not None:
+            keys.add(str(car['id']))
+        return keys
+
+    def invalidate(self, car_id=None):
+        """Drop one car from the cache, or everything when car_id is None"""
+        if self.cache is None:
+            return
+        with self._cache_lock:
+            self._invalidations += 1
+            if car_id is None:
+                # Bumping the version makes every cached entry stale at once
+                self.version += 1
+                self.cache.clear()
+                return
+            entry = self.cache.peek(str(car_id))
+            self.cache.delete(str(car_id))
+            if entry is not None:
+                for key in self._cache_keys(entry[1]):
+                    self.cache.delete(key)
+
+    def cache_stats(self):
+        """Overall and per-route hit counters"""
+        with self._stats_lock:
+            routes = {
+                label: dict(counters, hit_rate=round(counters['hits'] / (counters['hits'] + counters['misses']), 3))
+                for label, counters in self.route_stats.items()
+            }
+        overall = self.cache.stats() if self.cache is not None else {}
+        return {'version': self.version, 'overall': overall, 'routes': routes}
+
+    def find(self, filters=None, search='', sort=None, limit=None):
+        """Find cars matching equality filters and an optional make/model/year search"""
+        return self.table.find(filters, text=search, text_fields=('make', 'model', 'year'),
+                               sort=sort, limit=limit)
+
+    def list_all(self):
+        return self.table.find()
+
+    def count(self, filters=None):
+        return self.table.count(filters)
+
+    def next_id(self):
+        """Next sequential numeric car id"""
+        numeric_ids = [int(c['id']) for c in self.table.find(projection=('id',))
+                       if str(c.get('id', '')).isdigit()]
+        return str(max(numeric_ids) + 1) if numeric_ids else '1'
+
+    def add(self, car):
+        """Insert a car; raises ValueError when its id is already taken"""
+        if self.table.find_one({'id': car.get('id')}) is not None:
+            raise ValueError(f"Car id {car.get('id')} already exists")
+        self.table.insert(car)
+        self.on_change()
+        return car
+
+    def update(self, car_id, fields):
+        matched = self.table.update({'id': car_id}, fields)
+        self.invalidate(car_id)
+        self.on_change()
+        return matched
+
+    def set_available(self, car_id, available):
+        return self.update(car_id, {'available': available})
+
+    def delete(self, car_id):
+        deleted = self.table.delete({'id': car_id})
+        self.invalidate(car_id)
+        self.on_change()
+        return deleted
+
+
+class BookingRepository:
+    """Data access for bookings"""
+
+    def __init__(self, table):
+        self.table = table
+        self.on_change = lambda: None
+
+    def get(self, booking_id, user_id=None):
+        """Find a booking, optionally restricted to its owner"""
+        filters = {'id': booking_id}
+        if user_id is not None:
+            filters['user_id'] = user_id
+        return self.table.find_one(filters)
+
+    def list_for_user(self, user_id):
+        return self.table.find({'user_id': user_id})
+
+    def list_for_car(self, car_id):
+        return self.table.find({'car_id': car_id})
+
+    def list_all(self):
+        return self.table.find()
+
+    def list_expired(self, current_date):
+        """Confirmed bookings whose end date has passed"""
+        return self.table.find({'status': 'confirmed', 'end_date': {'$lt': current_date}})
+
+    def list_overlapping(self, car_id, start_date, end_date, statuses, exclude_id=None):
+        """Bookings of a car in the given states sharing at least one day with an inclusive date range"""
+        filters = {'car_id': car_id, 'status': {'$in': list(statuses)},
+                   'start_date': {'$lte': end_date}, 'end_date': {'$gte': start_date}}
+        if exclude_id is not None:
+            filters['id'] = {'$ne': exclude_id}
+        return self.table.find(filters)
+
+    def count(self, filters=None):
+        return self.table.count(filters)
+
+    def add(self, booking):
+        self.table.insert(booking)
+        self.on_change()
+        return booking
+
+    def update(self, booking_id, fields):
+        matched = self.table.update({'id': booking_id}, fields)
+        self.on_change()
+        return matched
+
+
+class UserRepository:
+    """Data access for users"""
+
+    def __init__(self, table):
+        self.table = table
+        self.on_change = lambda: None
+
+    def get(self, user_id):
+        return self.table.find_one({'_id': self.table.coerce_id(user_id)})
+
+    def get_many(self, user_ids):
+        """Several users in one query, keyed by str(_id)"""
+        ids = [self.table.coerce_id(user_id) for user_id in set(user_ids)]
+        return {str(user['_id']): user for user in self.table.find({'_id': {'$in': ids}})}
+
+    def get_by_username(self, username):
+        return self.table.find_one({'username': username})
+
+    def get_by_email(self, email):
+        return self.table.find_one({'email': email})
+
+    def list_all(self):
+        return self.table.find()
+
+    def count(self, filters=None):
+        return self.table.count(filters)
+
+    def add(self, user):
+        self.table.insert(user)
+        self.on_change()
+        return user
+
+    def update(self, user_id, fields):
+        matched = self.table.update({'_id': self.table.coerce_id(user_id)}, fields)
+        self.on_change()
+        return matched
+
+
+class PaymentRepository:
+    """Data access for payments"""
+
+    def __init__(self, table):
+        self.table = table
+        self.on_change = lambda: None
+
+    def get(self, payment_id):
+        return self.table.find_one({'id': payment_id})
+
+    def get_by_booking(self, booking_id, statuses=None):
+        """A booking's latest payment attempt, optionally only among attempts in the given states"""
+        filters = {'booking_id': booking_id}
+        if statuses:
+            filters['status'] = {'$in': list(statuses)}
+        found = self.table.find(filters, sort=[('created_at', -1)], limit=1)
+        return found[0] if found else None
+
+    def list_all(self, filters=None):
+        return self.table.find(filters)
+
+    def add(self, payment):
+        self.table.insert(payment)
+        self.on_change()
+        return payment
+
+    def update(self, payment_id, fields):
+        matched = self.table.update({'id': payment_id}, fields)
+        self.on_change()
+        return matched
@@ -0,0 +1,217 @@
+import threading
+import uuid
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from journal_store import JournaledFile
+
+
+def _matches(doc, filters):
+    """Evaluate the subset of Mongo query syntax the repositories use"""
+    for field, condition in filters.items():
+        if field == '$or':
+            if not any(_matches(doc, clause) for clause in condition):
+                return False
+            continue
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == '$ne' and value == operand:
+                    return False
+                if op == '$in' and value not in operand:
+                    return False
+                if op in ('$lt', '$lte', '$gt', '$gte'):
+                    if value is None:
+                        return False
+                    if op == '$lt' and not value < operand:
+                        return False
+                    if op == '$lte' and not value <= operand:
+                        return False
+                    if op == '$gt' and not value > operand:
+                        return False
+                    if op == '$gte' and not value >= operand:
+                        return False
+        elif value != condition:
+            return False
+    return True
+
+
+class MemoryTable:
+    """Pure in-memory table with hash indexes on selected fields"""
+
+    def __init__(self, indexes=('id',)):
+        self._lock = threading.RLock()
+        self.docs = {}
+        self.indexes = {field: {} for field in set(indexes) | {'_id'}}
+
+    def coerce_id(self, value):
+        return value
+
+    def _add_to_indexes(self, doc):
+        for field, index in self.indexes.items():
+            if field in doc:
+                index.setdefault(doc[field], set()).add(doc['_id'])
+
+    def _remove_from_indexes(self, doc):
+        for field, index in self.indexes.items():
+            if field in doc:
+                bucket = index.get(doc[field])
+                if bucket:
+                    bucket.discard(doc['_id'])
+                    if not bucket:
+                        del index[doc[field]]
+
+    def _candidates(self, filters):
+        """Smallest index bucket covering an equality filter, or every document"""
+        if set(filters) == {'$or'}:
+            # Union of the clauses' candidates, deduplicated by _id
+            found = {}
+            for clause in filters['$or']:
+                for doc in self._candidates(clause):
+                    found[doc['_id']] = doc
+            return list(found.values())
+        best = None
+        for field, condition in filters.items():
+            if field in self.indexes and not isinstance(condition, dict):
+                bucket = self.indexes[field].get(condition, ())
+                if best is None or len(bucket) < len(best):
+                    best = bucket
+        if best is None:
+            return list(self.docs.values())
+        return [self.docs[key] for key in best]
+
+    def _select(self, filters):
+        filters = filters or {}
+        return [doc for doc in self._candidates(filters) if _matches(doc, filters)]
+
+    def find_one(self, filters):
+        with self._lock:
+            found = self._select(filters)
+            # Callers decorate results, so hand out copies like a database would
+            return dict(found[0]) if found else None
+
+    def find(self, filters=None, text='', text_fields=(), sort=None, limit=None, projection=None):
+        with self._lock:
+            found = self._select(filters)
+            if text:
+                needle = text.lower()
+                found = [doc for doc in found
+                         if any(needle in str(doc.get(field, '')).lower() for field in text_fields)]
+            for field, direction in reversed(list(sort or [])):
+                found.sort(key=lambda doc: (doc.get(field) is not None, doc.get(field)),
+                           reverse=direction < 0)
+            if limit:
+                found = found[:limit]
+            if projection:
+                return [{field: doc[field] for field in projection if field in doc} for doc in found]
+            return [dict(doc) for doc in found]
+
+    def count(self, filters=None):
+        with self._lock:
+            return len(self._select(filters))
+
+    def insert(self, doc):
+        with self._lock:
+            if '_id' not in doc:
+                doc['_id'] = uuid.uuid4().hex[:24]
+            stored = dict(doc)
+            self.docs[stored['_id']] = stored
+            self._add_to_indexes(stored)
+            return stored
+
+    def update(self, filters, fields):
+        with self._lock:
+            found = self._select(filters)
+            if not found:
+                return 0
+            doc = found[0]
+            self._remove_from_indexes(doc)
+            doc.update(fields)
+            self._add_to_indexes(doc)
+            return 1
+
+    def delete(self, filters):
+        with self._lock:
+            found = self._select(filters)
+            if not found:
+                return 0
+            doc = found[0]
+            self._remove_from_indexes(doc)
+            del self.docs[doc['_id']]
+            return 1
+
+
+class JournaledTable(MemoryTable):
+    """In-memory table persisted to a JSON snapshot + journal (the DataStore file format)"""
+
+    def __init__(self, path, key='id', indexes=('id',)):
+        super().__init__(indexes)
+        self.key = key
+        self.file = JournaledFile(path, key=key)
+        self.file.records_source = self._snapshot
+        for record in self.file.load():
+            # Legacy records only carry the custom id; reuse it so _id is stable across restarts
+            record.setdefault('_id', record[key])
+            super().insert(record)
+
+    def _snapshot(self):
+        """Consistent copy of every record, for compaction on the flusher thread"""
+        with self._lock:
+            return [dict(doc) for doc in self.docs.values()]
+
+    def insert(self, doc):
+        with self._lock:
+            if self.key not in doc:
+                doc[self.key] = doc.get('_id') or uuid.uuid4().hex[:24]
+            stored = super().insert(doc)
+            self.file.put(stored)
+            return stored
+
+    def update(self, filters, fields):
+        with self._lock:
+            found = self._select(filters)
+            matched = super().update(filters, fields)
+            if matched:
+                self.file.put(self.docs[found[0]['_id']])
+            return matched
+
+    def delete(self, filters):
+        with self._lock:
+            found = self._select(filters)
+            deleted = super().delete(filters)
+            if deleted:
+                self.file.delete(found[0][self.key])
+            return deleted
+
+
+class MemoryBackend:
+    """Indexed in-memory engine - no database required (tests, benchmarks)"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self.cars = MemoryTable(indexes=('id', 'make', 'vehicle_type', 'available'))
+        self.bookings = MemoryTable(indexes=('id', 'user_id', 'car_id', 'status'))
+        self.users = MemoryTable(indexes=('username', 'email'))
+        self.payments = MemoryTable(indexes=('id', 'booking_id', 'status'))
+
+
+class JsonBackend:
+    """Tables stored in the legacy JSON files used by DataStore"""
+
+    name = 'json'
+
+    def __init__(self, data_dir='.'):
+        self.cars = JournaledTable(os.path.join(data_dir, 'cars.json'),
+                                   indexes=('id', 'make', 'vehicle_type', 'available'))
+        self.bookings = JournaledTable(os.path.join(data_dir, 'bookings.json'),
+                                       indexes=('id', 'user_id', 'car_id', 'status'))
+        self.users = JournaledTable(os.path.join(data_dir, 'users.json'),
+                                    indexes=('id', 'username', 'email'))
+        self.payments = JournaledTable(os.path.join(data_dir, 'payments.json'),
+                                       indexes=('id', 'booking_id', 'status'))
+
+    def close(self):
+        """Flush pending journal writes"""
+        for table in (self.cars, self.bookings, self.users, self.payments):
+            table.file.close()
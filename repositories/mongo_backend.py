@@ -0,0 +1,64 @@
+from bson import ObjectId
+import re
+
+
+class MongoTable:
+    """Table adapter over a pymongo collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def coerce_id(self, value):
+        """Convert 24-char hex strings to ObjectId, leave old-style ids as-is"""
+        try:
+            if isinstance(value, str) and len(value) == 24:
+                return ObjectId(value)
+        except Exception:
+            pass
+        return value
+
+    def _query(self, filters, text, text_fields):
+        query = dict(filters or {})
+        if text:
+            pattern = re.escape(text)
+            query['$or'] = [{field: {'$regex': pattern, '$options': 'i'}} for field in text_fields]
+        return query
+
+    def find_one(self, filters):
+        return self.collection.find_one(filters)
+
+    def find(self, filters=None, text='', text_fields=(), sort=None, limit=None, projection=None):
+        cursor = self.collection.find(self._query(filters, text, text_fields),
+                                      list(projection) if projection else None)
+        if sort:
+            cursor = cursor.sort(list(sort))
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def count(self, filters=None):
+        return self.collection.count_documents(filters or {})
+
+    def insert(self, doc):
+        self.collection.insert_one(doc)
+
+    def update(self, filters, fields):
+        return self.collection.update_one(filters, {'$set': fields}).matched_count
+
+    def delete(self, filters):
+        return self.collection.delete_one(filters).deleted_count
+
+
+class MongoBackend:
+    """Tables backed by the shared MongoDB connection"""
+
+    name = 'mongo'
+
+    def __init__(self, db=None):
+        if db is None:
+            from database import mongodb
+            db = mongodb
+        self.cars = MongoTable(db.cars)
+        self.bookings = MongoTable(db.bookings)
+        self.users = MongoTable(db.users)
+        self.payments = MongoTable(db.payments)
@@ -0,0 +1,69 @@
+import argparse
+from services.repricing_service import RepricingEngine, RateTable, parse_rule
+
+# Bulk car repricing with dry runs, versioned history and rollback
+# (replaces the old convert/fix/revert price scripts)
+parser = argparse.ArgumentParser(description='Reprice cars in one bulk write')
+parser.add_argument('--rule', action='append', default=[], type=parse_rule,
+                    help='convert:USD:INR | percent:10[:suv] | set:4500:suv (applied in order, repeatable)')
+parser.add_argument('--type', help='Only reprice this vehicle type')
+parser.add_argument('--reason', default='', help='Stored with the price version')
+parser.add_argument('--dry-run', action='store_true', help='Show the changes without writing them')
+parser.add_argument('--rollback', type=int, metavar='VERSION', help='Restore the prices a version replaced')
+parser.add_argument('--history', nargs='?', const='', metavar='CAR_ID', help='List recent price versions')
+parser.add_argument('--set-rate', metavar='USD:INR=83.0', help='Store an exchange rate in the rate table')
+parser.add_argument('--rates', action='store_true', help='Show the rate table')
+args = parser.parse_args()
+
+engine = RepricingEngine()
+
+
+def print_changes(changes, limit=50):
+    for change in changes[:limit]:
+        print(f"  Car {change['car_id']}: {change['old']} -> {change['new']}")
+    if len(changes) > limit:
+        print(f"  ... and {len(changes) - limit} more")
+
+
+if args.set_rate:
+    pair, rate = args.set_rate.split('=')
+    base, quote = pair.split(':')
+    RateTable().set(base, quote, float(rate))
+    print(f"Rate {base.upper()}:{quote.upper()} set to {float(rate)}")
+
+elif args.rates:
+    for pair, rate in sorted(RateTable().all().items()):
+        print(f"{pair}: {rate}")
+
+elif args.history is not None:
+    # Car ids are stored as strings ("12"), so match them as given
+    car_id = args.history or None
+    for version in engine.history(car_id):
+        undone = f" (rolled back by {version['rolled_back_by']})" if version.get('rolled_back_by') else ''
+        print(f"Version {version['version']} {version['created_at']:%Y-%m-%d %H:%M} "
+              f"{version['status']}: {len(version['changes'])} cars - {version.get('reason') or 'no reason'}{undone}")
+        if car_id is not None:
+            print_changes(version['changes'])
+
+elif args.rollback is not None:
+    result = engine.rollback(args.rollback)
+    print(f"Rolled back version {args.rollback} as version {result['version']}: {result['updated']} cars restored")
+    if result['conflicts']:
+        print(f"{len(result['conflicts'])} cars were changed since and were left alone:")
+        print_changes(result['conflicts'])
+
+elif args.rule:
+    plan = engine.plan(args.rule, {'vehicle_type': args.type} if args.type else None)
+    print(f"{len(plan['changes'])} cars would change:")
+    print_changes(plan['changes'])
+    if args.dry_run or not plan['changes']:
+        print("\nDry run, nothing written." if args.dry_run else "\nNothing to do.")
+    else:
+        result = engine.apply(plan, args.reason)
+        print(f"\nVersion {result['version']}: {result['updated']} cars updated")
+        if result['conflicts']:
+            print(f"{len(result['conflicts'])} cars changed during the run and were skipped")
+        print(f"Undo with: python reprice.py --rollback {result['version']}")
+
+else:
+    parser.print_help()
@@ -100,8 +100,9 @@ class AnalyticsService:
             
             for booking in bookings:
                 date_key = booking['created_at'].strftime('%Y-%m-%d') if isinstance(booking['created_at'], datetime) else booking['created_at'][:10]
-                status = booking.get('status', 'active')
-                bookings_by_date[date_key][status] += 1
+                # Pending and confirmed bookings both count as active
+                status = booking.get('status')
+                bookings_by_date[date_key][status if status in ('completed', 'cancelled') else 'active'] += 1
             
             # Generate all dates
             dates = []
@@ -0,0 +1,121 @@
+import posixpath
+import hashlib
+import json
+import re
+import os
+
+
+class AssetManifest:
+    """
+    Maps static asset paths to content-fingerprinted copies built by build_assets.py.
+
+    Once registered on the app, url_for('static', filename='css/style.css') yields
+    the fingerprinted URL, and responses for fingerprinted files are marked
+    immutable so browsers cache them for a year without revalidating.
+    """
+
+    # Source folders under static/ that get fingerprinted (uploads are excluded)
+    SOURCE_DIRS = ('css', 'js', 'vendor')
+    OUTPUT_DIR = 'dist'
+    MANIFEST_NAME = 'assets-manifest.json'
+    IMMUTABLE = 'public, max-age=31536000, immutable'
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.path = os.path.join(static_folder, self.MANIFEST_NAME)
+        self.assets = {}
+        self.fingerprinted = set()
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.assets = json.load(f)
+        self.fingerprinted = set(self.assets.values())
+
+    def has(self, filename):
+        return filename in self.assets
+
+    def init_app(self, app):
+        app.url_defaults(self._rewrite_static)
+        app.after_request(self._cache_headers)
+        app.jinja_env.globals['use_vendored_assets'] = self.has('vendor/bootstrap/bootstrap.min.css')
+
+    def _rewrite_static(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.assets:
+            values['filename'] = self.assets[values['filename']]
+
+    def _cache_headers(self, response):
+        from flask import request
+        if request.endpoint == 'static' and request.view_args.get('filename') in self.fingerprinted:
+            response.headers['Cache-Control'] = self.IMMUTABLE
+            # Cache-Control governs; a stale Expires header would only confuse proxies
+            response.headers.pop('Expires', None)
+        return response
+
+
+def minify_css(css):
+    """Conservative CSS minification: comments and insignificant whitespace"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def build_manifest(static_folder, minify=True):
+    """Write fingerprinted copies of every source asset and the manifest; returns the mapping"""
+    sources = []
+    for source_dir in AssetManifest.SOURCE_DIRS:
+        root = os.path.join(static_folder, source_dir)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                sources.append(os.path.relpath(full_path, static_folder).replace(os.sep, '/'))
+
+    # Non-CSS files first so stylesheets can point at their fingerprinted fonts/images
+    sources.sort(key=lambda name: (name.endswith('.css'), name))
+    assets = {}
+
+    for name in sources:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            content = f.read()
+
+        if name.endswith('.css'):
+            css = content.decode('utf-8')
+            css = _rewrite_css_urls(css, name, assets)
+            if minify and not name.endswith('.min.css'):
+                css = minify_css(css)
+            content = css.encode('utf-8')
+
+        digest = hashlib.md5(content).hexdigest()[:10]
+        base, extension = posixpath.splitext(name)
+        output = f'{AssetManifest.OUTPUT_DIR}/{base}.{digest}{extension}'
+        output_path = os.path.join(static_folder, output)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'wb') as f:
+            f.write(content)
+        assets[name] = output
+
+    tmp_path = os.path.join(static_folder, f'{AssetManifest.MANIFEST_NAME}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(assets, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(static_folder, AssetManifest.MANIFEST_NAME))
+    return assets
+
+
+def _rewrite_css_urls(css, name, assets):
+    """Point relative url() references at fingerprinted files"""
+    source_dir = posixpath.dirname(name)
+    output_dir = posixpath.dirname(f'{AssetManifest.OUTPUT_DIR}/{name}')
+
+    def replace(match):
+        url = match.group(2)
+        if re.match(r'^(data:|https?:|//|/)', url):
+            return match.group(0)
+        path, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+        target = posixpath.normpath(posixpath.join(source_dir, path))
+        if target not in assets:
+            return match.group(0)
+        return f'url({match.group(1)}{posixpath.relpath(assets[target], output_dir)}{suffix}{match.group(1)})'
+
+    return re.sub(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)', replace, css)
@@ -1,21 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import threading
 import bcrypt
+import hmac
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import mongodb
+from config import Config
+from services.fragment_cache import fragment_cache
+
+
+class HashingBusyError(Exception):
+    """Raised when too many password hashes are already queued, or one took too long"""
+
 
 class AuthService:
+    # bcrypt releases the GIL, so a small pool keeps hashing off the request
+    # threads' CPU budget; the semaphore caps how many can wait for it
+    _executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix='bcrypt')
+    _queue_slots = threading.BoundedSemaphore(Config.PASSWORD_HASH_QUEUE_LIMIT)
+    
+    @staticmethod
+    def _run_hashing(func, *args):
+        """Run func on the hashing pool; raises HashingBusyError when the queue is full or the wait times out"""
+        if not AuthService._queue_slots.acquire(blocking=False):
+            raise HashingBusyError('Password hashing queue is full')
+        try:
+            future = AuthService._executor.submit(func, *args)
+        except Exception:
+            AuthService._queue_slots.release()
+            raise
+        # The slot is held until the job actually finishes, not just until this caller stops waiting
+        future.add_done_callback(lambda _: AuthService._queue_slots.release())
+        try:
+            return future.result(timeout=Config.PASSWORD_HASH_TIMEOUT)
+        except FutureTimeoutError:
+            raise HashingBusyError('Password hashing timed out')
+    
+    @staticmethod
+    def _hash(password, rounds):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+    
     @staticmethod
-    def hash_password(password):
-        """Hash a password using bcrypt"""
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-        return hashed.decode('utf-8')
+    def hash_password(password, rounds=None):
+        """Hash a password using bcrypt at the configured cost"""
+        return AuthService._run_hashing(AuthService._hash, password, rounds or Config.BCRYPT_ROUNDS)
+    
+    @staticmethod
+    def is_bcrypt_hash(stored):
+        return isinstance(stored, str) and stored.startswith(('$2a$', '$2b$', '$2y$'))
     
     @staticmethod
     def verify_password(password, hashed_password):
-        """Verify a password against its hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+        """Verify a password against its hash (or a plaintext password carried over from users.json)"""
+        if not hashed_password:
+            return False
+        if not AuthService.is_bcrypt_hash(hashed_password):
+            return hmac.compare_digest(password.encode('utf-8'), str(hashed_password).encode('utf-8'))
+        return AuthService._run_hashing(bcrypt.checkpw, password.encode('utf-8'), hashed_password.encode('utf-8'))
+    
+    @staticmethod
+    def needs_rehash(hashed_password):
+        """True for plaintext passwords and hashes made at a different cost"""
+        if not AuthService.is_bcrypt_hash(hashed_password):
+            return True
+        return int(hashed_password.split('$')[2]) != Config.BCRYPT_ROUNDS
+    
+    @staticmethod
+    def _upgrade_hash(user, password):
+        """Re-hash at the current cost after a successful login; failures leave the old hash in place"""
+        try:
+            mongodb.users.update_one(
+                {'_id': user['_id'], 'password': user['password']},
+                {'$set': {'password': AuthService.hash_password(password)}}
+            )
+        except Exception as e:
+            print(f"Error upgrading password hash: {e}")
     
     @staticmethod
     def register_user(username, email, password, phone=''):
@@ -28,7 +88,10 @@ class AuthService:
             return {'success': False, 'message': 'Email already exists'}
         
         # Hash password
-        hashed_password = AuthService.hash_password(password)
+        try:
+            hashed_password = AuthService.hash_password(password)
+        except HashingBusyError:
+            return {'success': False, 'message': 'Server is busy, please try again in a moment'}
         
         # Create user document
         user = {
@@ -44,6 +107,7 @@ class AuthService:
         # Insert user
         result = mongodb.users.insert_one(user)
         user['id'] = str(result.inserted_id)
+        fragment_cache.bump('users')
         
         return {'success': True, 'message': 'User registered successfully', 'user': user}
     
@@ -56,7 +120,14 @@ class AuthService:
             return {'success': False, 'message': 'Invalid username or password'}
         
         # Verify password
-        if AuthService.verify_password(password, user['password']):
+        try:
+            verified = AuthService.verify_password(password, user.get('password'))
+        except HashingBusyError:
+            return {'success': False, 'message': 'Too many sign-ins right now, please try again in a moment'}
+        
+        if verified:
+            if AuthService.needs_rehash(user['password']):
+                AuthService._upgrade_hash(user, password)
             return {'success': True, 'message': 'Login successful', 'user': user}
         else:
             return {'success': False, 'message': 'Invalid username or password'}
@@ -80,7 +151,10 @@ class AuthService:
             update_data['profile_picture'] = data['profile_picture']
         
         if 'password' in data and data['password']:
-            update_data['password'] = AuthService.hash_password(data['password'])
+            try:
+                update_data['password'] = AuthService.hash_password(data['password'])
+            except HashingBusyError:
+                return {'success': False, 'message': 'Server is busy, please try again in a moment'}
         
         if update_data:
             mongodb.users.update_one({'_id': user_id}, {'$set': update_data})
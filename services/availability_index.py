@@ -0,0 +1,150 @@
+from bisect import bisect_left, bisect_right
+from datetime import date
+import threading
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.pricing_engine import ACTIVE_STATUSES
+
+
+class AvailabilityIndex:
+    """
+    Per-car sorted interval index of bookings for date-range availability.
+
+    Each car keeps its blocking bookings sorted by start date, plus a running
+    maximum of their end dates. A car is free for [start, end] when no booking
+    starting on or before `end` reaches `start`: one bisect and one lookup, so
+    a search costs O(cars checked x log bookings per car) and never scans
+    bookings. Dates are ISO strings, which sort chronologically.
+
+    Local changes arrive through add/remove; changes made by other workers are
+    picked up by following the pricing engine's shared change counter.
+    """
+
+    def __init__(self, repos):
+        self.repos = repos
+        self.loaded = False
+        self.loaded_on = None    # Bookings that ended before this day are left out
+        self.pricing_engine = None
+        self.car_keys = {}       # str(id) and str(_id) -> car key
+        self.intervals = {}      # car key -> [(start, end, booking id)] sorted by start
+        self.max_end = {}        # car key -> running max of end dates over intervals
+        self._lock = threading.RLock()
+
+    def follow(self, pricing_engine):
+        """Rebuild whenever the pricing engine sees a booking or car change from another worker"""
+        self.pricing_engine = pricing_engine
+        pricing_engine.on_shared_change(self.reload)
+
+    def reload(self):
+        with self._lock:
+            self.loaded = False
+
+    def _ensure_loaded(self):
+        if self.pricing_engine is not None:
+            self.pricing_engine.sync()
+        if self.loaded and self.loaded_on == date.today():
+            return
+        with self._lock:
+            if self.loaded and self.loaded_on == date.today():
+                return
+            self.car_keys, self.intervals, self.max_end = {}, {}, {}
+            for car in self.repos.cars.list_all():
+                self._index_car(car)
+            self.loaded_on = date.today()
+            today = self.loaded_on.isoformat()
+            rows = {}
+            for booking in self.repos.bookings.list_all():
+                key = self.car_keys.get(str(booking.get('car_id')))
+                if (key is not None and booking.get('status') in ACTIVE_STATUSES
+                        and booking.get('start_date') and (booking.get('end_date') or '') >= today):
+                    rows.setdefault(key, []).append((booking['start_date'], booking['end_date'], booking.get('id')))
+            for key, intervals in rows.items():
+                self.intervals[key] = sorted(intervals)
+                self._refresh_max_end(key)
+            self.loaded = True
+
+    def _index_car(self, car):
+        key = str(car.get('id') or car.get('_id'))
+        self.car_keys[key] = key
+        self.car_keys[str(car.get('_id', key))] = key
+        self.intervals.setdefault(key, [])
+        self.max_end.setdefault(key, [])
+        return key
+
+    def _refresh_max_end(self, key, from_index=0):
+        intervals = self.intervals[key]
+        max_end = self.max_end.setdefault(key, [])
+        del max_end[from_index:]
+        running = max_end[-1] if max_end else ''
+        for _, end, _ in intervals[from_index:]:
+            running = max(running, end)
+            max_end.append(running)
+
+    def add(self, booking):
+        """A booking started blocking its car"""
+        if not self.loaded:
+            return
+        with self._lock:
+            key = self.car_keys.get(str(booking.get('car_id')))
+            if key is None or not booking.get('start_date') or not booking.get('end_date'):
+                return
+            row = (booking['start_date'], booking['end_date'], booking.get('id'))
+            intervals = self.intervals[key]
+            position = bisect_left(intervals, row)
+            if position < len(intervals) and intervals[position] == row:
+                return
+            intervals.insert(position, row)
+            self._refresh_max_end(key, position)
+
+    def remove(self, booking):
+        """A booking stopped blocking its car (cancelled or completed)"""
+        if not self.loaded:
+            return
+        with self._lock:
+            key = self.car_keys.get(str(booking.get('car_id')))
+            if key is None:
+                return
+            row = (booking.get('start_date'), booking.get('end_date'), booking.get('id'))
+            intervals = self.intervals[key]
+            position = bisect_left(intervals, row)
+            if position < len(intervals) and intervals[position] == row:
+                del intervals[position]
+                self._refresh_max_end(key, position)
+
+    def car_changed(self):
+        """Cars were added or removed; rebuild on next use"""
+        self.reload()
+
+    def _is_free(self, key, start_date, end_date):
+        intervals = self.intervals.get(key, [])
+        # Bookings starting after end_date can't overlap; of the rest, does any end on/after start_date?
+        count = bisect_right(intervals, (end_date, '\uffff'))
+        return count == 0 or self.max_end[key][count - 1] < start_date
+
+    def is_free(self, car_id, start_date, end_date):
+        self._ensure_loaded()
+        with self._lock:
+            key = self.car_keys.get(str(car_id))
+            return key is not None and self._is_free(key, start_date, end_date)
+
+    def free_cars(self, cars, start_date, end_date):
+        """The cars (dicts, in order) with no blocking booking overlapping [start_date, end_date]"""
+        if end_date < start_date:
+            raise ValueError('End date must be after start date')
+        self._ensure_loaded()
+        with self._lock:
+            free = []
+            for car in cars:
+                key = self.car_keys.get(str(car.get('id') or car.get('_id')))
+                if key is not None and self._is_free(key, start_date, end_date):
+                    free.append(car)
+            return free
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self.loaded,
+                'cars': len(self.intervals),
+                'bookings': sum(len(intervals) for intervals in self.intervals.values())
+            }
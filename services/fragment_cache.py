@@ -0,0 +1,140 @@
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+import threading
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from services.cache_service import TTLCache
+
+
+class FragmentCache:
+    """
+    Pre-rendered template fragments keyed by per-entity version counters.
+
+    A fragment's key holds the current version of every entity it depends on, so
+    bumping an entity ('cars', 'reviews', ...) makes all fragments built from it
+    unreachable at once; the bounded LRU store then ages them out.
+
+    With share_versions() the versions live in one shared counters document:
+    bumps are written there and each worker re-reads it at most once per
+    interval, so a change made on any worker expires fragments on all of them.
+    """
+
+    SHARED_ID = 'fragment_versions'
+
+    def __init__(self, maxsize=512, ttl=3600):
+        self.store = TTLCache(maxsize, ttl)
+        self.versions = {}
+        self.counters = None
+        self.sync_interval = 0
+        self.synced_at = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def share_versions(self, counters, interval=2):
+        """Keep versions in a shared collection (the Mongo counters collection)"""
+        self.counters = counters
+        self.sync_interval = interval
+        self.synced_at = 0
+
+    def _merge(self, shared):
+        with self._lock:
+            for entity, version in (shared or {}).items():
+                if entity != '_id' and version > self.versions.get(entity, 0):
+                    self.versions[entity] = version
+
+    def _sync(self):
+        now = time.time()
+        if now - self.synced_at < self.sync_interval or not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self.synced_at = now
+            self._merge(self.counters.find_one({'_id': self.SHARED_ID}))
+        except Exception as e:
+            print(f"Error reading fragment versions: {e}")
+        finally:
+            self._sync_lock.release()
+
+    def bump(self, *entities):
+        """Record that the given entity types changed"""
+        with self._lock:
+            for entity in entities:
+                self.versions[entity] = self.versions.get(entity, 0) + 1
+        if self.counters is not None:
+            try:
+                from pymongo import ReturnDocument
+                shared = self.counters.find_one_and_update(
+                    {'_id': self.SHARED_ID},
+                    {'$inc': {entity: 1 for entity in entities}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                self._merge(shared)
+            except Exception as e:
+                print(f"Error sharing fragment versions: {e}")
+
+    def key(self, name, entities, vary=()):
+        if self.counters is not None:
+            self._sync()
+        with self._lock:
+            versions = tuple(self.versions.get(entity, 0) for entity in entities)
+        return (name, tuple(entities), versions, tuple(str(value) for value in vary))
+
+    def get_or_render(self, name, entities, vary, render):
+        # Key is taken before rendering so a change mid-render can't be cached as current
+        key = self.key(name, entities, vary)
+        html = self.store.get(key)
+        if html is None:
+            html = str(render())
+            self.store.set(key, html)
+        return Markup(html)
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self):
+        with self._lock:
+            versions = dict(self.versions)
+        return dict(self.store.stats(), versions=versions)
+
+
+class FragmentCacheExtension(Extension):
+    """
+    {% cache 'name', ['entity', ...], vary1, vary2 %} ... {% endcache %}
+
+    Renders the body once per combination of entity versions and vary values.
+    Without a fragment_cache on the environment the body is rendered every time.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        parser.stream.expect('comma')
+        args.append(parser.parse_expression())
+
+        vary = []
+        while parser.stream.skip_if('comma'):
+            vary.append(parser.parse_expression())
+        args.append(nodes.List(vary))
+
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render_cached', args), [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, name, entities, vary, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        return cache.get_or_render(name, entities, vary, caller)
+
+
+# Shared by the app and the services that write data
+fragment_cache = FragmentCache(Config.FRAGMENT_CACHE_SIZE, Config.FRAGMENT_CACHE_TTL)
@@ -0,0 +1,92 @@
+import threading
+import hashlib
+import gzip
+
+# Brotli is optional; without it responses fall back to gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class ResponseOptimizer:
+    """
+    Conditional GET and compression for dynamic responses.
+
+    Every 200 response to a GET/HEAD gets a weak ETag taken from a hash of its
+    body, and a matching If-None-Match is answered with an empty 304. Text
+    responses over min_size are then brotli- or gzip-compressed according to
+    Accept-Encoding. File downloads and static files are passed through untouched.
+    """
+
+    COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+    def __init__(self, min_size=500, gzip_level=6, brotli_quality=5):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.route_stats = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.after_request(self.process)
+
+    def choose_encoding(self, accept_encoding):
+        accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level)
+
+    def process(self, response):
+        from flask import request
+
+        if (request.method not in ('GET', 'HEAD') or response.status_code != 200
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        data = response.get_data()
+        if not response.get_etag()[0]:
+            response.set_etag(hashlib.sha1(data).hexdigest(), weak=True)
+
+        response.make_conditional(request)
+        if response.status_code == 304:
+            self._record(request.endpoint, len(data), 0, not_modified=True)
+            return response
+
+        sent = len(data)
+        encoding = self.choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if (response.mimetype or '').startswith(self.COMPRESSIBLE_TYPES):
+            response.vary.add('Accept-Encoding')
+            if encoding and len(data) >= self.min_size:
+                compressed = self.compress(data, encoding)
+                if len(compressed) < len(data):
+                    response.set_data(compressed)
+                    response.headers['Content-Encoding'] = encoding
+                    sent = len(compressed)
+
+        self._record(request.endpoint, len(data), sent)
+        return response
+
+    def _record(self, endpoint, original, sent, not_modified=False):
+        with self._lock:
+            stats = self.route_stats.setdefault(endpoint or 'other', {'responses': 0, 'original_bytes': 0, 'sent_bytes': 0, 'not_modified': 0})
+            stats['responses'] += 1
+            stats['original_bytes'] += original
+            stats['sent_bytes'] += sent
+            stats['not_modified'] += not_modified
+
+    def stats(self):
+        """Bytes before and after compression/304s, per endpoint"""
+        with self._lock:
+            return {
+                endpoint: dict(counters, saved_bytes=counters['original_bytes'] - counters['sent_bytes'])
+                for endpoint, counters in self.route_stats.items()
+            }
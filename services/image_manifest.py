@@ -0,0 +1,55 @@
+import threading
+import time
+import os
+
+
+class ImageManifest:
+    """
+    In-memory set of the files in an image folder.
+
+    Membership checks are answered from memory. The folder is re-listed when an
+    upload registers a new file, or when its mtime has changed; the mtime is
+    checked at most once per refresh interval.
+    """
+
+    def __init__(self, folder, refresh_interval=30):
+        self.folder = folder
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._files = frozenset()
+        self._mtime = None
+        self._checked_at = 0
+        self.refresh()
+
+    def refresh(self):
+        """Re-list the folder"""
+        try:
+            mtime = os.stat(self.folder).st_mtime
+            files = frozenset(entry.name for entry in os.scandir(self.folder) if entry.is_file())
+        except OSError:
+            mtime, files = None, frozenset()
+        with self._lock:
+            self._files = files
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+
+    def _maybe_refresh(self):
+        if time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        try:
+            mtime = os.stat(self.folder).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self.refresh()
+        else:
+            self._checked_at = time.monotonic()
+
+    def add(self, filename):
+        """Upload hook: register a file written by the app"""
+        with self._lock:
+            self._files = self._files | {filename}
+
+    def __contains__(self, filename):
+        self._maybe_refresh()
+        return filename in self._files
@@ -0,0 +1,222 @@
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps, features
+import tempfile
+import hashlib
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+
+class ImageService:
+    """Content-hashed storage and resized derivatives for vehicle photos and avatars"""
+
+    # Variant name -> target width in pixels
+    VARIANTS = {'thumb': 320, 'card': 640, 'hero': 1280}
+    JPEG_QUALITY = 82
+    WEBP_QUALITY = 80
+    # Re-encoding quality for stored originals (re-encoded only to drop their metadata)
+    ORIGINAL_QUALITY = 95
+    # Info keys that can carry location, device or author details
+    METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+
+    # Square avatar edge lengths in pixels; the largest is the one stored on the user
+    AVATAR_SIZES = (64, 128, 256)
+    AVATAR_QUALITY = 80
+
+    _executor = ThreadPoolExecutor(max_workers=Config.IMAGE_WORKERS, thread_name_prefix='image-worker')
+
+    @staticmethod
+    def _static_url(path):
+        relative = os.path.relpath(path, 'static').replace(os.sep, '/')
+        return f'/static/{relative}'
+
+    @staticmethod
+    def _stream_to_temp(file_storage, folder, max_bytes=None):
+        """Copy an upload to a temp file while hashing it; raises ValueError past max_bytes"""
+        os.makedirs(folder, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in iter(lambda: file_storage.stream.read(65536), b''):
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise ValueError(f'File is too large (maximum {max_bytes // (1024 * 1024)} MB)')
+                    digest.update(chunk)
+                    tmp.write(chunk)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest()[:20]
+
+    @staticmethod
+    def _strip_metadata(path):
+        """Rewrite an image in place without EXIF (GPS position, camera serial) or similar metadata"""
+        with Image.open(path) as original:
+            image_format = original.format
+            if image_format == 'GIF':
+                return  # No EXIF, and re-saving would flatten animations
+            # Apply camera orientation before the metadata that records it is dropped
+            image = ImageOps.exif_transpose(original)
+            image.load()
+        for key in ImageService.METADATA_KEYS:
+            image.info.pop(key, None)
+        if image_format == 'JPEG':
+            image.save(path, 'JPEG', quality=ImageService.ORIGINAL_QUALITY, optimize=True,
+                       icc_profile=image.info.get('icc_profile'))
+        else:
+            image.save(path, image_format)
+
+    @staticmethod
+    def save_upload(file_storage, upload_folder=None):
+        """
+        Stream an upload to disk under a content-hashed name; identical files are stored once.
+        The stored original is served as-is, so its metadata is stripped first. Raises
+        ValueError when the upload is not a readable image.
+        """
+        upload_folder = upload_folder or Config.UPLOAD_FOLDER
+        extension = os.path.splitext(file_storage.filename)[1].lower() or '.jpg'
+        tmp_path, content_hash = ImageService._stream_to_temp(file_storage, upload_folder)
+
+        filename = f'{content_hash}{extension}'
+        path = os.path.join(upload_folder, filename)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            try:
+                ImageService._strip_metadata(tmp_path)
+            except Exception:
+                os.remove(tmp_path)
+                raise ValueError('Uploaded file is not a valid image')
+            os.replace(tmp_path, path)
+
+        return {'hash': content_hash, 'filename': filename, 'path': path}
+
+    @staticmethod
+    def variant_urls(content_hash):
+        """URLs of every derivative for a stored original"""
+        folder = Config.IMAGE_DERIVATIVES_FOLDER
+        formats = ['jpeg'] + (['webp'] if features.check('webp') else [])
+        return {
+            name: {
+                fmt: ImageService._static_url(os.path.join(folder, f'{content_hash}_{name}.{"jpg" if fmt == "jpeg" else fmt}'))
+                for fmt in formats
+            }
+            for name in ImageService.VARIANTS
+        }
+
+    @staticmethod
+    def generate_variants(source_path, content_hash):
+        """Resize to every variant width in JPEG and WebP, without EXIF/ICC metadata"""
+        folder = Config.IMAGE_DERIVATIVES_FOLDER
+        os.makedirs(folder, exist_ok=True)
+
+        with Image.open(source_path) as original:
+            # Apply camera orientation before the metadata is dropped
+            image = ImageOps.exif_transpose(original).convert('RGB')
+
+        for name, width in ImageService.VARIANTS.items():
+            if image.width > width:
+                height = round(image.height * width / image.width)
+                resized = image.resize((width, height), Image.LANCZOS)
+            else:
+                resized = image
+
+            jpeg_path = os.path.join(folder, f'{content_hash}_{name}.jpg')
+            if not os.path.exists(jpeg_path):
+                resized.save(jpeg_path, 'JPEG', quality=ImageService.JPEG_QUALITY,
+                             optimize=True, progressive=True)
+
+            if features.check('webp'):
+                webp_path = os.path.join(folder, f'{content_hash}_{name}.webp')
+                if not os.path.exists(webp_path):
+                    resized.save(webp_path, 'WEBP', quality=ImageService.WEBP_QUALITY, method=6)
+
+        return ImageService.variant_urls(content_hash)
+
+    @staticmethod
+    def generate_variants_async(source_path, content_hash, on_complete=None):
+        """Queue derivative generation on the image worker pool"""
+        def job():
+            try:
+                variants = ImageService.generate_variants(source_path, content_hash)
+                if on_complete:
+                    on_complete(variants)
+            except Exception as e:
+                print(f"Error generating image variants for {source_path}: {e}")
+
+        return ImageService._executor.submit(job)
+
+    @staticmethod
+    def srcset(variants, fmt='jpeg'):
+        """Build an srcset attribute value from a variants mapping"""
+        if not variants:
+            return ''
+        return ', '.join(
+            f"{urls[fmt]} {ImageService.VARIANTS[name]}w"
+            for name, urls in variants.items()
+            if fmt in urls and name in ImageService.VARIANTS
+        )
+
+    @staticmethod
+    def avatar_url(content_hash, size=None):
+        size = size or max(ImageService.AVATAR_SIZES)
+        return ImageService._static_url(os.path.join(Config.PROFILE_PICTURE_FOLDER, f'{content_hash}_{size}.jpg'))
+
+    @staticmethod
+    def save_avatar(file_storage):
+        """
+        Store a profile picture content-addressed and resize it in the background.
+        Returns the content hash; raises ValueError for oversized or non-image uploads.
+        """
+        folder = Config.PROFILE_PICTURE_FOLDER
+        tmp_path, content_hash = ImageService._stream_to_temp(file_storage, folder, Config.AVATAR_MAX_BYTES)
+
+        # Header check only - full decoding happens on the worker
+        try:
+            with Image.open(tmp_path) as image:
+                image.verify()
+        except Exception:
+            os.remove(tmp_path)
+            raise ValueError('Uploaded file is not a valid image')
+
+        paths = [os.path.join(folder, f'{content_hash}_{size}.jpg') for size in ImageService.AVATAR_SIZES]
+        if all(os.path.exists(path) for path in paths):
+            # Same picture already uploaded by someone - share it
+            os.remove(tmp_path)
+            return content_hash
+
+        def job():
+            try:
+                ImageService.generate_avatars(tmp_path, content_hash)
+            except Exception as e:
+                print(f"Error generating avatar {content_hash}: {e}")
+            finally:
+                os.remove(tmp_path)
+
+        ImageService._executor.submit(job)
+        return content_hash
+
+    @staticmethod
+    def generate_avatars(source_path, content_hash):
+        """Center-crop to squares at every avatar size, dropping metadata"""
+        folder = Config.PROFILE_PICTURE_FOLDER
+        with Image.open(source_path) as original:
+            image = ImageOps.exif_transpose(original).convert('RGB')
+
+        for size in ImageService.AVATAR_SIZES:
+            path = os.path.join(folder, f'{content_hash}_{size}.jpg')
+            avatar = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            # Write then rename so a half-written file is never served
+            tmp_path = f'{path}.tmp'
+            avatar.save(tmp_path, 'JPEG', quality=ImageService.AVATAR_QUALITY, optimize=True)
+            os.replace(tmp_path, path)
+
+    @staticmethod
+    def delete_avatar(content_hash):
+        for size in ImageService.AVATAR_SIZES:
+            path = os.path.join(Config.PROFILE_PICTURE_FOLDER, f'{content_hash}_{size}.jpg')
+            if os.path.exists(path):
+                os.remove(path)
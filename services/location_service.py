@@ -1,8 +1,18 @@
 from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+import bisect
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import mongodb
+from config import Config
+
+
+def _slot_minutes(slot):
+    """'01:00 PM' -> minutes after midnight"""
+    parsed = datetime.strptime(slot, '%I:%M %p')
+    return parsed.hour * 60 + parsed.minute
+
 
 class LocationService:
     """Service for managing pickup/drop locations and time slots"""
@@ -24,6 +34,20 @@ class LocationService:
         '06:00 PM', '07:00 PM', '08:00 PM', '09:00 PM', '10:00 PM'
     ]
     
+    # Slots parsed once into minute offsets (TIME_SLOTS is in chronological order)
+    SLOT_OFFSETS = [_slot_minutes(slot) for slot in TIME_SLOTS]
+    SLOT_INDEX = {slot: index for index, slot in enumerate(TIME_SLOTS)}
+    
+    # Pickups each location can hand over per slot
+    SLOT_CAPACITY = Config.PICKUP_SLOT_CAPACITY
+    
+    # One counter document per (date, location, slot) in mongodb.pickup_slots, shared by
+    # all workers; seeded once from existing bookings, expired a day after the pickup date
+    SEEDED_MARKER = 'pickup_slots_seeded'
+    # Seconds a worker may hold the seeding job before another one takes it over
+    SEED_LEASE = 300
+    _seeded = False
+    
     @staticmethod
     def get_all_locations():
         """Get all available pickup/drop locations"""
@@ -38,27 +62,31 @@ class LocationService:
         return None
     
     @staticmethod
-    def get_available_time_slots(date_str):
-        """Get available time slots for a given date"""
+    def _first_open_slot(selected_date):
+        """Index of the first slot still ahead of now on the selected date"""
+        now = datetime.now()
+        if selected_date != now.date():
+            return 0
+        return bisect.bisect_right(LocationService.SLOT_OFFSETS, now.hour * 60 + now.minute)
+    
+    @staticmethod
+    def get_available_time_slots(date_str, location_id=None):
+        """Get available time slots for a given date, optionally only those with pickup capacity left"""
         # Return all slots if no date provided or invalid date
         if not date_str or date_str.strip() == '':
             return LocationService.TIME_SLOTS
             
         try:
             selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            current_date = datetime.now().date()
-            current_time = datetime.now().time()
             
             # If selected date is today, filter out past time slots
-            if selected_date == current_date:
-                available_slots = []
-                for slot in LocationService.TIME_SLOTS:
-                    slot_time = datetime.strptime(slot, '%I:%M %p').time()
-                    if slot_time > current_time:
-                        available_slots.append(slot)
-                return available_slots if available_slots else LocationService.TIME_SLOTS
-            else:
-                return LocationService.TIME_SLOTS
+            first = LocationService._first_open_slot(selected_date)
+            available_slots = LocationService.TIME_SLOTS[first:]
+            if location_id:
+                remaining = LocationService.get_slot_availability(date_str, location_id)
+                available_slots = [slot for slot in available_slots if remaining.get(slot, 0) > 0]
+                return available_slots
+            return available_slots if available_slots else LocationService.TIME_SLOTS
         except ValueError:
             # Return all slots if date format is invalid
             return LocationService.TIME_SLOTS
@@ -66,6 +94,155 @@ class LocationService:
             print(f"Error in get_available_time_slots: {e}")
             return LocationService.TIME_SLOTS
     
+    @staticmethod
+    def _slot_key(booking):
+        """Counter document id for a booking's pickup slot, or None if it has no usable slot"""
+        slot = booking.get('pickup_time')
+        if slot not in LocationService.SLOT_INDEX or not booking.get('pickup_location') or not booking.get('start_date'):
+            return None
+        return f"{booking['start_date']}|{booking['pickup_location']}|{slot}"
+    
+    @staticmethod
+    def _slot_fields(booking):
+        pickup_date = datetime.strptime(booking['start_date'], '%Y-%m-%d')
+        return {
+            'date': booking['start_date'],
+            'location': booking['pickup_location'],
+            'slot': booking['pickup_time'],
+            'expires_at': pickup_date + timedelta(days=2)
+        }
+    
+    @staticmethod
+    def _ensure_seeded():
+        """
+        Count bookings made before the counters existed, exactly once across all workers.
+        The marker goes from 'building' (held under a lease) to 'done' only after the
+        rebuild succeeds, so a worker that dies mid-rebuild leaves it for another to retry.
+        """
+        if LocationService._seeded:
+            return
+        marker_id = LocationService.SEEDED_MARKER
+        now = datetime.utcnow()
+        lease = {'status': 'building', 'lease_until': now + timedelta(seconds=LocationService.SEED_LEASE)}
+        try:
+            marker = mongodb.counters.find_one({'_id': marker_id})
+            if marker is None:
+                try:
+                    mongodb.counters.insert_one(dict(lease, _id=marker_id))
+                except DuplicateKeyError:
+                    return  # Another worker just claimed it
+            elif marker.get('status', 'done') == 'done':  # Markers from before the lease carry no status
+                LocationService._seeded = True
+                return
+            elif not mongodb.counters.update_one(
+                    {'_id': marker_id, 'status': 'building', 'lease_until': {'$lte': now}},
+                    {'$set': lease}).modified_count:
+                return  # Still being built elsewhere; counting goes on meanwhile ($max makes it safe)
+        except Exception as e:
+            print(f"Error claiming pickup slot seeding: {e}")
+            return
+        
+        try:
+            LocationService.rebuild_pickup_counts()
+            mongodb.counters.update_one({'_id': marker_id},
+                                        {'$set': {'status': 'done', 'seeded_at': datetime.utcnow()},
+                                         '$unset': {'lease_until': ''}})
+            LocationService._seeded = True
+        except Exception as e:
+            print(f"Error seeding pickup slot counts: {e}")
+            try:
+                # Let the next request (here or on another worker) retry straight away
+                mongodb.counters.update_one({'_id': marker_id, 'status': 'building'},
+                                            {'$set': {'lease_until': datetime.utcnow()}})
+            except Exception:
+                pass  # The lease runs out on its own
+    
+    @staticmethod
+    def rebuild_pickup_counts():
+        """Raise every slot counter to at least the number of live bookings using it"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        usage = mongodb.bookings.aggregate([
+            {'$match': {'status': {'$ne': 'cancelled'}, 'start_date': {'$gte': today},
+                        'pickup_location': {'$ne': None}}},
+            {'$group': {'_id': {'start_date': '$start_date', 'pickup_location': '$pickup_location',
+                                'pickup_time': '$pickup_time'}, 'count': {'$sum': 1}}}
+        ])
+        for row in usage:
+            booking = row['_id']
+            key = LocationService._slot_key(booking)
+            if key:
+                # $max, so reservations made while this runs are not counted twice
+                mongodb.pickup_slots.update_one(
+                    {'_id': key},
+                    {'$max': {'count': row['count']}, '$set': LocationService._slot_fields(booking)},
+                    upsert=True
+                )
+    
+    @staticmethod
+    def reserve_pickup(booking, enforce=True):
+        """
+        Atomically count a booking against its pickup slot. Returns False when the
+        slot is already full (only checked when enforce is set; admins reinstating
+        a booking may go over).
+        """
+        key = LocationService._slot_key(booking)
+        if key is None:
+            return True
+        LocationService._ensure_seeded()
+        query = {'_id': key}
+        if enforce:
+            query['count'] = {'$lt': LocationService.SLOT_CAPACITY}
+        try:
+            mongodb.pickup_slots.update_one(
+                query,
+                {'$inc': {'count': 1}, '$setOnInsert': LocationService._slot_fields(booking)},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The slot exists but failed the capacity filter, so the upsert collided with it
+            return False
+        except Exception as e:
+            print(f"Error reserving pickup slot: {e}")
+            return True
+    
+    @staticmethod
+    def release_pickup(booking):
+        """Give a cancelled booking's pickup slot back"""
+        key = LocationService._slot_key(booking)
+        if key is None:
+            return
+        try:
+            mongodb.pickup_slots.update_one({'_id': key, 'count': {'$gt': 0}}, {'$inc': {'count': -1}})
+        except Exception as e:
+            print(f"Error releasing pickup slot: {e}")
+    
+    @staticmethod
+    def _slot_counts(date_str, location_id):
+        LocationService._ensure_seeded()
+        try:
+            return {doc['slot']: doc.get('count', 0)
+                    for doc in mongodb.pickup_slots.find({'date': date_str, 'location': location_id})}
+        except Exception as e:
+            print(f"Error reading pickup slot counts: {e}")
+            return {}
+    
+    @staticmethod
+    def get_slot_availability(date_str, location_id):
+        """Remaining pickups per upcoming slot at a location on a date (YYYY-MM-DD)"""
+        selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        first = LocationService._first_open_slot(selected_date)
+        counts = LocationService._slot_counts(date_str, location_id)
+        capacity = LocationService.SLOT_CAPACITY
+        return {slot: capacity - counts.get(slot, 0) for slot in LocationService.TIME_SLOTS[first:]}
+    
+    @staticmethod
+    def has_pickup_capacity(date_str, location_id, slot):
+        """Advisory check for forms; reserve_pickup is what enforces the limit"""
+        if slot not in LocationService.SLOT_INDEX:
+            return True
+        return LocationService._slot_counts(date_str, location_id).get(slot, 0) < LocationService.SLOT_CAPACITY
+    
     @staticmethod
     def save_pickup_drop_details(booking_id, pickup_location, drop_location, pickup_time, drop_time):
         """Save pickup and drop details for a booking"""
@@ -0,0 +1,324 @@
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import threading
+import json
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from journal_store import JournaledFile, restore_dates
+
+
+def _is_versioned_snapshot(path):
+    """Compacted snapshots are {"generation": n, "records": [...]}; legacy exports are a bare array"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read(200).lstrip().startswith('{')
+
+
+def iter_json_array(path, chunk_size=65536):
+    """Yield the records of a JSON array (or a snapshot's "records" array) without loading the whole file"""
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+
+    if ijson is not None:
+        prefix = 'records.item' if _is_versioned_snapshot(path) else 'item'
+        with open(path, 'rb') as f:
+            for record in ijson.items(f, prefix, use_float=True):
+                yield record
+        return
+
+    # Fallback: incremental decoding with the standard library
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        eof = False
+        started = False
+
+        while True:
+            buffer = buffer.lstrip()
+            if not buffer or (started and buffer[0] not in ',]' and len(buffer) < chunk_size):
+                if not eof:
+                    chunk = f.read(chunk_size)
+                    if chunk:
+                        buffer += chunk
+                        continue
+                    eof = True
+                if not buffer:
+                    if started:
+                        raise ValueError(f'Unexpected end of file in {path}')
+                    return
+
+            if not started and buffer[0] == '{':
+                # Snapshot header: skip to the records array
+                records_at = buffer.find('"records"')
+                array_at = buffer.find('[', records_at) if records_at >= 0 else -1
+                if array_at < 0:
+                    chunk = '' if eof else f.read(chunk_size)
+                    if not chunk:
+                        raise ValueError(f'{path} has no records array')
+                    buffer += chunk
+                    continue
+                buffer = buffer[array_at:]
+
+            if not started:
+                if buffer[0] != '[':
+                    raise ValueError(f'{path} does not contain a JSON array')
+                buffer = buffer[1:]
+                started = True
+                continue
+
+            if buffer[0] == ',':
+                buffer = buffer[1:]
+                continue
+
+            if buffer[0] == ']':
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Record is split across chunks - read more and retry
+                chunk = f.read(chunk_size)
+                if chunk:
+                    buffer += chunk
+                else:
+                    eof = True
+                continue
+
+            yield record
+            buffer = buffer[end:]
+
+
+def _user_defaults(user):
+    """Fill fields added after the JSON era"""
+    if 'email' not in user:
+        user['email'] = f"{user['username']}@example.com"
+    if 'phone' not in user:
+        user['phone'] = ''
+    if 'profile_picture' not in user:
+        user['profile_picture'] = ''
+    return user
+
+
+def _car_defaults(car):
+    """Fill fields added after the JSON era"""
+    if 'vehicle_type' not in car:
+        car['vehicle_type'] = 'car'
+    if 'rating' not in car:
+        car['rating'] = 0
+    if 'review_count' not in car:
+        car['review_count'] = 0
+    return car
+
+
+def _booking_defaults(booking):
+    """Fill fields added after the JSON era"""
+    booking.setdefault('payment_status', 'pending')
+    booking.setdefault('payment_method', '')
+    booking.setdefault('pickup_location', 'Not specified')
+    booking.setdefault('drop_location', 'Not specified')
+    booking.setdefault('pickup_time', '09:00 AM')
+    booking.setdefault('drop_time', '09:00 AM')
+    return booking
+
+
+class JSONMigrator:
+    """Stream legacy JSON exports into MongoDB with batched upserts"""
+
+    # (source file, collection, dedupe key, defaults)
+    SOURCES = [
+        ('users.json', 'users', 'username', _user_defaults),
+        ('cars.json', 'cars', 'id', _car_defaults),
+        ('bookings.json', 'bookings', 'id', _booking_defaults),
+    ]
+
+    def __init__(self, db=None, batch_size=None, checkpoint_path=None, progress=None):
+        if db is None:
+            from database import mongodb
+            db = mongodb
+        self.db = db
+        self.batch_size = batch_size or Config.MIGRATION_BATCH_SIZE
+        self.checkpoint_path = checkpoint_path or Config.MIGRATION_CHECKPOINT
+        self.progress = progress or (lambda message: None)
+        self.checkpoint = self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            try:
+                with open(self.checkpoint_path, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {}
+
+    def _save_checkpoint(self):
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def reset(self):
+        """Forget previous progress so the next run starts from scratch"""
+        self.checkpoint = {}
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def _flush(self, collection, key, batch, stats):
+        """Upsert a batch in a single round trip; existing records are left untouched"""
+        operations = [
+            UpdateOne({key: doc[key]}, {'$setOnInsert': doc}, upsert=True)
+            for doc in batch.values()
+        ]
+        try:
+            result = collection.bulk_write(operations, ordered=False)
+            stats['inserted'] += result.upserted_count
+            stats['skipped'] += len(operations) - result.upserted_count
+        except BulkWriteError as e:
+            details = e.details
+            stats['inserted'] += details.get('nUpserted', 0)
+            stats['errors'] += len(details.get('writeErrors', []))
+            stats['skipped'] += len(operations) - details.get('nUpserted', 0) - len(details.get('writeErrors', []))
+
+    def migrate_file(self, path, collection_name, key, defaults, resume=True):
+        """Migrate one JSON file, committing progress after every batch"""
+        stats = {'file': path, 'read': 0, 'inserted': 0, 'skipped': 0, 'errors': 0}
+        # Writes since the last compaction are only in the journal next to the snapshot
+        journal = JournaledFile(path)
+        if not os.path.exists(path) and not os.path.exists(journal.journal_path):
+            return stats
+
+        collection = getattr(self.db, collection_name)
+        changes = journal.journal_changes()
+        fingerprint = {}
+        if os.path.exists(path):
+            file_stat = os.stat(path)
+            fingerprint = {'size': file_stat.st_size, 'mtime': file_stat.st_mtime}
+        if os.path.exists(journal.journal_path):
+            journal_stat = os.stat(journal.journal_path)
+            fingerprint['journal'] = {'size': journal_stat.st_size, 'mtime': journal_stat.st_mtime}
+
+        # Only resume if the file has not changed since the checkpoint was written
+        state = self.checkpoint.get(path, {})
+        if not resume or state.get('fingerprint') != fingerprint:
+            state = {'fingerprint': fingerprint, 'records': 0, 'done': False}
+        if state.get('done'):
+            self.progress(f'[{collection_name}] {path} already migrated, skipping')
+            return stats
+
+        resume_from = state['records']
+        if resume_from:
+            self.progress(f'[{collection_name}] resuming {path} after {resume_from} records')
+
+        def current_records():
+            # Snapshot records the journal left alone, then the journal's current versions
+            if os.path.exists(path):
+                for record in iter_json_array(path):
+                    if record.get(journal.key) not in changes:
+                        yield restore_dates(record)
+            for record in changes.values():
+                if record is not None:
+                    yield record
+
+        started = time.time()
+        batch = {}
+        for record in current_records():
+            stats['read'] += 1
+            if stats['read'] <= resume_from:
+                continue
+            if key not in record:
+                stats['errors'] += 1
+                continue
+            # Keep the first occurrence of duplicated keys within a batch
+            if record[key] in batch:
+                stats['skipped'] += 1
+                continue
+            batch[record[key]] = defaults(record)
+
+            if len(batch) >= self.batch_size:
+                self._flush(collection, key, batch, stats)
+                batch = {}
+                state['records'] = stats['read']
+                self.checkpoint[path] = state
+                self._save_checkpoint()
+                rate = (stats['read'] - resume_from) / max(time.time() - started, 1e-6)
+                self.progress(f"[{collection_name}] {stats['read']} records read, "
+                              f"{stats['inserted']} inserted ({rate:.0f}/s)")
+
+        if batch:
+            self._flush(collection, key, batch, stats)
+
+        state['records'] = stats['read']
+        state['done'] = True
+        state['finished_at'] = datetime.utcnow().isoformat()
+        self.checkpoint[path] = state
+        self._save_checkpoint()
+
+        self.progress(f"[{collection_name}] done: {stats['read']} read, {stats['inserted']} inserted, "
+                      f"{stats['skipped']} already present, {stats['errors']} errors")
+        return stats
+
+    def run(self, sources=None, resume=True):
+        """Migrate all configured sources and return per-file statistics"""
+        results = []
+        for path, collection_name, key, defaults in sources or self.SOURCES:
+            results.append(self.migrate_file(path, collection_name, key, defaults, resume=resume))
+        return results
+
+
+class MigrationService:
+    """Run the migration in the background so web requests return immediately"""
+
+    _lock = threading.Lock()
+    _status = {'running': False, 'messages': [], 'results': None, 'error': None,
+               'started_at': None, 'finished_at': None}
+
+    @staticmethod
+    def start_background():
+        """Start a migration thread; returns False if one is already running"""
+        with MigrationService._lock:
+            if MigrationService._status['running']:
+                return False
+            MigrationService._status.update({
+                'running': True, 'messages': [], 'results': None, 'error': None,
+                'started_at': datetime.utcnow(), 'finished_at': None
+            })
+
+        thread = threading.Thread(target=MigrationService._run, daemon=True)
+        thread.start()
+        return True
+
+    @staticmethod
+    def _record(message):
+        with MigrationService._lock:
+            messages = MigrationService._status['messages']
+            messages.append(message)
+            # Keep only recent progress lines
+            del messages[:-50]
+
+    @staticmethod
+    def _run():
+        results, error = None, None
+        try:
+            results = JSONMigrator(progress=MigrationService._record).run()
+        except Exception as e:
+            print(f"Error migrating data: {e}")
+            error = str(e)
+        with MigrationService._lock:
+            MigrationService._status.update({
+                'running': False, 'results': results, 'error': error,
+                'finished_at': datetime.utcnow()
+            })
+
+    @staticmethod
+    def get_status():
+        """Snapshot of the current or last migration"""
+        with MigrationService._lock:
+            status = dict(MigrationService._status)
+            status['messages'] = list(status['messages'])
+            return status
@@ -2,9 +2,145 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import mongodb
-from datetime import datetime
+from config import Config
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+import asyncio
+import time
+import hashlib
+import hmac
 import uuid
 
+
+class PaymentGateway:
+    """
+    Adapter interface for payment providers.
+    
+    charge() returns a concurrent.futures.Future resolving to the provider's
+    reply ({'status': 'accepted' | 'succeeded' | 'declined', 'gateway_ref': ...}).
+    Asynchronous gateways confirm later through the signed payment webhook.
+    """
+    
+    asynchronous = False
+    
+    def charge(self, payment, callback_url):
+        raise NotImplementedError
+    
+    def verify_webhook(self, body, signature):
+        return False
+    
+    def close(self):
+        pass
+
+
+class SimulatedGateway(PaymentGateway):
+    """Demo mode: every charge succeeds immediately"""
+    
+    def charge(self, payment, callback_url):
+        future = Future()
+        future.set_result({'status': 'succeeded', 'gateway_ref': f'SIM{uuid.uuid4().hex[:12].upper()}'})
+        return future
+
+
+class HTTPGateway(PaymentGateway):
+    """
+    HTTP provider client running on its own asyncio loop in a background thread.
+    
+    Requests share one aiohttp session (pooled keep-alive connections, bounded by
+    pool_size) with a total timeout, so a slow provider never holds a Flask
+    worker: charge() returns as soon as the request is queued.
+    """
+    
+    asynchronous = True
+    
+    def __init__(self, base_url, key, secret, timeout=10, pool_size=20):
+        self.base_url = base_url.rstrip('/')
+        self.key = key
+        self.secret = secret
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._loop = None
+        self._session = None
+        self._lock = threading.Lock()
+    
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='payment-gateway', daemon=True).start()
+        return self._loop
+    
+    async def _get_session(self):
+        if self._session is None:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'Authorization': f'Bearer {self.key}'}
+            )
+        return self._session
+    
+    async def _post_charge(self, payment, callback_url):
+        session = await self._get_session()
+        body = {
+            'payment_id': payment['id'],
+            'amount': payment['amount'],
+            'currency': 'INR',
+            'method': payment['payment_method'],
+            'callback_url': callback_url
+        }
+        import aiohttp
+        # The provider dedupes on the key, so retrying a timed-out charge is safe
+        try:
+            async with session.post(f'{self.base_url}/charges', json=body,
+                                    headers={'Idempotency-Key': payment['id']}) as response:
+                reply = await response.json()
+                if response.status >= 400:
+                    return {'status': 'declined', 'error': reply.get('error', f'HTTP {response.status}')}
+                return reply
+        except aiohttp.ClientConnectorError as e:
+            # Never connected, so the provider cannot have seen the charge
+            return {'status': 'declined', 'error': f'Gateway unreachable: {e}'}
+    
+    def charge(self, payment, callback_url):
+        return asyncio.run_coroutine_threadsafe(self._post_charge(payment, callback_url), self._ensure_loop())
+    
+    def sign(self, body):
+        return hmac.new(self.secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    
+    def verify_webhook(self, body, signature):
+        return bool(signature) and hmac.compare_digest(self.sign(body), signature)
+    
+    def close(self):
+        if self._loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_gateway = None
+
+
+def get_gateway():
+    """The configured gateway adapter (simulated unless PAYMENT_GATEWAY_URL is set)"""
+    global _gateway
+    if _gateway is None:
+        if Config.PAYMENT_GATEWAY_URL:
+            _gateway = HTTPGateway(Config.PAYMENT_GATEWAY_URL, Config.PAYMENT_GATEWAY_KEY,
+                                   Config.PAYMENT_GATEWAY_SECRET, Config.PAYMENT_GATEWAY_TIMEOUT,
+                                   Config.PAYMENT_GATEWAY_POOL_SIZE)
+        else:
+            _gateway = SimulatedGateway()
+    return _gateway
+
+
+class _AlreadyFinalized(Exception):
+    """Aborts a finalize transaction when another webhook delivery got there first"""
+
+
 class PaymentService:
     PAYMENT_METHODS = {
         'UPI': 'UPI Payment',
@@ -12,6 +148,12 @@ class PaymentService:
         'WALLET': 'Digital Wallet'
     }
     
+    CANCELLED_BOOKING_REASON = 'Booking was cancelled before the payment completed'
+    CANCELLED_BOOKING_MESSAGE = 'This booking was cancelled before the payment went through. The payment has been refunded.'
+    
+    # Gateway replies resolve on its asyncio loop thread; their database writes run here instead
+    _reply_executor = ThreadPoolExecutor(max_workers=Config.PAYMENT_REPLY_WORKERS, thread_name_prefix='payment-reply')
+    
     @staticmethod
     def initiate_payment(booking_id, amount, payment_method, user_id):
         """Initiate a payment (simplified implementation)"""
@@ -28,12 +170,18 @@ class PaymentService:
             'amount': amount,
             'payment_method': payment_method,
             'status': 'pending',
+            'live': True,
             'transaction_id': f'TXN{uuid.uuid4().hex[:12].upper()}',
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
         
-        mongodb.payments.insert_one(payment)
+        try:
+            mongodb.payments.insert_one(payment)
+        except DuplicateKeyError:
+            # Booking already has a live payment (unique index on live payments per booking)
+            existing = mongodb.payments.find_one({'booking_id': booking_id, 'live': True})
+            return {'success': True, 'message': 'Payment already in progress', 'payment': existing}
         
         # In a real implementation, you would redirect to payment gateway here
         # For simplicity, we'll return payment details
@@ -88,10 +236,319 @@ class PaymentService:
             'payment': payment
         }
     
+    @staticmethod
+    def pay_booking(booking_id, amount, payment_method, user_id, idempotency_key):
+        """
+        Record a completed payment and confirm its booking in one step.
+        
+        Retries with the same idempotency key return the original payment with
+        replayed=True. The unique index on live payments per booking stops a
+        second payment even when the keys differ. Both writes go in one
+        transaction when the server supports it; on a standalone server the
+        booking update rides on the payment as an outbox entry, which
+        apply_pending_outbox() finishes if the process dies in between.
+        """
+        if payment_method not in PaymentService.PAYMENT_METHODS:
+            return {'success': False, 'message': 'Invalid payment method'}
+        
+        existing = PaymentService._find_existing(booking_id, idempotency_key, user_id)
+        if existing:
+            return PaymentService._replay(existing)
+        
+        now = datetime.utcnow()
+        payment_id = str(uuid.uuid4())
+        booking_update = {
+            'status': 'confirmed',
+            'payment_status': 'paid',
+            'payment_method': payment_method,
+            'payment_id': payment_id
+        }
+        payment = {
+            'id': payment_id,
+            'booking_id': booking_id,
+            'user_id': user_id,
+            'amount': amount,
+            'payment_method': payment_method,
+            'status': 'completed',
+            'live': True,
+            'idempotency_key': idempotency_key,
+            'transaction_id': f'TXN{uuid.uuid4().hex[:12].upper()}',
+            'created_at': now,
+            'updated_at': now
+        }
+        
+        def insert_payment(db_session, outbox=None):
+            mongodb.payments.insert_one(dict(payment, **outbox) if outbox else payment, session=db_session)
+        
+        try:
+            previous = PaymentService._write_with_booking(payment, insert_payment, booking_update)
+        except (DuplicateKeyError, OperationFailure) as e:
+            if not isinstance(e, DuplicateKeyError) and not e.has_error_label('TransientTransactionError'):
+                raise
+            # Lost a race with a concurrent retry; hand back the winner
+            existing = PaymentService._find_existing(booking_id, idempotency_key, user_id)
+            if existing:
+                return PaymentService._replay(existing)
+            return {'success': False, 'message': 'Payment could not be recorded'}
+        
+        if previous is None:
+            return {'success': False, 'message': PaymentService.CANCELLED_BOOKING_MESSAGE}
+        return {'success': True, 'message': 'Payment completed successfully', 'payment': payment, 'replayed': False,
+                'previous_status': previous.get('status')}
+    
+    @staticmethod
+    def _write_with_booking(payment, write_payment, booking_update):
+        """
+        Run write_payment(session, outbox) and the booking update atomically:
+        in a transaction when available, otherwise via the payment's outbox.
+        Returns the booking as it was before the update, or None when it had
+        been cancelled meanwhile, in which case the payment is refunded.
+        """
+        try:
+            with mongodb.client.start_session() as db_session:
+                with db_session.start_transaction():
+                    write_payment(db_session)
+                    previous = mongodb.bookings.find_one_and_update(
+                        {'id': payment['booking_id'], 'status': {'$ne': 'cancelled'}},
+                        {'$set': booking_update}, session=db_session
+                    )
+        except (OperationFailure, NotImplementedError) as e:
+            # Code 20: transactions need a replica set (mongomock has no sessions at all); fall back to the outbox
+            if isinstance(e, OperationFailure) and e.code != 20:
+                raise
+            outbox = {'outbox': {'booking_update': booking_update}}
+            write_payment(None, outbox)
+            return PaymentService._apply_outbox(dict(payment, **outbox))
+        
+        if previous is None:
+            PaymentService._refund_unapplied(payment['id'], PaymentService.CANCELLED_BOOKING_REASON)
+        return previous
+    
+    @staticmethod
+    def start_gateway_payment(booking_id, amount, payment_method, user_id, idempotency_key, callback_url):
+        """
+        Create a pending payment and hand the charge to an asynchronous gateway.
+        The booking is confirmed later by finalize_payment() from the webhook.
+        """
+        if payment_method not in PaymentService.PAYMENT_METHODS:
+            return {'success': False, 'message': 'Invalid payment method'}
+        
+        existing = PaymentService._find_existing(booking_id, idempotency_key, user_id)
+        if existing:
+            return PaymentService._replay(existing)
+        
+        now = datetime.utcnow()
+        payment = {
+            'id': str(uuid.uuid4()),
+            'booking_id': booking_id,
+            'user_id': user_id,
+            'amount': amount,
+            'payment_method': payment_method,
+            'status': 'pending',
+            'live': True,
+            'idempotency_key': idempotency_key,
+            'transaction_id': f'TXN{uuid.uuid4().hex[:12].upper()}',
+            'created_at': now,
+            'updated_at': now
+        }
+        try:
+            mongodb.payments.insert_one(payment)
+        except DuplicateKeyError:
+            existing = PaymentService._find_existing(booking_id, idempotency_key, user_id)
+            if existing:
+                return PaymentService._replay(existing)
+            return {'success': False, 'message': 'Payment could not be recorded'}
+        
+        PaymentService._submit_charge(payment, callback_url)
+        return {'success': True, 'pending': True, 'message': 'Payment submitted', 'payment': payment, 'replayed': False}
+    
+    @staticmethod
+    def _submit_charge(payment, callback_url, attempt=1):
+        # A retry is pointless once the webhook or the sweeper has settled the payment
+        if attempt > 1 and not mongodb.payments.find_one({'id': payment['id'], 'status': 'pending'}, {'_id': 1}):
+            return
+        future = get_gateway().charge(payment, callback_url)
+        future.add_done_callback(lambda done: PaymentService._reply_executor.submit(
+            PaymentService._record_charge_reply, payment, callback_url, attempt, done))
+    
+    @staticmethod
+    def _record_charge_reply(payment, callback_url, attempt, future):
+        """Gateway acknowledgement: note its reference, or fail the payment if it was declined"""
+        payment_id = payment['id']
+        try:
+            reply = future.result()
+        except Exception as e:
+            # Timeouts are ambiguous: the charge may have reached the provider. It dedupes on the
+            # payment id, so resubmit with backoff; sweep() expires the payment if none get through.
+            print(f"Error submitting payment {payment_id} to gateway (attempt {attempt}): {e}")
+            mongodb.payments.update_one({'id': payment_id, 'status': 'pending'},
+                                        {'$set': {'gateway_error': str(e), 'updated_at': datetime.utcnow()},
+                                         '$inc': {'submit_attempts': 1}})
+            if attempt < Config.PAYMENT_GATEWAY_RETRIES:
+                retry = threading.Timer(2 ** attempt, PaymentService._submit_charge, (payment, callback_url, attempt + 1))
+                retry.daemon = True
+                retry.start()
+            return
+        
+        if reply.get('status') == 'declined':
+            mongodb.payments.update_one(
+                {'id': payment_id, 'status': {'$in': ['pending', 'processing']}},
+                {'$set': {'status': 'failed', 'gateway_response': reply, 'updated_at': datetime.utcnow()},
+                 '$unset': {'live': ''}}
+            )
+        else:
+            mongodb.payments.update_one(
+                {'id': payment_id, 'status': 'pending'},
+                {'$set': {'status': 'processing', 'gateway_ref': reply.get('gateway_ref'), 'updated_at': datetime.utcnow()}}
+            )
+    
+    @staticmethod
+    def finalize_payment(payment_id, succeeded, gateway_response=None):
+        """
+        Webhook outcome for a gateway payment. Repeated deliveries are no-ops.
+        Returns {'success', 'finalized', 'payment'}; finalized is True only for the
+        delivery that actually completed or failed the payment.
+        """
+        payment = mongodb.payments.find_one({'id': payment_id})
+        if not payment:
+            return {'success': False, 'message': 'Payment not found'}
+        if payment.get('status') == 'expired' and succeeded:
+            return PaymentService._complete_expired(payment, gateway_response)
+        if payment.get('status') not in ('pending', 'processing'):
+            return {'success': True, 'finalized': False, 'payment': payment}
+        
+        open_filter = {'id': payment_id, 'status': {'$in': ['pending', 'processing']}}
+        now = datetime.utcnow()
+        
+        if not succeeded:
+            result = mongodb.payments.update_one(open_filter, {
+                '$set': {'status': 'failed', 'gateway_response': gateway_response, 'updated_at': now},
+                '$unset': {'live': ''}
+            })
+            return {'success': True, 'finalized': result.modified_count == 1, 'payment': payment}
+        
+        fields = {'status': 'completed', 'gateway_response': gateway_response, 'updated_at': now}
+        booking_update = {
+            'status': 'confirmed',
+            'payment_status': 'paid',
+            'payment_method': payment['payment_method'],
+            'payment_id': payment_id
+        }
+        
+        def complete_payment(db_session, outbox=None):
+            result = mongodb.payments.update_one(open_filter, {'$set': dict(fields, **(outbox or {}))},
+                                                 session=db_session)
+            if result.modified_count == 0:
+                raise _AlreadyFinalized()
+        
+        try:
+            previous = PaymentService._write_with_booking(payment, complete_payment, booking_update)
+        except _AlreadyFinalized:
+            return {'success': True, 'finalized': False, 'payment': payment}
+        
+        payment.update(fields)
+        if previous is None:
+            payment['status'] = 'refunded'
+            return {'success': True, 'finalized': True, 'payment': payment, 'previous_status': 'cancelled'}
+        return {'success': True, 'finalized': True, 'payment': payment, 'previous_status': previous.get('status')}
+    
+    @staticmethod
+    def _complete_expired(payment, gateway_response):
+        """A charge went through after sweep() gave up on it; the booking may be rebooked by now, so refund"""
+        result = mongodb.payments.update_one(
+            {'id': payment['id'], 'status': 'expired'},
+            {'$set': {'status': 'completed', 'gateway_response': gateway_response, 'updated_at': datetime.utcnow()}}
+        )
+        if result.modified_count == 0:
+            return {'success': True, 'finalized': False, 'payment': payment}
+        PaymentService._refund_unapplied(payment['id'], 'Payment completed after it had expired')
+        payment['status'] = 'refunded'
+        return {'success': True, 'finalized': True, 'payment': payment, 'previous_status': None}
+    
+    @staticmethod
+    def expire_stale_payments():
+        """
+        Give up on gateway payments never acknowledged within PAYMENT_PENDING_TIMEOUT, or acknowledged
+        but never confirmed by webhook within PAYMENT_PROCESSING_TIMEOUT; frees the booking for a new
+        attempt. A success that still arrives later is refunded by _complete_expired.
+        """
+        now = datetime.utcnow()
+        result = mongodb.payments.update_many(
+            {'$or': [
+                {'status': 'pending', 'updated_at': {'$lt': now - timedelta(seconds=Config.PAYMENT_PENDING_TIMEOUT)}},
+                {'status': 'processing', 'updated_at': {'$lt': now - timedelta(seconds=Config.PAYMENT_PROCESSING_TIMEOUT)}}
+            ]},
+            {'$set': {'status': 'expired', 'updated_at': now}, '$unset': {'live': ''}}
+        )
+        return result.modified_count
+    
+    @staticmethod
+    def _find_existing(booking_id, idempotency_key, user_id):
+        if idempotency_key:
+            # Scoped to the caller's booking, so a reused or guessed key never hands back someone else's payment
+            payment = mongodb.payments.find_one({'idempotency_key': idempotency_key,
+                                                 'booking_id': booking_id, 'user_id': user_id})
+            if payment:
+                return payment
+        return mongodb.payments.find_one({'booking_id': booking_id, 'live': True})
+    
+    @staticmethod
+    def _replay(payment):
+        if payment.get('status') in ('pending', 'processing'):
+            return {'success': True, 'pending': True, 'message': 'Payment is being processed', 'payment': payment, 'replayed': True}
+        if payment.get('status') == 'refunded':
+            return {'success': False, 'message': PaymentService.CANCELLED_BOOKING_MESSAGE}
+        if payment.get('status') != 'completed':
+            return {'success': False, 'message': 'This payment attempt failed. Please reload the page and try again.'}
+        if payment.get('outbox') and PaymentService._apply_outbox(payment) is None:
+            return {'success': False, 'message': PaymentService.CANCELLED_BOOKING_MESSAGE}
+        return {'success': True, 'message': 'Payment already completed', 'payment': payment, 'replayed': True}
+    
+    @staticmethod
+    def _apply_outbox(payment):
+        """
+        Apply a payment's pending booking update, then clear it (safe to repeat).
+        Returns the booking before the update, or None if it was cancelled and the payment refunded.
+        """
+        previous = mongodb.bookings.find_one_and_update(
+            {'id': payment['booking_id'], 'status': {'$ne': 'cancelled'}},
+            {'$set': payment['outbox']['booking_update']}
+        )
+        if previous is None:
+            PaymentService._refund_unapplied(payment['id'], PaymentService.CANCELLED_BOOKING_REASON)
+        mongodb.payments.update_one({'id': payment['id']}, {'$unset': {'outbox': ''}})
+        return previous
+    
+    @staticmethod
+    def _refund_unapplied(payment_id, reason):
+        """Money arrived that no booking can use (e.g. it was cancelled first): hand it back"""
+        result = PaymentService.refund_payment(payment_id, reason)
+        if not result['success']:
+            # Leave it for an admin
+            mongodb.payments.update_one({'id': payment_id}, {'$set': {'needs_refund': True}})
+    
+    @staticmethod
+    def apply_pending_outbox():
+        """Finish booking updates left behind by a crash; returns how many were applied"""
+        applied = 0
+        for payment in mongodb.payments.find({'outbox': {'$exists': True}}):
+            try:
+                PaymentService._apply_outbox(payment)
+                applied += 1
+            except Exception as e:
+                print(f"Error applying payment outbox for {payment.get('id')}: {e}")
+        return applied
+    
+    @staticmethod
+    def sweep():
+        """Periodic upkeep run by PaymentSweeper"""
+        PaymentService.apply_pending_outbox()
+        PaymentService.expire_stale_payments()
+    
     @staticmethod
     def get_payment_by_booking(booking_id):
-        """Get payment details for a booking"""
-        payment = mongodb.payments.find_one({'booking_id': booking_id})
+        """Get the latest payment attempt for a booking"""
+        payment = mongodb.payments.find_one({'booking_id': booking_id}, sort=[('created_at', -1)])
         
         if payment:
             return {'success': True, 'payment': payment}
@@ -160,11 +617,15 @@ class PaymentService:
         # Update payment status
         mongodb.payments.update_one(
             {'id': payment_id},
-            {'$set': {
-                'status': 'refunded',
-                'refund_details': refund,
-                'updated_at': datetime.utcnow()
-            }}
+            {
+                '$set': {
+                    'status': 'refunded',
+                    'refund_details': refund,
+                    'updated_at': datetime.utcnow()
+                },
+                # A refunded payment no longer blocks a new one for the booking
+                '$unset': {'live': ''}
+            }
         )
         
         return {
@@ -172,3 +633,29 @@ class PaymentService:
             'message': 'Refund processed successfully',
             'refund': refund
         }
+
+
+class PaymentSweeper:
+    """
+    Runs PaymentService.sweep() at most once per interval from whichever
+    request thread gets there first, so every worker keeps finishing booking
+    updates left in payment outboxes and expiring unacknowledged charges
+    without a separate scheduler.
+    """
+    
+    def __init__(self, interval=60):
+        self.interval = interval
+        self.swept_at = 0
+        self._lock = threading.Lock()
+    
+    def check(self):
+        now = time.time()
+        if now - self.swept_at < self.interval or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.swept_at = now
+            PaymentService.sweep()
+        except Exception as e:
+            print(f"Error sweeping payments: {e}")
+        finally:
+            self._lock.release()
@@ -0,0 +1,316 @@
+from datetime import datetime, date, timedelta
+from bisect import bisect_right
+import threading
+import time
+
+# Bookings in these states hold a car on their dates
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+
+def parse_tiers(text):
+    """'0.5:1.1,0.9:1.5' -> [(0.5, 1.1), (0.9, 1.5)], sorted by threshold"""
+    tiers = []
+    for item in text.split(','):
+        if ':' in item:
+            threshold, value = item.split(':', 1)
+            tiers.append((float(threshold), float(value)))
+    return sorted(tiers)
+
+
+class PricingEngine:
+    """
+    Demand-aware daily prices for every car.
+
+    A car's price on a day is its base rate times a weekday/weekend multiplier
+    times an occupancy surge for its vehicle type (share of that type's fleet
+    already booked that day). Each car keeps a prefix-sum vector of these daily
+    prices over the next horizon_days, so quoting any rental is one subtraction.
+    Booking and car changes update only the affected type, days and cars; the
+    whole table is rebuilt lazily on first use, after reload() and at midnight.
+
+    With share_state() every booking or car change also bumps a shared counter;
+    each worker re-reads it at most once per interval and rebuilds when another
+    worker changed something, so quotes agree across workers within that interval.
+    """
+
+    SHARED_ID = 'pricing_state'
+
+    def __init__(self, repos, horizon_days=180, weekday_multiplier=1.0, weekend_multiplier=1.15,
+                 surge_tiers=(), long_rental_discounts=(), max_rental_days=None):
+        self.repos = repos
+        self.horizon_days = horizon_days
+        self.max_rental_days = max_rental_days or horizon_days
+        self.weekday_multiplier = weekday_multiplier
+        self.weekend_multiplier = weekend_multiplier
+        self.surge_thresholds = [threshold for threshold, _ in surge_tiers]
+        self.surge_multipliers = [1.0] + [multiplier for _, multiplier in surge_tiers]
+        # Longest qualifying rental wins: [(min_days, percent_off)]
+        self.long_rental_discounts = sorted(long_rental_discounts)
+        self.today = None
+        self.cars = {}           # car key -> (base price, vehicle type)
+        self.car_keys = {}       # str(id) and str(_id) -> car key
+        self.fleet = {}          # vehicle type -> number of cars
+        self.booked = {}         # vehicle type -> cars booked per day
+        self.prefix = {}         # car key -> prefix sums of daily prices
+        # Bumped whenever any price may have moved, so callers can key caches on it
+        self.version = 0
+        self.rebuilds = 0
+        self.incremental_updates = 0
+        self.counters = None
+        self.shared_changes = None   # Last shared change count this worker has caught up with
+        self.sync_interval = 0
+        self.synced_at = 0
+        self.change_listeners = []   # Called when another worker's change is noticed
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+
+    def share_state(self, counters, interval=2):
+        """Follow booking and car changes made by other workers through a shared counters collection"""
+        self.counters = counters
+        self.sync_interval = interval
+        self.synced_at = 0
+
+    def on_shared_change(self, callback):
+        """Call callback() whenever a booking or car change made by another worker is noticed"""
+        self.change_listeners.append(callback)
+
+    def sync(self):
+        """Catch up with other workers' changes (throttled to the sync interval)"""
+        if self.counters is not None:
+            self._sync()
+
+    def _sync(self):
+        now = time.time()
+        if now - self.synced_at < self.sync_interval or not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self.synced_at = now
+            shared = self.counters.find_one({'_id': self.SHARED_ID}) or {}
+            self._caught_up(shared.get('changes', 0), own=False)
+        except Exception as e:
+            print(f"Error reading pricing state: {e}")
+        finally:
+            self._sync_lock.release()
+
+    def _publish(self):
+        """Count a local change in the shared state"""
+        if self.counters is None:
+            return
+        try:
+            from pymongo import ReturnDocument
+            shared = self.counters.find_one_and_update(
+                {'_id': self.SHARED_ID}, {'$inc': {'changes': 1}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+            self._caught_up(shared['changes'], own=True)
+        except Exception as e:
+            print(f"Error sharing pricing state: {e}")
+
+    def _caught_up(self, changes, own):
+        with self._lock:
+            expected = self.shared_changes + 1 if own and self.shared_changes is not None else self.shared_changes
+            if self.shared_changes is not None and changes != expected:
+                # Another worker booked or edited cars since we last looked
+                self.reload()
+                for callback in self.change_listeners:
+                    callback()
+            self.shared_changes = changes
+
+    def reload(self):
+        """Drop everything; the next quote rebuilds from the repositories"""
+        with self._lock:
+            self.today = None
+            self.version += 1
+
+    def current_version(self):
+        """Price version after any pending rebuild"""
+        self._ensure_loaded()
+        return self.version
+
+    def _ensure_loaded(self):
+        self.sync()
+        if self.today == date.today():
+            return
+        with self._lock:
+            if self.today != date.today():
+                self._load()
+
+    def _load(self):
+        self.today = date.today()
+        self.cars, self.car_keys, self.fleet, self.booked, self.prefix = {}, {}, {}, {}, {}
+        for car in self.repos.cars.list_all():
+            self._index_car(car)
+        for booking in self.repos.bookings.list_all():
+            if booking.get('status') in ACTIVE_STATUSES:
+                self._count_booking(booking, 1)
+        for key in self.cars:
+            self._build_vector(key)
+        self.version += 1
+        self.rebuilds += 1
+
+    def _index_car(self, car):
+        key = str(car.get('id') or car.get('_id'))
+        vehicle_type = car.get('vehicle_type', 'car')
+        self.cars[key] = (car.get('price_per_day', 0), vehicle_type)
+        self.car_keys[key] = key
+        self.car_keys[str(car.get('_id', key))] = key
+        self.fleet[vehicle_type] = self.fleet.get(vehicle_type, 0) + 1
+        self.booked.setdefault(vehicle_type, [0] * self.horizon_days)
+        return key
+
+    def _day_range(self, start_date, end_date):
+        """Horizon indexes covered by an inclusive date range, clipped to the horizon"""
+        start = (datetime.strptime(start_date, '%Y-%m-%d').date() - self.today).days
+        end = (datetime.strptime(end_date, '%Y-%m-%d').date() - self.today).days
+        return max(start, 0), min(end + 1, self.horizon_days)
+
+    def _count_booking(self, booking, delta):
+        key = self.car_keys.get(str(booking.get('car_id')))
+        if key is None or not booking.get('start_date') or not booking.get('end_date'):
+            return None
+        vehicle_type = self.cars[key][1]
+        first, last = self._day_range(booking['start_date'], booking['end_date'])
+        counts = self.booked[vehicle_type]
+        for day in range(first, last):
+            counts[day] = max(0, counts[day] + delta)
+        return vehicle_type, first, last
+
+    def _day_multiplier(self, day):
+        weekend = (self.today + timedelta(days=day)).weekday() >= 5
+        return self.weekend_multiplier if weekend else self.weekday_multiplier
+
+    def _surge(self, vehicle_type, day):
+        fleet = self.fleet.get(vehicle_type, 0)
+        if not fleet:
+            return 1.0
+        occupancy = self.booked[vehicle_type][day] / fleet
+        return self.surge_multipliers[bisect_right(self.surge_thresholds, occupancy)]
+
+    def _build_vector(self, key, from_day=0):
+        base, vehicle_type = self.cars[key]
+        prefix = self.prefix.get(key)
+        if prefix is None or from_day == 0:
+            prefix = [0.0] * (self.horizon_days + 1)
+            from_day = 0
+        for day in range(from_day, self.horizon_days):
+            prefix[day + 1] = prefix[day] + base * self._day_multiplier(day) * self._surge(vehicle_type, day)
+        self.prefix[key] = prefix
+
+    def booking_changed(self, booking, delta):
+        """A booking started (+1) or stopped (-1) holding its car"""
+        self._publish()
+        if self.today != date.today():
+            return  # Not loaded yet or stale; the next quote rebuilds anyway
+        with self._lock:
+            counted = self._count_booking(booking, delta)
+            if counted is None:
+                return
+            vehicle_type, first, last = counted
+            if first >= last:
+                return
+            # Surge only moved on these days, but prefix sums shift from the first one on
+            for key, (_, car_type) in self.cars.items():
+                if car_type == vehicle_type:
+                    self._build_vector(key, first)
+            self.version += 1
+            self.incremental_updates += 1
+
+    def car_changed(self, car_id):
+        """A car was added, edited or deleted"""
+        self._publish()
+        if self.today != date.today():
+            return
+        with self._lock:
+            car = self.repos.cars.get(car_id)
+            key = self.car_keys.get(str(car_id))
+            if car and key and self.cars[key][1] == car.get('vehicle_type', 'car'):
+                # Same fleet, new base rate: only this car's vector changes
+                self.cars[key] = (car.get('price_per_day', 0), self.cars[key][1])
+                self._build_vector(key)
+                self.version += 1
+                self.incremental_updates += 1
+            else:
+                # Fleet sizes moved, which changes every day's surge for the type
+                self._load()
+
+    @staticmethod
+    def _weekend_days(first_date, count):
+        """Saturdays and Sundays among count days from first_date"""
+        weeks, rest = divmod(count, 7)
+        return weeks * 2 + sum(1 for offset in range(rest) if (first_date.weekday() + offset) % 7 >= 5)
+
+    def quote(self, car, start_date, end_date):
+        """Price an inclusive date range for a car (a car dict or id)"""
+        self._ensure_loaded()
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end = datetime.strptime(end_date, '%Y-%m-%d').date()
+        days = (end - start).days + 1
+        if days < 1:
+            raise ValueError('End date must be after start date')
+        if start < self.today:
+            raise ValueError('Start date is in the past')
+        if days > self.max_rental_days:
+            raise ValueError(f'Rentals are limited to {self.max_rental_days} days')
+
+        with self._lock:
+            car_id = car if not isinstance(car, dict) else (car.get('id') or car.get('_id'))
+            key = self.car_keys.get(str(car_id))
+            if key is None and isinstance(car, dict):
+                base, vehicle_type = car.get('price_per_day', 0), car.get('vehicle_type', 'car')
+            elif key is None:
+                raise ValueError('Car not found')
+            else:
+                base, vehicle_type = self.cars[key]
+
+            first, last = (start - self.today).days, (end - self.today).days + 1
+            subtotal = 0.0
+            inside = range(first, min(last, self.horizon_days))
+            if key is not None and inside:
+                subtotal = self.prefix[key][inside.stop] - self.prefix[key][inside.start]
+            else:
+                # Car not in the table yet: same formula, day by day (at most max_rental_days)
+                for day in inside:
+                    subtotal += base * self._day_multiplier(day) * self._surge(vehicle_type, day)
+            # Past the horizon: calendar multiplier only, no demand data
+            beyond = max(first, self.horizon_days)
+            if last > beyond:
+                weekend_days = self._weekend_days(self.today + timedelta(days=beyond), last - beyond)
+                subtotal += base * (weekend_days * self.weekend_multiplier +
+                                    (last - beyond - weekend_days) * self.weekday_multiplier)
+
+        discount_pct = 0
+        for min_days, percent in self.long_rental_discounts:
+            if days >= min_days:
+                discount_pct = percent
+        discount = subtotal * discount_pct / 100
+        return {
+            'days': days,
+            'base_rate': base,
+            'flat_total': round(base * days, 2),
+            'subtotal': round(subtotal, 2),
+            'discount_percent': discount_pct,
+            'discount': round(discount, 2),
+            'total': round(subtotal - discount, 2),
+            'average_daily': round((subtotal - discount) / days, 2)
+        }
+
+    def occupancy(self, vehicle_type, start_date, end_date):
+        """Share of a vehicle type's fleet booked on each day of a range (within the horizon)"""
+        self._ensure_loaded()
+        with self._lock:
+            fleet = self.fleet.get(vehicle_type, 0)
+            first, last = self._day_range(start_date, end_date)
+            counts = self.booked.get(vehicle_type, [0] * self.horizon_days)
+            return [round(counts[day] / fleet, 3) if fleet else 0 for day in range(first, last)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded_for': self.today.isoformat() if self.today else None,
+                'cars': len(self.cars),
+                'fleet': dict(self.fleet),
+                'horizon_days': self.horizon_days,
+                'version': self.version,
+                'rebuilds': self.rebuilds,
+                'incremental_updates': self.incremental_updates
+            }
@@ -1,6 +1,8 @@
 from database import mongodb
-from werkzeug.utils import secure_filename
+from services.image_service import ImageService
+from config import Config
 from bson import ObjectId
+import time
 import os
 
 class ProfileService:
@@ -48,39 +50,84 @@ class ProfileService:
         if 'phone' in data and data['phone']:
             update_data['phone'] = data['phone']
         
-        # Handle profile picture upload
+        # Handle profile picture upload (resized in the background, stored by content hash)
+        previous = None
         if profile_picture:
-            filename = secure_filename(f"{user_id}_{profile_picture.filename}")
-            upload_folder = 'static/profile_pictures'
-            if not os.path.exists(upload_folder):
-                os.makedirs(upload_folder)
-            
-            filepath = os.path.join(upload_folder, filename)
-            profile_picture.save(filepath)
-            update_data['profile_picture'] = f'/static/profile_pictures/{filename}'
+            try:
+                content_hash = ImageService.save_avatar(profile_picture)
+            except ValueError as e:
+                return {'success': False, 'message': str(e)}
+            update_data['profile_picture'] = ImageService.avatar_url(content_hash)
+            update_data['profile_picture_hash'] = content_hash
+            previous = mongodb.users.find_one(query, {'profile_picture': 1, 'profile_picture_hash': 1})
         
         if update_data:
             mongodb.users.update_one(query, {'$set': update_data})
+            if previous:
+                ProfileService._release_picture(previous)
             return {'success': True, 'message': 'Profile updated successfully'}
         
         return {'success': False, 'message': 'No data to update'}
     
+    @staticmethod
+    def _release_picture(user):
+        """Delete a replaced profile picture once no user references it"""
+        try:
+            old_hash = user.get('profile_picture_hash')
+            old_url = user.get('profile_picture', '')
+            if old_hash:
+                if not mongodb.users.find_one({'profile_picture_hash': old_hash}):
+                    ImageService.delete_avatar(old_hash)
+            elif old_url.startswith('/static/profile_pictures/'):
+                # Pre-pipeline upload stored under its original name
+                if not mongodb.users.find_one({'profile_picture': old_url}):
+                    path = os.path.join(Config.PROFILE_PICTURE_FOLDER, old_url.rsplit('/', 1)[-1])
+                    if os.path.exists(path):
+                        os.remove(path)
+        except Exception as e:
+            print(f"Error releasing profile picture: {e}")
+    
+    @staticmethod
+    def collect_orphaned_pictures(grace_seconds=3600):
+        """Remove profile picture files no user references (skips recent files still being written)"""
+        folder = Config.PROFILE_PICTURE_FOLDER
+        if not os.path.exists(folder):
+            return 0
+        
+        referenced_hashes = set(mongodb.users.distinct('profile_picture_hash'))
+        referenced_files = {url.rsplit('/', 1)[-1] for url in mongodb.users.distinct('profile_picture') if url}
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        
+        for entry in os.scandir(folder):
+            if not entry.is_file() or entry.stat().st_mtime > cutoff:
+                continue
+            if entry.name in referenced_files or entry.name.split('_', 1)[0] in referenced_hashes:
+                continue
+            os.remove(entry.path)
+            removed += 1
+        
+        return removed
+    
     @staticmethod
     def change_password(user_id, old_password, new_password):
         """Change user password"""
-        from auth_service import AuthService
+        from services.auth_service import AuthService, HashingBusyError
         
         query = ProfileService._get_user_query(user_id)
         user = mongodb.users.find_one(query)
         if not user:
             return {'success': False, 'message': 'User not found'}
         
-        # Verify old password
-        if not AuthService.verify_password(old_password, user['password']):
-            return {'success': False, 'message': 'Current password is incorrect'}
-        
-        # Update password
-        hashed_password = AuthService.hash_password(new_password)
+        try:
+            # Verify old password
+            if not AuthService.verify_password(old_password, user['password']):
+                return {'success': False, 'message': 'Current password is incorrect'}
+            
+            # Update password
+            hashed_password = AuthService.hash_password(new_password)
+        except HashingBusyError:
+            return {'success': False, 'message': 'Server is busy, please try again in a moment'}
         mongodb.users.update_one(
             query,
             {'$set': {'password': hashed_password}}
@@ -0,0 +1,58 @@
+from datetime import datetime
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.location_service import LocationService
+
+
+class QuoteService:
+    """
+    Full rental quotes (rental days, discounts, location charge, GST) memoized
+    in a short-TTL cache.
+
+    Keys include the pricing engine's version, which moves on every booking,
+    car or repricing change, so a stale quote is simply never looked up again.
+    """
+
+    def __init__(self, pricing_engine, cache, gst_rate=18):
+        self.pricing_engine = pricing_engine
+        self.cache = cache
+        self.gst_rate = gst_rate
+
+    def quote(self, car, start_date, end_date, pickup_location='', drop_location=''):
+        """Price a booking for a car dict; raises ValueError for unusable dates"""
+        car_key = str(car.get('id') or car.get('_id'))
+        key = (car_key, start_date, end_date, pickup_location or '', drop_location or '',
+               self.pricing_engine.current_version())
+        cached = self.cache.get(key)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end = datetime.strptime(end_date, '%Y-%m-%d').date()
+        if end < start:
+            raise ValueError('End date must be after start date')
+
+        rental = self.pricing_engine.quote(car, start_date, end_date)
+        location_charge = 0
+        if pickup_location and drop_location:
+            location_charge = LocationService.calculate_distance_charge(pickup_location, drop_location)
+        total = round(rental['total'] + location_charge, 2)
+        # Prices are GST-inclusive, as on the invoice
+        gst_included = round(total - total / (1 + self.gst_rate / 100), 2)
+
+        quote = dict(
+            rental,
+            car_id=car_key,
+            start_date=start_date,
+            end_date=end_date,
+            available=bool(car.get('available', False)),
+            location_charge=location_charge,
+            gst_rate=self.gst_rate,
+            gst_included=gst_included,
+            total=total,
+            currency='INR'
+        )
+        quote['rental_total'] = rental['total']
+        self.cache.set(key, quote)
+        return dict(quote, cached=False)
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from datetime import datetime
+from pymongo import ReturnDocument
+import threading
+import time
+import re
+
+
+class MemoryWindowStore:
+    """
+    Sliding-window counters held in process memory.
+
+    Each key keeps only its current and previous fixed-window counts; the
+    sliding estimate weights the previous window by how much of it still
+    overlaps. The least recently used keys are evicted past max_keys, so memory
+    stays bounded however many IPs or usernames are seen.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, window, now=None):
+        """Count one request and return the sliding-window total including it"""
+        now = time.time() if now is None else now
+        bucket = int(now // window)
+        with self._lock:
+            start, current, previous = self._windows.get(key, (bucket, 0, 0))
+            if bucket == start + 1:
+                previous, current = current, 0
+            elif bucket != start:
+                previous, current = 0, 0
+            current += 1
+            self._windows[key] = (bucket, current, previous)
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+        overlap = 1 - (now % window) / window
+        return current + previous * overlap
+
+    def reset(self, key):
+        with self._lock:
+            self._windows.pop(key, None)
+
+
+class MongoWindowStore:
+    """
+    Sliding-window counters in a Mongo collection, shared by every worker.
+
+    One document per key and fixed window holds an atomic $inc counter; a TTL
+    index removes documents once they can no longer affect the estimate.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    def hit(self, key, window, now=None):
+        now = time.time() if now is None else now
+        bucket = int(now // window)
+        expires_at = datetime.utcfromtimestamp((bucket + 2) * window)
+
+        doc = self.collection.find_one_and_update(
+            {'_id': f'{key}:{bucket}'},
+            {'$inc': {'count': 1}, '$setOnInsert': {'expires_at': expires_at}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        previous = self.collection.find_one({'_id': f'{key}:{bucket - 1}'}, {'count': 1})
+        overlap = 1 - (now % window) / window
+        return doc['count'] + (previous['count'] if previous else 0) * overlap
+
+    def reset(self, key):
+        self.collection.delete_many({'_id': {'$regex': f'^{re.escape(key)}:'}})
+
+
+class RateLimiter:
+    """Named limits ('login:ip' -> 30 per 15 minutes) checked against a window store"""
+
+    def __init__(self, store):
+        self.store = store
+        self.limits = {}
+        self.rejected = {}
+
+    def add_limit(self, name, limit, window):
+        self.limits[name] = (limit, window)
+
+    def allow(self, name, identifier):
+        """Count an attempt; False once the identifier is over its limit for the window"""
+        if not identifier or name not in self.limits:
+            return True
+        limit, window = self.limits[name]
+        try:
+            count = self.store.hit(f'{name}:{str(identifier).lower()}', window)
+        except Exception as e:
+            # A store outage should not lock everyone out
+            print(f"Error checking rate limit {name}: {e}")
+            return True
+        if count > limit:
+            self.rejected[name] = self.rejected.get(name, 0) + 1
+            return False
+        return True
+
+    def reset(self, name, identifier):
+        if identifier:
+            self.store.reset(f'{name}:{str(identifier).lower()}')
+
+
+def create_rate_limiter(backend, max_keys=10000):
+    """Build a limiter on the 'memory' or 'mongo' store"""
+    if backend == 'mongo':
+        from database import mongodb
+        return RateLimiter(MongoWindowStore(mongodb.db.rate_limits))
+    if backend == 'memory':
+        return RateLimiter(MemoryWindowStore(max_keys))
+    raise ValueError(f'Unknown rate limit backend: {backend}')
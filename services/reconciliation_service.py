@@ -0,0 +1,186 @@
+from datetime import datetime
+from itertools import groupby
+import uuid
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import mongodb
+
+
+def load_ledger(path):
+    """
+    Read a gateway ledger file: one JSON object per line with transaction_id,
+    amount and status ('captured' or 'refunded'). Returns {transaction_id: entry}.
+    """
+    ledger = {}
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                ledger[entry['transaction_id']] = entry
+    return ledger
+
+
+def write_fake_ledger(path, db=None):
+    """Export completed and refunded payments as a local stand-in for the gateway's ledger"""
+    db = db or mongodb
+    count = 0
+    with open(path, 'w') as f:
+        cursor = db.payments.find({'status': {'$in': ['completed', 'refunded']}},
+                                  {'transaction_id': 1, 'amount': 1, 'status': 1, 'id': 1})
+        for payment in cursor:
+            f.write(json.dumps({
+                'transaction_id': payment.get('transaction_id'),
+                'payment_id': payment.get('id'),
+                'amount': payment.get('amount', 0),
+                'status': 'refunded' if payment['status'] == 'refunded' else 'captured'
+            }) + '\n')
+            count += 1
+    return count
+
+
+class ReconciliationEngine:
+    """
+    Cross-checks payments, bookings and (optionally) the gateway ledger in one pass.
+
+    Payments sorted by booking_id and bookings sorted by id are streamed side by
+    side and merge-joined, so memory holds one booking's payments at a time
+    (plus the ledger, when one is given). Issues are written in batches.
+    """
+
+    PAYMENT_FIELDS = {'id': 1, 'booking_id': 1, 'amount': 1, 'status': 1, 'transaction_id': 1, 'outbox': 1}
+    BOOKING_FIELDS = {'id': 1, 'status': 1, 'payment_status': 1, 'total_price': 1}
+
+    def __init__(self, db=None, ledger=None, batch_size=1000, amount_tolerance=0.01):
+        self.db = db or mongodb
+        self.ledger = ledger
+        self.batch_size = batch_size
+        self.amount_tolerance = amount_tolerance
+        self.run_id = str(uuid.uuid4())
+        self.counts = {}
+        self._pending = []
+
+    def _flag(self, kind, booking_id=None, payment_id=None, detail=''):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        self._pending.append({
+            'run_id': self.run_id,
+            'kind': kind,
+            'booking_id': booking_id,
+            'payment_id': payment_id,
+            'detail': detail
+        })
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self.db.reconciliation_issues.insert_many(self._pending, ordered=False)
+            self._pending = []
+
+    def _payment_groups(self):
+        cursor = (self.db.payments.find({}, self.PAYMENT_FIELDS)
+                  .sort('booking_id', 1).batch_size(self.batch_size))
+        # Missing booking ids sort first in Mongo, as '' does here
+        return groupby(cursor, key=lambda payment: str(payment.get('booking_id') or ''))
+
+    def run(self):
+        """Reconcile everything; returns the summary stored in reconciliation_reports"""
+        started_at = datetime.utcnow()
+        bookings = (self.db.bookings.find({}, self.BOOKING_FIELDS)
+                    .sort('id', 1).batch_size(self.batch_size))
+        payment_groups = self._payment_groups()
+        unmatched_ledger = set(self.ledger) if self.ledger is not None else set()
+
+        group = next(payment_groups, None)
+        booking_count = 0
+        for booking in bookings:
+            booking_count += 1
+            booking_id = str(booking.get('id') or '')
+
+            # Payments sorting before this booking have no booking at all
+            while group is not None and group[0] < booking_id:
+                for payment in group[1]:
+                    self._flag('orphan_payment', group[0], payment.get('id'),
+                               'Payment references a booking that does not exist')
+                group = next(payment_groups, None)
+
+            payments = []
+            if group is not None and group[0] == booking_id:
+                payments = list(group[1])
+                group = next(payment_groups, None)
+
+            self._check_booking(booking, payments, unmatched_ledger)
+
+        while group is not None:
+            for payment in group[1]:
+                self._flag('orphan_payment', group[0], payment.get('id'),
+                           'Payment references a booking that does not exist')
+            group = next(payment_groups, None)
+
+        for transaction_id in unmatched_ledger:
+            entry = self.ledger[transaction_id]
+            self._flag('ledger_without_payment', payment_id=entry.get('payment_id'),
+                       detail=f"Gateway {entry.get('status')} {transaction_id} has no matching payment")
+
+        self._flush()
+        report = {
+            'run_id': self.run_id,
+            'started_at': started_at,
+            'finished_at': datetime.utcnow(),
+            'bookings_checked': booking_count,
+            'ledger_checked': self.ledger is not None,
+            'issues': dict(self.counts),
+            'total_issues': sum(self.counts.values())
+        }
+        self.db.reconciliation_reports.insert_one(dict(report))
+        return report
+
+    def _check_booking(self, booking, payments, unmatched_ledger):
+        booking_id = booking.get('id')
+        completed = [p for p in payments if p.get('status') == 'completed']
+        refunded = [p for p in payments if p.get('status') == 'refunded']
+
+        if completed and (booking.get('payment_status') != 'paid' or booking.get('status') == 'pending'):
+            self._flag('paid_but_pending', booking_id, completed[0].get('id'),
+                       f"Payment completed but booking is {booking.get('status')}/{booking.get('payment_status')}")
+        if booking.get('payment_status') == 'paid' and not completed and not refunded:
+            self._flag('paid_without_payment', booking_id, detail='Booking marked paid with no completed payment')
+        if len(completed) > 1:
+            self._flag('duplicate_payment', booking_id, completed[1].get('id'),
+                       f'{len(completed)} completed payments for one booking')
+        if booking.get('status') == 'cancelled' and completed:
+            self._flag('cancelled_not_refunded', booking_id, completed[0].get('id'),
+                       'Booking cancelled but its payment was never refunded')
+        for payment in refunded:
+            if booking.get('status') != 'cancelled':
+                self._flag('refund_on_active_booking', booking_id, payment.get('id'),
+                           f"Payment refunded but booking is {booking.get('status')}")
+
+        for payment in payments:
+            if payment.get('outbox'):
+                self._flag('outbox_pending', booking_id, payment.get('id'), 'Booking update from payment not applied')
+            if payment.get('status') == 'completed':
+                amount = payment.get('amount') or 0
+                if abs(amount - (booking.get('total_price') or 0)) > self.amount_tolerance:
+                    self._flag('amount_mismatch', booking_id, payment.get('id'),
+                               f"Paid {amount}, booking total {booking.get('total_price')}")
+            if self.ledger is not None and payment.get('status') in ('completed', 'refunded'):
+                self._check_ledger(booking_id, payment, unmatched_ledger)
+
+    def _check_ledger(self, booking_id, payment, unmatched_ledger):
+        transaction_id = payment.get('transaction_id')
+        entry = self.ledger.get(transaction_id)
+        if entry is None:
+            self._flag('missing_from_ledger', booking_id, payment.get('id'),
+                       f'Transaction {transaction_id} not found at the gateway')
+            return
+        unmatched_ledger.discard(transaction_id)
+        expected = 'refunded' if payment['status'] == 'refunded' else 'captured'
+        if entry.get('status') != expected:
+            self._flag('ledger_status_mismatch', booking_id, payment.get('id'),
+                       f"Payment {payment['status']}, gateway says {entry.get('status')}")
+        if abs((entry.get('amount') or 0) - (payment.get('amount') or 0)) > self.amount_tolerance:
+            self._flag('ledger_amount_mismatch', booking_id, payment.get('id'),
+                       f"Payment {payment.get('amount')}, gateway {entry.get('amount')}")
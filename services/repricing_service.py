@@ -0,0 +1,236 @@
+from datetime import datetime
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import OperationFailure
+import threading
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import mongodb
+from config import Config
+
+
+class RateTable:
+    """
+    Exchange rates kept in the exchange_rates collection ({'_id': 'USD:INR', 'rate': 83.0}).
+    Pairs that were never stored fall back to Config.DEFAULT_EXCHANGE_RATES.
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection if collection is not None else mongodb.exchange_rates
+
+    @staticmethod
+    def defaults():
+        rates = {}
+        for item in Config.DEFAULT_EXCHANGE_RATES.split(','):
+            if '=' in item:
+                pair, rate = item.split('=', 1)
+                rates[pair.strip().upper()] = float(rate)
+        return rates
+
+    def get(self, base, quote):
+        base, quote = base.upper(), quote.upper()
+        if base == quote:
+            return 1.0
+        doc = self.collection.find_one({'_id': f'{base}:{quote}'})
+        if doc:
+            return doc['rate']
+        inverse = self.collection.find_one({'_id': f'{quote}:{base}'})
+        if inverse:
+            return 1 / inverse['rate']
+        defaults = self.defaults()
+        if f'{base}:{quote}' in defaults:
+            return defaults[f'{base}:{quote}']
+        if f'{quote}:{base}' in defaults:
+            return 1 / defaults[f'{quote}:{base}']
+        raise ValueError(f'No exchange rate for {base} to {quote}')
+
+    def set(self, base, quote, rate):
+        if rate <= 0:
+            raise ValueError('Exchange rate must be positive')
+        self.collection.replace_one(
+            {'_id': f'{base.upper()}:{quote.upper()}'},
+            {'rate': float(rate), 'updated_at': datetime.utcnow()},
+            upsert=True
+        )
+
+    def all(self):
+        rates = self.defaults()
+        rates.update({doc['_id']: doc['rate'] for doc in self.collection.find()})
+        return rates
+
+
+def parse_rule(text):
+    """
+    Parse a CLI rule:
+      convert:USD:INR        multiply by the USD->INR rate
+      percent:10[:suv]       +10% (negative to cut), optionally for one vehicle type
+      set:4500:suv           fixed daily price for a vehicle type
+    """
+    parts = text.split(':')
+    kind = parts[0].lower()
+    try:
+        if kind == 'convert' and len(parts) == 3:
+            return {'kind': 'convert', 'from': parts[1].upper(), 'to': parts[2].upper()}
+        if kind == 'percent' and len(parts) in (2, 3):
+            return {'kind': 'percent', 'value': float(parts[1]), 'vehicle_type': parts[2] if len(parts) == 3 else None}
+        if kind == 'set' and len(parts) == 3:
+            return {'kind': 'set', 'price': float(parts[1]), 'vehicle_type': parts[2]}
+    except ValueError:
+        pass
+    raise ValueError(f'Invalid pricing rule: {text}')
+
+
+class RepricingEngine:
+    """
+    Applies pricing rules to every car in one bulk_write.
+
+    Each run is stored in price_history as a numbered version holding the old
+    and new price of every car it touched, so any version can be rolled back.
+    Updates only match cars whose price is still the one the plan was computed
+    from; cars edited in between are reported as conflicts instead of overwritten.
+    """
+
+    def __init__(self, db=None, rates=None):
+        self.db = db or mongodb
+        self.rates = rates or RateTable(self.db.exchange_rates)
+
+    def plan(self, rules, filters=None):
+        """Price changes the rules would make, without writing anything"""
+        resolved = []
+        for rule in rules:
+            if rule['kind'] == 'convert':
+                rule = dict(rule, rate=self.rates.get(rule['from'], rule['to']))
+            resolved.append(rule)
+
+        changes = []
+        for car in self.db.cars.find(filters or {}, {'id': 1, 'price_per_day': 1, 'vehicle_type': 1}):
+            old_price = car.get('price_per_day', 0)
+            new_price = old_price
+            for rule in resolved:
+                if rule.get('vehicle_type') and car.get('vehicle_type') != rule['vehicle_type']:
+                    continue
+                if rule['kind'] == 'convert':
+                    new_price = new_price * rule['rate']
+                elif rule['kind'] == 'percent':
+                    new_price = new_price * (1 + rule['value'] / 100)
+                elif rule['kind'] == 'set':
+                    new_price = rule['price']
+            new_price = round(new_price, 2)
+            if new_price != old_price:
+                changes.append({'_id': car['_id'], 'car_id': car.get('id'), 'old': old_price, 'new': new_price})
+        return {'rules': resolved, 'changes': changes}
+
+    def _next_version(self):
+        counter = self.db.counters.find_one_and_update(
+            {'_id': 'price_history'}, {'$inc': {'seq': 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return counter['seq']
+
+    def apply(self, plan, reason='', user='cli'):
+        """Write a plan as a new price version; returns the stored version summary"""
+        if not plan['changes']:
+            return {'version': None, 'updated': 0, 'conflicts': []}
+
+        version = {
+            'version': self._next_version(),
+            'created_at': datetime.utcnow(),
+            'reason': reason,
+            'user': user,
+            'rules': plan['rules'],
+            'changes': plan['changes'],
+            'status': 'applying'
+        }
+        operations = [
+            UpdateOne({'_id': change['_id'], 'price_per_day': change['old']},
+                      {'$set': {'price_per_day': change['new'], 'price_version': version['version']}})
+            for change in plan['changes']
+        ]
+
+        try:
+            with self.db.client.start_session() as db_session:
+                with db_session.start_transaction():
+                    self.db.price_history.insert_one(version, session=db_session)
+                    result = self.db.cars.bulk_write(operations, ordered=False, session=db_session)
+        except (OperationFailure, NotImplementedError) as e:
+            # Code 20: no replica set (mongomock has no sessions at all). The 'applying'
+            # version is written first, so a crash mid-way can still be rolled back from it.
+            if isinstance(e, OperationFailure) and e.code != 20:
+                raise
+            self.db.price_history.insert_one(version)
+            result = self.db.cars.bulk_write(operations, ordered=False)
+
+        conflicts = []
+        if result.modified_count < len(operations):
+            changed = {car['_id'] for car in self.db.cars.find(
+                {'_id': {'$in': [change['_id'] for change in plan['changes']]}, 'price_version': version['version']},
+                {'_id': 1})}
+            conflicts = [change for change in plan['changes'] if change['_id'] not in changed]
+
+        self.db.price_history.update_one(
+            {'version': version['version']},
+            {'$set': {'status': 'applied', 'conflicts': [change['_id'] for change in conflicts]}}
+        )
+        return {'version': version['version'], 'updated': result.modified_count, 'conflicts': conflicts}
+
+    def rollback(self, version_number, user='cli'):
+        """Restore the prices a version replaced, recorded as a new version"""
+        version = self.db.price_history.find_one({'version': version_number})
+        if not version:
+            raise ValueError(f'Price version {version_number} not found')
+        skipped = set(version.get('conflicts', []))
+        reverse = {
+            'rules': [{'kind': 'rollback', 'version': version_number}],
+            'changes': [{'_id': change['_id'], 'car_id': change['car_id'], 'old': change['new'], 'new': change['old']}
+                        for change in version['changes'] if change['_id'] not in skipped]
+        }
+        result = self.apply(reverse, reason=f'Rollback of version {version_number}', user=user)
+        if result['version'] is not None:
+            self.db.price_history.update_one({'version': version_number},
+                                             {'$set': {'rolled_back_by': result['version']}})
+        return result
+
+    def history(self, car_id=None, limit=20):
+        """Recent versions, newest first; with car_id, only that car's price changes"""
+        query = {'changes.car_id': car_id} if car_id is not None else {}
+        versions = list(self.db.price_history.find(query).sort('version', -1).limit(limit))
+        if car_id is not None:
+            for version in versions:
+                version['changes'] = [change for change in version['changes'] if change['car_id'] == car_id]
+        return versions
+
+    def latest_version(self):
+        latest = self.db.price_history.find_one({'status': 'applied'}, {'version': 1}, sort=[('version', -1)])
+        return latest['version'] if latest else 0
+
+
+class PriceVersionWatcher:
+    """
+    Lets a running app notice repricing done by another process. At most once
+    per interval it reads the latest applied price version and calls on_change
+    when it moved, so cached listings are dropped soon after a reprice.
+    """
+
+    def __init__(self, interval=10, on_change=None, engine=None):
+        self.interval = interval
+        self.on_change = on_change or (lambda: None)
+        self.engine = engine or RepricingEngine()
+        self.version = None
+        self.checked_at = 0
+        self._lock = threading.Lock()
+
+    def check(self):
+        now = time.time()
+        if now - self.checked_at < self.interval or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.checked_at = now
+            latest = self.engine.latest_version()
+            if self.version is not None and latest != self.version:
+                self.on_change()
+            self.version = latest
+        except Exception as e:
+            print(f"Error checking price version: {e}")
+        finally:
+            self._lock.release()
@@ -3,6 +3,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import mongodb
+from services.fragment_cache import fragment_cache
 from bson import ObjectId
 
 class ReviewService:
@@ -51,6 +52,7 @@ class ReviewService:
             
             # Update car's average rating
             ReviewService._update_car_rating(car_id)
+            fragment_cache.bump('reviews', 'cars')
             
             return True, "Review added successfully"
         
@@ -180,6 +182,7 @@ class ReviewService:
                     '$push': {'helpful_users': user_id}
                 }
             )
+            fragment_cache.bump('reviews')
             return True
         except Exception as e:
             print(f"Error marking review helpful: {e}")
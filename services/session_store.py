@@ -0,0 +1,260 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+import threading
+import secrets
+import time
+
+# Display fields copied into the session at login; bump the version when the list changes
+SNAPSHOT_FIELDS = ('username', 'email', 'phone', 'is_admin', 'email_verified', 'profile_picture', 'created_at')
+SNAPSHOT_VERSION = 1
+
+
+def user_snapshot(user):
+    """Cached copy of a user's display fields for the session"""
+    snapshot = {field: user.get(field) for field in SNAPSHOT_FIELDS}
+    snapshot['_id'] = str(user.get('_id', ''))
+    snapshot['version'] = SNAPSHOT_VERSION
+    return snapshot
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data kept on the server; the cookie only carries the random session id"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Move the data to a fresh id (call at login to prevent session fixation)"""
+        self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+class MemorySessionStore:
+    """LRU of sessions held in this process, each with its own expiry"""
+
+    def __init__(self, maxsize=10000, max_age=None):
+        self.maxsize = maxsize
+        # When fronting a shared store, how long a local copy is trusted before it is revalidated
+        self.max_age = max_age
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        return self.get_versioned(sid)[0]
+
+    def get_versioned(self, sid):
+        """(data, version) of a live session, or (None, None)"""
+        return self.get_checked(sid)[:2]
+
+    def get_checked(self, sid):
+        """(data, version, fresh) of a live session; fresh is False once max_age has passed since it was checked"""
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None, None, False
+            data, user_id, expires_at, version, checked_at = entry
+            now = time.time()
+            if expires_at < now:
+                del self._sessions[sid]
+                return None, None, False
+            self._sessions.move_to_end(sid)
+            return dict(data), version, self.max_age is None or now - checked_at < self.max_age
+
+    def mark_checked(self, sid):
+        """The shared copy still matches: trust this one for another max_age"""
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is not None:
+                self._sessions[sid] = entry[:4] + (time.time(),)
+
+    def set(self, sid, data, user_id, lifetime, version=None):
+        now = time.time()
+        with self._lock:
+            self._sessions[sid] = (dict(data), user_id, now + lifetime, version, now)
+            self._sessions.move_to_end(sid)
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def delete_for_user(self, user_id, keep=None):
+        with self._lock:
+            for sid in [sid for sid, entry in self._sessions.items() if entry[1] == user_id and sid != keep]:
+                del self._sessions[sid]
+
+    def update_user(self, user_id, key, value):
+        with self._lock:
+            for sid, (data, owner, *_) in self._sessions.items():
+                if owner == user_id:
+                    data[key] = value
+
+
+class MongoSessionStore:
+    """
+    Sessions in a Mongo collection with a TTL index, shared by all workers.
+    Every write stamps a new random version so cached copies can be revalidated.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index('expires_at', expireAfterSeconds=0)
+        self.collection.create_index('user_id')
+
+    def get(self, sid):
+        return self.get_versioned(sid)[0]
+
+    def get_versioned(self, sid):
+        doc = self.collection.find_one({'_id': sid, 'expires_at': {'$gt': datetime.utcnow()}})
+        return (doc['data'], doc.get('version')) if doc else (None, None)
+
+    def get_version(self, sid):
+        """Version of a live session without fetching its data; None if it is gone"""
+        doc = self.collection.find_one({'_id': sid, 'expires_at': {'$gt': datetime.utcnow()}}, {'version': 1})
+        return doc.get('version') if doc else None
+
+    def set(self, sid, data, user_id, lifetime):
+        version = secrets.token_hex(8)
+        self.collection.replace_one(
+            {'_id': sid},
+            {'data': data, 'user_id': user_id, 'version': version,
+             'expires_at': datetime.utcnow() + timedelta(seconds=lifetime)},
+            upsert=True
+        )
+        return version
+
+    def delete(self, sid):
+        self.collection.delete_one({'_id': sid})
+
+    def delete_for_user(self, user_id, keep=None):
+        self.collection.delete_many({'user_id': user_id, '_id': {'$ne': keep}})
+
+    def update_user(self, user_id, key, value):
+        self.collection.update_many({'user_id': user_id},
+                                    {'$set': {f'data.{key}': value, 'version': secrets.token_hex(8)}})
+
+
+class TieredSessionStore:
+    """
+    Local LRU in front of the Mongo store. Writes go through to Mongo. Reads
+    trust a local copy for the local store's max_age; after that they check the
+    shared version (a projected lookup by _id) and only fetch the data again
+    when another worker changed, revoked or expired the session. Changes made
+    on another worker can therefore take up to max_age to show up here.
+    """
+
+    def __init__(self, local, shared, lifetime=7 * 24 * 3600):
+        self.local = local
+        self.shared = shared
+        # Local expiry for copies fetched from Mongo; the version check catches an earlier shared expiry
+        self.lifetime = lifetime
+
+    def get(self, sid):
+        data, version, fresh = self.local.get_checked(sid)
+        if data is not None and version is not None:
+            if fresh:
+                return data
+            current = self.shared.get_version(sid)
+            if current == version:
+                self.local.mark_checked(sid)
+                return data
+            self.local.delete(sid)
+            if current is None:
+                return None
+        data, version = self.shared.get_versioned(sid)
+        if data is not None:
+            self.local.set(sid, data, data.get('user_id'), self.lifetime, version)
+        return data
+
+    def set(self, sid, data, user_id, lifetime):
+        version = self.shared.set(sid, data, user_id, lifetime)
+        self.local.set(sid, data, user_id, lifetime, version)
+
+    def delete(self, sid):
+        self.shared.delete(sid)
+        self.local.delete(sid)
+
+    def delete_for_user(self, user_id, keep=None):
+        self.shared.delete_for_user(user_id, keep)
+        self.local.delete_for_user(user_id, keep)
+
+    def update_user(self, user_id, key, value):
+        # The shared copies get new versions, so local ones are refetched on next use
+        self.shared.update_user(user_id, key, value)
+        self.local.delete_for_user(user_id)
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface over one of the stores above"""
+
+    def __init__(self, store, lifetime=7 * 24 * 3600):
+        self.store = store
+        self.lifetime = lifetime
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            try:
+                data = self.store.get(sid)
+            except Exception as e:
+                print(f"Error loading session: {e}")
+                data = None
+            if data is not None:
+                return ServerSession(data, sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid:
+            self.store.delete(session.previous_sid)
+
+        if not session:
+            # Cleared (logout): drop it server-side too
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.modified:
+            self.store.set(session.sid, dict(session), session.get('user_id'), self.lifetime)
+            response.set_cookie(
+                name, session.sid,
+                expires=datetime.utcnow() + timedelta(seconds=self.lifetime),
+                httponly=self.get_cookie_httponly(app),
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+                domain=domain, path=path
+            )
+
+    def revoke_user(self, user_id, keep=None):
+        """End every session of a user, optionally except the current one"""
+        self.store.delete_for_user(str(user_id), keep)
+
+    def refresh_user(self, user_id, snapshot):
+        """Replace the cached user snapshot in all of a user's sessions"""
+        self.store.update_user(str(user_id), 'user', snapshot)
+
+
+def create_session_store(backend, maxsize=10000, local_max_age=30, lifetime=7 * 24 * 3600):
+    """'memory' keeps sessions in this process; 'mongo' shares them through Mongo with a local LRU in front"""
+    if backend == 'mongo':
+        from database import mongodb
+        return TieredSessionStore(MemorySessionStore(maxsize, max_age=local_max_age),
+                                  MongoSessionStore(mongodb.db.sessions), lifetime)
+    if backend == 'memory':
+        return MemorySessionStore(maxsize)
+    raise ValueError(f'Unknown session backend: {backend}')
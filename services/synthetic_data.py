@@ -0,0 +1,333 @@
+from datetime import datetime, date, timedelta
+import random
+import json
+import uuid
+import os
+
+# Mirrors LocationService.LOCATIONS / TIME_SLOTS and PaymentService.PAYMENT_METHODS
+# without importing them (they connect to Mongo, and the JSON target must not need it)
+LOCATION_IDS = ['loc1', 'loc2', 'loc3', 'loc4', 'loc5', 'loc6']
+TIME_SLOTS = ['06:00 AM', '07:00 AM', '08:00 AM', '09:00 AM', '10:00 AM', '11:00 AM',
+              '12:00 PM', '01:00 PM', '02:00 PM', '03:00 PM', '04:00 PM', '05:00 PM',
+              '06:00 PM', '07:00 PM', '08:00 PM', '09:00 PM', '10:00 PM']
+PAYMENT_METHODS = ['UPI', 'CARD', 'WALLET']
+
+# (make, model, vehicle type, daily price range in INR, weight)
+CATALOG = [
+    ('Maruti Suzuki', 'Swift', 'car', (1500, 2200), 14),
+    ('Hyundai', 'Creta', 'car', (2500, 3500), 10),
+    ('Toyota', 'Innova Crysta', 'car', (3500, 5000), 8),
+    ('Mahindra', 'XUV700', 'car', (3800, 5200), 6),
+    ('Tata', 'Nexon', 'car', (2200, 3000), 9),
+    ('Honda', 'City', 'car', (2400, 3200), 7),
+    ('BMW', '3 Series', 'car', (7500, 9500), 2),
+    ('Royal Enfield', 'Classic 350', 'bike', (900, 1400), 8),
+    ('Bajaj', 'Pulsar 150', 'bike', (500, 800), 9),
+    ('KTM', 'Duke 390', 'bike', (1200, 1700), 3),
+    ('Honda', 'Activa 6G', 'scooter', (300, 500), 12),
+    ('TVS', 'Jupiter', 'scooter', (280, 450), 8),
+]
+FIRST_NAMES = ['aarav', 'vivaan', 'aditya', 'ananya', 'diya', 'isha', 'kabir', 'meera', 'rohan', 'saanvi',
+               'arjun', 'priya', 'karthik', 'nisha', 'rahul', 'sneha', 'vikram', 'pooja', 'dinesh', 'lakshmi']
+REVIEW_COMMENTS = ['Clean car and smooth pickup.', 'Great value for the price.', 'Pickup was a bit delayed.',
+                   'Vehicle was in excellent condition.', 'Would rent again.', 'AC could have been better.',
+                   'Friendly staff, quick handover.', 'Fuel level was low at pickup.']
+# Mumbai, as in GPSTracker.ROUTES
+GPS_CENTER = (19.0760, 72.8777)
+
+
+def rows_for(total):
+    """Split a target row count across collections in roughly production-like proportions"""
+    bookings = max(20, int(total * 0.35))
+    return {
+        'cars': max(10, total // 200),
+        'users': max(10, total // 20),
+        'bookings': bookings,
+        'gps_points_per_track': 20,
+        'tracked_share': min(1.0, total * 0.25 / 20 / bookings),
+        'review_share': 0.3
+    }
+
+
+def object_id():
+    """24-hex id shaped like an ObjectId (converted to one by MongoSink)"""
+    return uuid.uuid4().hex[:24]
+
+
+class FleetGenerator:
+    """
+    Streams a synthetic fleet: users first, then every car followed by its
+    bookings, payments, reviews and GPS points. Each car's bookings are laid
+    out one after another on its own timeline (history_days back to
+    future_days ahead), so active bookings never overlap; any a car gets
+    beyond what its window holds are generated as cancelled. Statuses,
+    payments and the car's available flag follow from the dates. Only the user id list is held in memory, so tens
+    of millions of rows stream straight into a sink.
+    """
+
+    def __init__(self, cars, users, bookings, seed=None, history_days=365, future_days=90,
+                 review_share=0.3, tracked_share=0.1, gps_points_per_track=20, password='loadtest123'):
+        self.cars = cars
+        self.users = users
+        self.bookings = bookings
+        self.random = random.Random(seed)
+        self.history_days = history_days
+        self.future_days = future_days
+        self.review_share = review_share
+        self.tracked_share = tracked_share
+        self.gps_points_per_track = gps_points_per_track
+        self.password = password
+        self.today = date.today()
+        self.counts = {}
+        self._weights = [weight for *_, weight in CATALOG]
+
+    def _password_hash(self):
+        # One hash for every user: hashing millions of passwords would dominate the run
+        try:
+            import bcrypt
+            from config import Config
+            return bcrypt.hashpw(self.password.encode('utf-8'), bcrypt.gensalt(Config.BCRYPT_ROUNDS)).decode('utf-8')
+        except ImportError:
+            return self.password
+
+    def generate(self, sink):
+        """Write everything to sink.add(collection, doc); returns rows written per collection"""
+        user_ids = self._generate_users(sink)
+        per_car = self.bookings / self.cars
+        for number in range(1, self.cars + 1):
+            # Spread the remainder so the total lands on the requested booking count
+            count = int(per_car * number) - int(per_car * (number - 1))
+            self._generate_car(sink, number, count, user_ids)
+        sink.flush()
+        return dict(self.counts)
+
+    def _emit(self, sink, collection, doc):
+        sink.add(collection, doc)
+        self.counts[collection] = self.counts.get(collection, 0) + 1
+
+    def _generate_users(self, sink):
+        password = self._password_hash()
+        created = datetime.utcnow() - timedelta(days=self.history_days)
+        user_ids = []
+        for number in range(1, self.users + 1):
+            user_id = object_id()
+            user_ids.append(user_id)
+            name = self.random.choice(FIRST_NAMES)
+            self._emit(sink, 'users', {
+                '_id': user_id,
+                'id': str(number),
+                'username': f'loaduser{number}',
+                'email': f'{name}.{number}@loadtest.example',
+                'phone': f'9{self.random.randint(100000000, 999999999)}',
+                'password': password,
+                'is_admin': False,
+                'email_verified': True,
+                'profile_picture': None,
+                'created_at': created + timedelta(minutes=self.random.randint(0, self.history_days * 1440))
+            })
+        return user_ids
+
+    def _generate_car(self, sink, number, booking_count, user_ids):
+        make, model, vehicle_type, (low, high), _ = self.random.choices(CATALOG, self._weights)[0]
+        car = {
+            '_id': object_id(),
+            'id': str(number),
+            'make': make,
+            'model': model,
+            'year': self.random.randint(2017, 2024),
+            'price_per_day': float(self.random.randrange(low, high + 1, 50)),
+            'vehicle_type': vehicle_type,
+            'available': True,
+            'image': f"/static/car_images/{make.lower().replace(' ', '_')}_{model.lower().replace(' ', '_')}_2022.jpg",
+            'rating': 0,
+            'review_count': 0
+        }
+
+        ratings = []
+        span = self.history_days + self.future_days
+        mean_duration = 3
+        mean_gap = max(0.5, span / max(booking_count, 1) - mean_duration)
+        day = -self.history_days + int(self.random.expovariate(1 / mean_gap))
+        overflow = False
+        for _ in range(booking_count):
+            duration = min(1 + int(self.random.expovariate(1 / mean_duration)), 30)
+            if not overflow:
+                # Ends inside the window, clear of the dates load tests and benchmarks book past it
+                duration = min(duration, self.future_days - day + 1)
+            start = self.today + timedelta(days=day)
+            end = start + timedelta(days=duration - 1)
+            status, rating = self._generate_booking(sink, car, start, end, self.random.choice(user_ids),
+                                                    cancelled=overflow)
+            if rating:
+                ratings.append(rating)
+            if status == 'confirmed' and start <= self.today <= end:
+                car['available'] = False
+            day += duration + int(self.random.expovariate(1 / mean_gap))
+            if day > self.future_days:
+                # Timeline full: the rest land anywhere in the window, cancelled so no active ones overlap
+                day = -self.history_days + self.random.randint(0, span)
+                overflow = True
+
+        if ratings:
+            car['rating'] = round(sum(ratings) / len(ratings), 1)
+            car['review_count'] = len(ratings)
+        self._emit(sink, 'cars', car)
+
+    def _generate_booking(self, sink, car, start, end, user_id, cancelled=False):
+        roll = self.random.random()
+        if cancelled:
+            status = 'cancelled'
+        elif end < self.today:
+            status = 'completed' if roll < 0.85 else 'cancelled'
+        elif start > self.today:
+            status = 'confirmed' if roll < 0.7 else ('pending' if roll < 0.9 else 'cancelled')
+        else:
+            status = 'confirmed'
+        paid = status in ('completed', 'confirmed') or (status == 'cancelled' and self.random.random() < 0.5)
+
+        days = (end - start).days + 1
+        pickup, drop = self.random.choice(LOCATION_IDS), self.random.choice(LOCATION_IDS)
+        total = round(days * car['price_per_day'] + (0 if pickup == drop else 200), 2)
+        created_at = datetime.combine(start, datetime.min.time()) - timedelta(days=self.random.randint(1, 30))
+        booking = {
+            'id': str(uuid.uuid4()),
+            'car_id': car['id'],
+            'user_id': user_id,
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+            'total_days': days,
+            'total_price': total,
+            'status': status,
+            # Cancelling keeps 'paid' on the booking and refunds the payment, as the app does
+            'payment_status': 'paid' if paid else 'pending',
+            'payment_method': '',
+            'pickup_location': pickup,
+            'drop_location': drop,
+            'pickup_time': self.random.choice(TIME_SLOTS),
+            'drop_time': self.random.choice(TIME_SLOTS),
+            'created_at': created_at
+        }
+
+        if paid:
+            method = self.random.choice(PAYMENT_METHODS)
+            booking['payment_method'] = method
+            payment = {
+                'id': str(uuid.uuid4()),
+                'booking_id': booking['id'],
+                'user_id': user_id,
+                'amount': total,
+                'payment_method': method,
+                'status': 'refunded' if status == 'cancelled' else 'completed',
+                'idempotency_key': str(uuid.uuid4()),
+                'transaction_id': f'TXN{uuid.uuid4().hex[:12].upper()}',
+                'created_at': created_at,
+                'updated_at': created_at
+            }
+            if status != 'cancelled':
+                payment['live'] = True
+            booking['payment_id'] = payment['id']
+            self._emit(sink, 'payments', payment)
+        self._emit(sink, 'bookings', booking)
+
+        rating = None
+        if status == 'completed' and self.random.random() < self.review_share:
+            rating = self.random.choices([1, 2, 3, 4, 5], [2, 4, 12, 40, 42])[0]
+            self._emit(sink, 'reviews', {
+                'id': object_id(),
+                'user_id': user_id,
+                'booking_id': booking['id'],
+                'car_id': car['id'],
+                'rating': rating,
+                'comment': self.random.choice(REVIEW_COMMENTS),
+                'service_rating': rating,
+                'created_at': datetime.combine(end, datetime.min.time()) + timedelta(hours=self.random.randint(2, 72)),
+                'helpful_count': self.random.randint(0, 5),
+                'verified_booking': True
+            })
+        if status in ('completed', 'confirmed') and start <= self.today and self.random.random() < self.tracked_share:
+            self._generate_track(sink, booking, start)
+        return status, rating
+
+    def _generate_track(self, sink, booking, start):
+        lat = GPS_CENTER[0] + self.random.uniform(-0.05, 0.05)
+        lng = GPS_CENTER[1] + self.random.uniform(-0.05, 0.05)
+        recorded_at = datetime.combine(start, datetime.min.time()) + timedelta(hours=self.random.randint(6, 20))
+        for _ in range(self.gps_points_per_track):
+            speed = max(0.0, self.random.gauss(32, 12))
+            # A random walk at roughly the current speed, one point a minute
+            step = speed / 60 / 111
+            lat += self.random.uniform(-step, step)
+            lng += self.random.uniform(-step, step)
+            recorded_at += timedelta(minutes=1)
+            self._emit(sink, 'gps_points', {
+                'booking_id': booking['id'],
+                'car_id': booking['car_id'],
+                'lat': round(lat, 6),
+                'lng': round(lng, 6),
+                'speed_kmh': round(speed, 1),
+                'recorded_at': recorded_at
+            })
+
+
+class MongoSink:
+    """Batched unordered insert_many per collection"""
+
+    OBJECT_ID_COLLECTIONS = ('users', 'cars')
+
+    def __init__(self, db, batch_size=5000, drop=False):
+        from bson import ObjectId
+        self._object_id = ObjectId
+        self.db = db
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.drop = drop
+        self._dropped = set()
+
+    def add(self, collection, doc):
+        if collection in self.OBJECT_ID_COLLECTIONS:
+            doc['_id'] = self._object_id(doc['_id'])
+        buffer = self.buffers.setdefault(collection, [])
+        buffer.append(doc)
+        if len(buffer) >= self.batch_size:
+            self._write(collection)
+
+    def _write(self, collection):
+        buffer = self.buffers.get(collection)
+        if not buffer:
+            return
+        if self.drop and collection not in self._dropped:
+            self.db.db[collection].delete_many({})
+            self._dropped.add(collection)
+        self.db.db[collection].insert_many(buffer, ordered=False)
+        self.buffers[collection] = []
+
+    def flush(self):
+        for collection in list(self.buffers):
+            self._write(collection)
+
+
+class JsonSink:
+    """
+    Streams each collection to <data_dir>/<collection>.json as one JSON array,
+    the snapshot format JsonBackend reads (cars, users, bookings, payments).
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.files = {}
+        os.makedirs(data_dir, exist_ok=True)
+
+    def add(self, collection, doc):
+        f = self.files.get(collection)
+        if f is None:
+            f = self.files[collection] = open(os.path.join(self.data_dir, f'{collection}.json'), 'w')
+            f.write('[')
+        else:
+            f.write(',\n')
+        f.write(json.dumps(doc, default=str))
+
+    def flush(self):
+        for f in self.files.values():
+            f.write(']\n')
+            f.close()
+        self.files = {}
@@ -0,0 +1,134 @@
+from jinja2 import BaseLoader, Environment, FileSystemBytecodeCache, FileSystemLoader
+import threading
+import time
+import os
+
+
+class TimedLoader(BaseLoader):
+    """Wraps the app's template loader to time each template load (compile or bytecode fetch)"""
+
+    def __init__(self, loader, profiler):
+        self.loader = loader
+        self.profiler = profiler
+
+    def get_source(self, environment, template):
+        return self.loader.get_source(environment, template)
+
+    def list_templates(self):
+        return self.loader.list_templates()
+
+    def load(self, environment, name, globals=None):
+        started = time.perf_counter()
+        template = super().load(environment, name, globals)
+        self.profiler.record_load(name, (time.perf_counter() - started) * 1000)
+        return template
+
+
+class TemplateProfiler:
+    """
+    Filesystem bytecode cache for Jinja templates plus per-template timings.
+
+    Compiled templates are written to cache_dir, which all workers share, so only
+    the first process to see a template (or precompile_templates.py at build time)
+    pays for compiling it. Entries are validated against the source checksum, so
+    an edited template is recompiled automatically.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def init_app(self, app):
+        from flask import before_render_template, template_rendered
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        env = app.jinja_env
+        env.bytecode_cache = FileSystemBytecodeCache(self.cache_dir)
+        env.loader = TimedLoader(env.loader, self)
+
+        before_render_template.connect(self._render_started, app, weak=False)
+        template_rendered.connect(self._render_finished, app, weak=False)
+
+    def _entry(self, name):
+        return self.stats.setdefault(name, {'load_ms': None, 'renders': 0, 'render_ms_total': 0.0, 'render_ms_max': 0.0})
+
+    def record_load(self, name, elapsed_ms):
+        with self._lock:
+            self._entry(name)['load_ms'] = round(elapsed_ms, 3)
+
+    def _render_started(self, sender, template, context, **extra):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(time.perf_counter())
+
+    def _render_finished(self, sender, template, context, **extra):
+        stack = getattr(self._local, 'stack', None)
+        if not stack:
+            return
+        elapsed_ms = (time.perf_counter() - stack.pop()) * 1000
+        with self._lock:
+            entry = self._entry(template.name)
+            entry['renders'] += 1
+            entry['render_ms_total'] += elapsed_ms
+            entry['render_ms_max'] = max(entry['render_ms_max'], elapsed_ms)
+
+    def report(self):
+        """Per-template load time and render count/average/max, slowest first"""
+        with self._lock:
+            rows = [
+                {
+                    'template': name,
+                    'load_ms': entry['load_ms'],
+                    'renders': entry['renders'],
+                    'render_ms_avg': round(entry['render_ms_total'] / entry['renders'], 3) if entry['renders'] else None,
+                    'render_ms_max': round(entry['render_ms_max'], 3)
+                }
+                for name, entry in self.stats.items()
+            ]
+        rows.sort(key=lambda row: row['render_ms_avg'] or 0, reverse=True)
+        return rows
+
+
+def precompile_templates(env):
+    """
+    Compile every .html template through env so its bytecode cache is populated.
+    Returns {template name: compile time in ms, or the error message}.
+    """
+    results = {}
+    for name in env.list_templates(filter_func=lambda name: name.endswith('.html')):
+        # Force a real compile rather than a hit in the in-process template cache
+        source, filename, _ = env.loader.get_source(env, name)
+        started = time.perf_counter()
+        try:
+            code = env.compile(source, name, filename)
+        except Exception as e:
+            results[name] = f'error: {e}'
+            continue
+        results[name] = round((time.perf_counter() - started) * 1000, 3)
+
+        if env.bytecode_cache is not None:
+            bucket = env.bytecode_cache.get_bucket(env, name, filename, source)
+            bucket.code = code
+            env.bytecode_cache.set_bucket(bucket)
+    return results
+
+
+def build_environment(template_folder, cache_dir):
+    """
+    A Jinja environment that compiles templates exactly as the app's does (same
+    loader paths, autoescaping and extensions), without importing the app or
+    connecting to a database. Used at build time by precompile_templates.py.
+    """
+    from services.fragment_cache import FragmentCacheExtension
+
+    os.makedirs(cache_dir, exist_ok=True)
+    return Environment(
+        loader=FileSystemLoader(template_folder),
+        # Flask's rule: autoescape .html, .htm, .xml, .xhtml and .svg templates
+        autoescape=lambda name: name is not None and name.endswith(('.html', '.htm', '.xml', '.xhtml', '.svg')),
+        extensions=[FragmentCacheExtension],
+        bytecode_cache=FileSystemBytecodeCache(cache_dir)
+    )
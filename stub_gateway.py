@@ -0,0 +1,113 @@
+import argparse
+import threading
+import random
+import hashlib
+import hmac
+import json
+import time
+import uuid
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Offline stand-in for the payment provider: accepts charges with 202 and
+# reports each outcome later through a signed webhook, like the real gateway.
+
+
+class StubGateway:
+    def __init__(self, secret, delay=0.5, fail_rate=0.0):
+        self.secret = secret
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.charges = {}
+        self.stats = {'charges': 0, 'duplicates': 0, 'webhooks_sent': 0, 'webhook_errors': 0}
+        self._lock = threading.Lock()
+
+    def charge(self, body, idempotency_key):
+        with self._lock:
+            key = idempotency_key or body.get('payment_id')
+            if key in self.charges:
+                self.stats['duplicates'] += 1
+                return self.charges[key]
+            reply = {'status': 'accepted', 'gateway_ref': f'GW{uuid.uuid4().hex[:12].upper()}'}
+            self.charges[key] = reply
+            self.stats['charges'] += 1
+
+        status = 'failed' if random.random() < self.fail_rate else 'succeeded'
+        event = {'payment_id': body.get('payment_id'), 'gateway_ref': reply['gateway_ref'],
+                 'amount': body.get('amount'), 'status': status}
+        if body.get('callback_url'):
+            threading.Timer(self.delay, self.deliver, (body['callback_url'], event)).start()
+        return reply
+
+    def deliver(self, url, event, attempts=3):
+        payload = json.dumps(event).encode('utf-8')
+        signature = hmac.new(self.secret.encode('utf-8'), payload, hashlib.sha256).hexdigest()
+        for attempt in range(attempts):
+            request = urllib.request.Request(url, data=payload, method='POST', headers={
+                'Content-Type': 'application/json', 'X-Gateway-Signature': signature
+            })
+            try:
+                with urllib.request.urlopen(request, timeout=10):
+                    pass
+                with self._lock:
+                    self.stats['webhooks_sent'] += 1
+                return
+            except Exception as e:
+                print(f"Error delivering webhook for {event['payment_id']}: {e}")
+                time.sleep(2 ** attempt)
+        with self._lock:
+            self.stats['webhook_errors'] += 1
+
+
+def make_server(port=8090, secret='stub-secret', delay=0.5, fail_rate=0.0, host='127.0.0.1'):
+    gateway = StubGateway(secret, delay, fail_rate)
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, data):
+            body = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path != '/charges':
+                return self._send(404, {'error': 'Not found'})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            except ValueError:
+                return self._send(400, {'error': 'Invalid JSON'})
+            if not body.get('payment_id') or not body.get('amount'):
+                return self._send(400, {'error': 'payment_id and amount are required'})
+            self._send(202, gateway.charge(body, self.headers.get('Idempotency-Key')))
+
+        def do_GET(self):
+            if self.path != '/stats':
+                return self._send(404, {'error': 'Not found'})
+            with gateway._lock:
+                self._send(200, dict(gateway.stats))
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.gateway = gateway
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local stub payment gateway')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--secret', default='stub-secret', help='Must match PAYMENT_GATEWAY_SECRET')
+    parser.add_argument('--delay', type=float, default=0.5, help='Seconds before the webhook is sent')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of charges that are declined')
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.secret, args.delay, args.fail_rate)
+    print(f"Stub gateway on http://127.0.0.1:{args.port} (set PAYMENT_GATEWAY_URL to this address)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass